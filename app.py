@@ -1,77 +1,565 @@
 import os
+import sys
 import time
 import json
+import re
+import math
+import bisect
+import unicodedata
+import csv
+import bz2
+import gzip
+import decimal
+import asyncio
+import sqlite3
+import hashlib
+import random
+import secrets
+import email.utils
+import datetime
+import tempfile
+import shutil
+import multiprocessing
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import heapq
+import itertools
+from array import array
+from collections import OrderedDict
+from types import SimpleNamespace
+import numpy as np
 import gradio as gr
-from groq import Groq, APIError
+from groq import Groq, AsyncGroq, APIError, APIConnectionError
 from urllib.parse import quote_plus
+from xml.etree import ElementTree
+
+try:
+    import fcntl  # POSIX advisory file locks
+except ImportError:
+    fcntl = None
+    try:
+        import msvcrt  # Windows byte-range locks
+    except ImportError:
+        msvcrt = None
 
 # --- DATABASE CONFIGURATION ---
-FEEDBACK_DB_FILE = "travel_feedback_db.json"
+FEEDBACK_DB_FILE = "travel_feedback_db.json"      # Legacy single-document database (migrated on first use)
+FEEDBACK_LOG_FILE = "travel_feedback_log.jsonl"   # Append-only log, one feedback entry per line
+FEEDBACK_STATS_FILE = "travel_feedback_stats.json"  # Running aggregates over the log
+FEEDBACK_LOCK_FILE = FEEDBACK_LOG_FILE + ".lock"    # Serializes writers across worker processes
+FEEDBACK_ROLLUP_DAYS = 90    # Daily rollups kept for the trend header
+FEEDBACK_ROLLUP_WEEKS = 52   # Weekly rollups kept for the trend header
+FEEDBACK_PAGE_SIZE = 20      # Reviews per "See All Reviews" page
+FEEDBACK_PAGE_CACHE_SIZE = 256  # Rendered pages kept in memory (LRU)
+FEEDBACK_RATING_FILTERS = ["All", "5", "4", "3", "2", "1"]
+FEEDBACK_PAGE_SLOTS = 50     # "Load More" pages the reviews tab can show below the newest ones
+
+# In-process index of the log: the byte offset of every entry read so far (entries
+# themselves stay on disk), positions per rating, and the byte offset the index ends at
+FEEDBACK_CACHE = {"line_offsets": array("q"), "by_rating": {}, "offset": 0, "last_id": 0, "migrated": False, "stats": None, "stats_display": None}
+# Rendered Markdown per (rating_filter, page_index); pages are anchored at the oldest review,
+# so only the newest page of a filter ever changes when a review arrives.
+FEEDBACK_PAGE_CACHE = OrderedDict()
+FEEDBACK_LOCK = threading.RLock()  # Guards FEEDBACK_CACHE and serializes writers in this process
+FEEDBACK_LOCK_DEPTH = threading.local()  # Lets a thread re-enter feedback_write_lock() safely
+
+# --- LOCKING & ATOMIC FILE HELPERS ---
+@contextlib.contextmanager
+def feedback_write_lock():
+    """
+    Exclusive writer lock: the in-process lock plus an OS-level lock on
+    FEEDBACK_LOCK_FILE so several worker processes can share the database.
+    """
+    with FEEDBACK_LOCK:
+        # flock() is per open file, so a nested acquire must not open the lock file again
+        if getattr(FEEDBACK_LOCK_DEPTH, "value", 0) > 0:
+            yield
+            return
+
+        with open(FEEDBACK_LOCK_FILE, 'a+b') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK gives up after ~10s; keep waiting
+            FEEDBACK_LOCK_DEPTH.value = 1
+            try:
+                yield
+            finally:
+                FEEDBACK_LOCK_DEPTH.value = 0
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def write_file_atomically(path, content):
+    """Writes content to a temp file in the same directory, fsyncs it and renames it over path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+# --- DATA STORAGE (APPEND-ONLY FILE DATABASE) ---
+def migrate_feedback_database():
+    """One-shot migration of the legacy JSON database file into the append-only log."""
+    if os.path.exists(FEEDBACK_LOG_FILE) or not os.path.exists(FEEDBACK_DB_FILE):
+        return False
 
-# --- DATA STORAGE (FILE-BASED DATABASE) ---
-def load_feedback_database():
-    """Load feedback data from JSON file database."""
     try:
-        if os.path.exists(FEEDBACK_DB_FILE):
+        with feedback_write_lock():
+            # Another worker may have migrated while we waited for the lock
+            if os.path.exists(FEEDBACK_LOG_FILE) or not os.path.exists(FEEDBACK_DB_FILE):
+                return False
+
             with open(FEEDBACK_DB_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            # Initialize with empty database structure
-            initial_data = {
-                "feedback_entries": [],
-                "metadata": {
-                    "total_feedback": 0,
-                    "average_rating": 0,
-                    "last_updated": time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-            }
-            save_feedback_database(initial_data)
-            return initial_data
+                legacy_entries = json.load(f).get("feedback_entries", [])
+
+            # Write the whole log under a temporary name so a crash never leaves half a migration
+            write_file_atomically(
+                FEEDBACK_LOG_FILE,
+                "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in legacy_entries)
+            )
+            os.replace(FEEDBACK_DB_FILE, FEEDBACK_DB_FILE + ".migrated")
+
+        print(f"Migrated {len(legacy_entries)} feedback entries from {FEEDBACK_DB_FILE} to {FEEDBACK_LOG_FILE}")
+        return True
     except Exception as e:
-        print(f"Error loading database: {e}")
-        return {"feedback_entries": [], "metadata": {"total_feedback": 0, "average_rating": 0, "last_updated": time.strftime("%Y-%m-%d %H:%M:%S")}}
+        print(f"Error migrating database: {e}")
+        return False
+
+def empty_feedback_stats():
+    """Initial aggregate structure; 'offset' is the log position the aggregates cover."""
+    return {
+        "count": 0,
+        "rating_sum": 0,
+        "histogram": {str(star): 0 for star in range(1, 6)},
+        "last_updated": None,
+        "daily": {},
+        "weekly": {},
+        "offset": 0
+    }
+
+def load_feedback_stats():
+    """Load the persisted aggregates, falling back to empty ones if missing or stale."""
+    try:
+        if os.path.exists(FEEDBACK_STATS_FILE):
+            with open(FEEDBACK_STATS_FILE, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+            log_size = os.path.getsize(FEEDBACK_LOG_FILE) if os.path.exists(FEEDBACK_LOG_FILE) else 0
+            if stats.get("offset", 0) <= log_size:
+                return stats
+            print("Feedback stats are ahead of the log; rebuilding from scratch.")
+    except Exception as e:
+        print(f"Error loading feedback stats: {e}")
+    return empty_feedback_stats()
 
-def save_feedback_database(data):
-    """Save feedback data to JSON file database."""
+def save_feedback_stats(stats):
+    """Persist the aggregates next to the log (atomically, so readers never see a torn file)."""
     try:
-        with open(FEEDBACK_DB_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        write_file_atomically(FEEDBACK_STATS_FILE, json.dumps(stats, indent=2, ensure_ascii=False))
         return True
     except Exception as e:
-        print(f"Error saving database: {e}")
+        print(f"Error saving feedback stats: {e}")
         return False
 
-def add_feedback_to_database(rating, comment):
-    """Add new feedback to the database and update metadata."""
-    database = load_feedback_database()
-
-    new_entry = {
-        "id": len(database["feedback_entries"]) + 1,
-        "rating": rating,
-        "comment": comment.strip(),
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-    }
+def bump_rollup(rollups, key, rating, limit):
+    """Adds one rating to a day/week bucket, dropping the oldest bucket past the limit."""
+    if key not in rollups:
+        rollups[key] = {"count": 0, "rating_sum": 0}
+        if len(rollups) > limit:
+            del rollups[min(rollups)]
+    if key in rollups:
+        rollups[key]["count"] += 1
+        rollups[key]["rating_sum"] += rating
+
+def update_feedback_stats(stats, entry):
+    """Folds a single entry into the running aggregates in O(1)."""
+    rating = int(entry["rating"])
+    stats["count"] += 1
+    stats["rating_sum"] += rating
+    stats["histogram"][str(rating)] = stats["histogram"].get(str(rating), 0) + 1
+    stats["last_updated"] = entry["timestamp"]
 
-    database["feedback_entries"].append(new_entry)
+    try:
+        day = datetime.datetime.strptime(entry["timestamp"][:10], "%Y-%m-%d").date()
+    except ValueError:
+        return
+    iso_year, iso_week, _ = day.isocalendar()
+    bump_rollup(stats["daily"], day.isoformat(), rating, FEEDBACK_ROLLUP_DAYS)
+    bump_rollup(stats["weekly"], f"{iso_year}-W{iso_week:02d}", rating, FEEDBACK_ROLLUP_WEEKS)
 
-    # Update metadata
-    total_entries = len(database["feedback_entries"])
-    total_rating = sum(entry["rating"] for entry in database["feedback_entries"])
-    average_rating = total_rating / total_entries if total_entries > 0 else 0
+def read_feedback_log():
+    """
+    Indexes the lines appended since the last call; returns the number of entries in the log.
+    """
+    with FEEDBACK_LOCK:
+        if not FEEDBACK_CACHE["migrated"]:
+            migrate_feedback_database()
+            FEEDBACK_CACHE["migrated"] = True
+        if FEEDBACK_CACHE["stats"] is None:
+            FEEDBACK_CACHE["stats"] = load_feedback_stats()
+        stats = FEEDBACK_CACHE["stats"]
+
+        try:
+            if not os.path.exists(FEEDBACK_LOG_FILE):
+                return len(FEEDBACK_CACHE["line_offsets"])
+
+            # The log only ever grows; a shorter file means it was replaced, so start over
+            if os.path.getsize(FEEDBACK_LOG_FILE) < FEEDBACK_CACHE["offset"]:
+                FEEDBACK_CACHE["line_offsets"] = array("q")
+                FEEDBACK_CACHE["by_rating"] = {}
+                FEEDBACK_CACHE["offset"] = 0
+                FEEDBACK_CACHE["last_id"] = 0
+                FEEDBACK_PAGE_CACHE.clear()
+                FEEDBACK_CACHE["stats"] = stats = empty_feedback_stats()
+
+            with open(FEEDBACK_LOG_FILE, 'rb') as f:
+                f.seek(FEEDBACK_CACHE["offset"])
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Partially written tail; picked up on the next read
+                    FEEDBACK_CACHE["offset"] += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"Skipping corrupt feedback log line at byte {FEEDBACK_CACHE['offset'] - len(line)}")
+                        continue
+                    position = len(FEEDBACK_CACHE["line_offsets"])
+                    FEEDBACK_CACHE["line_offsets"].append(FEEDBACK_CACHE["offset"] - len(line))
+                    FEEDBACK_CACHE["last_id"] = max(FEEDBACK_CACHE["last_id"], int(entry.get("id", 0)))
+
+                    # Index by rating and drop only the newest page of each affected filter
+                    rating_positions = FEEDBACK_CACHE["by_rating"].setdefault(str(entry["rating"]), array("q"))
+                    rating_positions.append(position)
+                    FEEDBACK_PAGE_CACHE.pop(("All", position // FEEDBACK_PAGE_SIZE), None)
+                    FEEDBACK_PAGE_CACHE.pop((str(entry["rating"]), (len(rating_positions) - 1) // FEEDBACK_PAGE_SIZE), None)
+
+                    # Only fold entries the persisted aggregates have not seen yet
+                    if FEEDBACK_CACHE["offset"] > stats["offset"]:
+                        update_feedback_stats(stats, entry)
+                        stats["offset"] = FEEDBACK_CACHE["offset"]
+        except Exception as e:
+            print(f"Error loading database: {e}")
+
+        return len(FEEDBACK_CACHE["line_offsets"])
+
+def read_feedback_entries(positions):
+    """Reads the entries at the given index positions back from the log."""
+    entries = []
+    with FEEDBACK_LOCK, open(FEEDBACK_LOG_FILE, 'rb') as f:
+        for position in positions:
+            f.seek(FEEDBACK_CACHE["line_offsets"][position])
+            entries.append(json.loads(f.readline()))
+    return entries
+
+def append_feedback_entry(entry):
+    """
+    Appends a single entry to the log without touching existing data.
+    Callers must hold feedback_write_lock().
+    """
+    try:
+        with open(FEEDBACK_LOG_FILE, 'a+b') as f:
+            # A writer that died mid-append leaves a tail without a newline; cut it off
+            # so the new line is not glued onto it.
+            end = f.seek(0, os.SEEK_END)
+            if end > 0:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    f.seek(0)
+                    intact = f.read().rfind(b"\n") + 1
+                    f.truncate(intact)
+                    print(f"Truncated torn feedback log tail ({end - intact} bytes)")
+
+            f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+    except Exception as e:
+        print(f"Error saving database: {e}")
+        return False
 
-    database["metadata"] = {
-        "total_feedback": total_entries,
-        "average_rating": round(average_rating, 2),
-        "last_updated": time.strftime("%Y-%m-%d %H:%M:%S")
+def load_feedback_database():
+    """Load feedback data in the classic {feedback_entries, metadata} shape (reads every entry from disk)."""
+    feedback_entries = read_feedback_entries(range(read_feedback_log()))
+    stats = FEEDBACK_CACHE["stats"]
+    average_rating = stats["rating_sum"] / stats["count"] if stats["count"] > 0 else 0
+
+    return {
+        "feedback_entries": feedback_entries,
+        "metadata": {
+            "total_feedback": stats["count"],
+            "average_rating": round(average_rating, 2),
+            "rating_histogram": stats["histogram"],
+            "last_updated": stats["last_updated"] or time.strftime("%Y-%m-%d %H:%M:%S")
+        }
     }
 
-    if save_feedback_database(database):
-        return True, database
-    else:
-        return False, database
+def add_feedback_to_database(rating, comment):
+    """Append new feedback to the log. Returns (success, new_entry)."""
+    try:
+        with feedback_write_lock():
+            # Catch up with entries other workers appended before allocating the next id
+            read_feedback_log()
+
+            new_entry = {
+                "id": FEEDBACK_CACHE["last_id"] + 1,
+                "rating": rating,
+                "comment": comment.strip(),
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+            }
+
+            if not append_feedback_entry(new_entry):
+                return False, new_entry
+
+            # Fold the new line into the aggregates and persist them alongside the log
+            read_feedback_log()
+            save_feedback_stats(FEEDBACK_CACHE["stats"])
+            return True, new_entry
+    except Exception as e:
+        print(f"Error saving database: {e}")
+        return False, None
+
+# --- Feedback Log Stress Test ---
+# `python app.py --stress-feedback-log [processes] [threads] [appends]` has every
+# thread of every process append reviews to a scratch log at once, then checks that
+# none were lost, torn or given the same id.
+def use_feedback_directory(directory):
+    """Points the feedback files at `directory` and forgets the in-process view of the old log."""
+    global FEEDBACK_DB_FILE, FEEDBACK_LOG_FILE, FEEDBACK_STATS_FILE, FEEDBACK_LOCK_FILE
+    with FEEDBACK_LOCK:
+        FEEDBACK_DB_FILE = os.path.join(directory, "travel_feedback_db.json")
+        FEEDBACK_LOG_FILE = os.path.join(directory, "travel_feedback_log.jsonl")
+        FEEDBACK_STATS_FILE = os.path.join(directory, "travel_feedback_stats.json")
+        FEEDBACK_LOCK_FILE = FEEDBACK_LOG_FILE + ".lock"
+        FEEDBACK_CACHE.update({"line_offsets": array("q"), "by_rating": {}, "offset": 0, "last_id": 0, "migrated": False, "stats": None, "stats_display": None})
+        FEEDBACK_PAGE_CACHE.clear()
+
+def feedback_stress_worker(directory, threads, appends):
+    """Child process body: `threads` threads each add `appends` reviews; exits non-zero on any failed write."""
+    use_feedback_directory(directory)
+    failures = []
+    def append_reviews(thread_index):
+        for index in range(appends):
+            success, _ = add_feedback_to_database(index % 5 + 1, f"pid {os.getpid()} thread {thread_index} review {index}")
+            if not success:
+                failures.append(index)
+    workers = [threading.Thread(target=append_reviews, args=(thread_index,)) for thread_index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    sys.exit(1 if failures else 0)
+
+def stress_test_feedback_log(processes=4, threads=8, appends=25):
+    """Concurrent appends from several processes into a scratch directory; returns the checks as a dict."""
+    directory = tempfile.mkdtemp(prefix="feedback-stress-")
+    try:
+        started = time.perf_counter()
+        children = [multiprocessing.Process(target=feedback_stress_worker, args=(directory, threads, appends)) for _ in range(processes)]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join()
+        elapsed = time.perf_counter() - started
+
+        expected = processes * threads * appends
+        ids, corrupt = [], 0
+        with open(os.path.join(directory, "travel_feedback_log.jsonl"), "rb") as f:
+            for line in f:
+                try:
+                    ids.append(int(json.loads(line)["id"]))
+                except (ValueError, KeyError):
+                    corrupt += 1
+        with open(os.path.join(directory, "travel_feedback_stats.json"), encoding="utf-8") as f:
+            stats_count = json.load(f)["count"]
+        result = {
+            "expected": expected,
+            "lines": len(ids) + corrupt,
+            "corrupt_lines": corrupt,
+            "duplicate_ids": len(ids) - len(set(ids)),
+            "stats_count": stats_count,
+            "failed_processes": sum(child.exitcode != 0 for child in children),
+            "appends_per_second": round(expected / elapsed, 1),
+        }
+        result["ok"] = (
+            result["lines"] == expected and not corrupt and not result["duplicate_ids"]
+            and sorted(ids) == list(range(1, expected + 1)) and stats_count == expected
+            and not result["failed_processes"]
+        )
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
 
 # --- TRIVIA QUIZ STATE ---
-TRIVIA_SESSIONS = {}  # Store quiz sessions by session_id
+# Quiz sessions live in a store with an idle TTL and an LRU size cap, so abandoned
+# quizzes are dropped. Session ids are random tokens. Set TRIVIA_SESSION_DB_FILE
+# to a SQLite file that all workers can reach to share sessions between processes
+# behind a load balancer; by default they stay in this process.
+TRIVIA_SESSION_TTL = int(os.environ.get("TRIVIA_SESSION_TTL", 30 * 60))  # Idle seconds before a quiz expires
+TRIVIA_SESSION_MAX_ENTRIES = int(os.environ.get("TRIVIA_SESSION_MAX_ENTRIES", 10000))
+TRIVIA_SESSION_DB_FILE = os.environ.get("TRIVIA_SESSION_DB_FILE", "")  # "" keeps sessions in process
+
+class TriviaSession:
+    """One quiz in progress. `upcoming` holds questions ready to show, `asked` the keys already shown."""
+
+    __slots__ = (
+        "session_id", "destination", "player", "current_question", "score",
+        "questions_asked", "total_questions", "start_time", "upcoming", "asked"
+    )
+
+    def __init__(self, destination, player, current_question, total_questions, upcoming=(), asked=(),
+                 score=0, questions_asked=1, start_time=None, session_id=None):
+        self.session_id = session_id
+        self.destination = destination
+        self.player = player
+        self.current_question = current_question
+        self.score = score
+        self.questions_asked = questions_asked
+        self.total_questions = total_questions
+        self.start_time = start_time or time.time()
+        self.upcoming = list(upcoming)
+        self.asked = set(asked)
+
+    def to_json(self):
+        return json.dumps(
+            {name: sorted(self.asked) if name == "asked" else getattr(self, name) for name in self.__slots__},
+            ensure_ascii=False
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        return cls(**json.loads(text))
+
+class MemorySessionStore:
+    """In-process session store: ordered by last save, expiring `ttl` seconds after it."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()  # session_id -> (expires_at, session)
+        self.counters = {"created": 0, "expired": 0, "evicted": 0}
+
+    def create(self, session):
+        """Assigns a fresh random id and stores the session."""
+        session.session_id = secrets.token_urlsafe(16)
+        with self.lock:
+            self.counters["created"] += 1
+        self.save(session)
+        return session.session_id
+
+    def get(self, session_id):
+        with self.lock:
+            item = self.sessions.get(session_id) if session_id else None
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self.sessions[session_id]
+                self.counters["expired"] += 1
+                return None
+            return item[1]
+
+    def save(self, session):
+        now = time.time()
+        with self.lock:
+            self.sessions[session.session_id] = (now + self.ttl, session)
+            self.sessions.move_to_end(session.session_id)
+            # Oldest first: with one TTL for all, expired sessions sit at the front
+            while self.sessions and next(iter(self.sessions.values()))[0] < now:
+                self.sessions.popitem(last=False)
+                self.counters["expired"] += 1
+            while len(self.sessions) > self.max_entries:
+                self.sessions.popitem(last=False)
+                self.counters["evicted"] += 1
+
+    def delete(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    async def get_async(self, session_id):
+        """get() from a worker thread, so the SQLite store never blocks the event loop."""
+        return await asyncio.to_thread(self.get, session_id)
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "active": len(self.sessions)}
+
+class SQLiteSessionStore(MemorySessionStore):
+    """Session store in a SQLite file (WAL), shared by every process that opens it."""
+
+    def __init__(self, path, ttl, max_entries):
+        super().__init__(ttl, max_entries)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS trivia_sessions (
+                id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS trivia_sessions_by_expiry ON trivia_sessions (expires_at);
+        """)
+        self.conn.commit()
+
+    def get(self, session_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data, expires_at FROM trivia_sessions WHERE id = ?", (session_id,)
+            ).fetchone() if session_id else None
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self.conn.execute("DELETE FROM trivia_sessions WHERE id = ?", (session_id,))
+                self.conn.commit()
+                self.counters["expired"] += 1
+                return None
+        return TriviaSession.from_json(row[0])
+
+    def save(self, session):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO trivia_sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session.session_id, session.to_json(), now + self.ttl)
+            )
+            self.counters["expired"] += self.conn.execute("DELETE FROM trivia_sessions WHERE expires_at < ?", (now,)).rowcount
+            # expires_at orders sessions by last use, so the cap drops the least recently used
+            self.counters["evicted"] += self.conn.execute(
+                "DELETE FROM trivia_sessions WHERE id IN (SELECT id FROM trivia_sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            self.conn.commit()
+
+    def delete(self, session_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM trivia_sessions WHERE id = ?", (session_id,))
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            active = self.conn.execute("SELECT COUNT(*) FROM trivia_sessions WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+            return {**self.counters, "active": active}
+
+def build_trivia_session_store():
+    if TRIVIA_SESSION_DB_FILE:
+        return SQLiteSessionStore(TRIVIA_SESSION_DB_FILE, TRIVIA_SESSION_TTL, TRIVIA_SESSION_MAX_ENTRIES)
+    return MemorySessionStore(TRIVIA_SESSION_TTL, TRIVIA_SESSION_MAX_ENTRIES)
+
+TRIVIA_SESSIONS = build_trivia_session_store()
 
 # --- FIX FOR COLAB SECRETS LOADING ---
 try:
@@ -91,6 +579,9 @@ except ImportError:
 GROQ_CHAT_MODEL = "llama-3.1-8b-instant"
 GROQ_WHISPER_MODEL = "whisper-large-v3"
 API_KEY = os.environ.get("GROQ_API_KEY")
+# Serve every tab from async handlers on AsyncGroq instead of blocking worker threads
+USE_ASYNC_HANDLERS = os.environ.get("GROQ_ASYNC_HANDLERS", "0").strip().lower() in ("1", "true", "yes")
+ASYNC_CONCURRENCY_LIMIT = int(os.environ.get("ASYNC_CONCURRENCY_LIMIT", 256))  # Concurrent requests per event in async mode
 
 # --- System Prompts ---
 DEFAULT_LANGUAGE= "English"
@@ -184,6 +675,39 @@ Make it engaging and educational. The difficulty should be moderate.
 Return ONLY the JSON, no additional text.
 """
 
+# TRIVIA SET SYSTEM PROMPT (several questions in one completion, for the question pool)
+TRIVIA_SET_SYSTEM_PROMPT = """
+You are a travel trivia expert. Generate multiple-choice questions about world travel, destinations, cultures, landmarks, and geography.
+
+Generate exactly {count} DIFFERENT multiple-choice questions in JSON format with the following structure:
+{{
+  "questions": [
+    {{
+      "question": "string",
+      "options": ["A. option1", "B. option2", "C. option3", "D. option4"],
+      "correct_answer": "A",
+      "explanation": "string (one sentence)"
+    }}
+  ]
+}}
+
+"correct_answer" is only the letter (A, B, C or D). Cover different topics; do not repeat a question.
+The difficulty should be moderate.
+
+Return ONLY the JSON, no additional text.
+"""
+
+# BATCH TRANSLATION SYSTEM PROMPT
+BATCH_TRANSLATION_SYSTEM_PROMPT = """
+You are a professional, highly accurate language translator.
+Translate the user's text from **{source_lang}** into each of these languages: {target_langs}.
+
+Return ONLY a JSON object whose keys are exactly those language names and whose values are the translated texts:
+{{
+  "<language name>": "string (the full translation, no commentary)"
+}}
+"""
+
 # --- Language & Currency Lists ---
 LANGUAGES = [
     "English", "Spanish", "French", "German", "Italian", "Portuguese",
@@ -193,22 +717,1776 @@ LANGUAGES = [
 SIMULATED_RATES = {
     "USD": 1.0, "EUR": 0.92, "GBP": 0.79, "JPY": 156.9, "CAD": 1.37, "AUD": 1.51, "INR": 83.3, "AED": 3.67, "SAR": 3.75, "KRW": 1374.5
 }
-CURRENCY_CODES = list(SIMULATED_RATES.keys())
 
 
+# --- Client-Side Rate Limiting ---
+# Token buckets per model (requests/min and tokens/min), a priority queue per model
+# and an AIMD concurrency limit that halves on every 429 and creeps back up on success.
+GROQ_CHAT_RPM = int(os.environ.get("GROQ_CHAT_RPM", 30))
+GROQ_CHAT_TPM = int(os.environ.get("GROQ_CHAT_TPM", 6000))
+GROQ_WHISPER_RPM = int(os.environ.get("GROQ_WHISPER_RPM", 20))
+GROQ_MAX_CONCURRENCY = int(os.environ.get("GROQ_MAX_CONCURRENCY", 16))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 30))  # seconds a request may wait for capacity
+COMPLETION_TOKEN_RESERVE = 512  # Tokens reserved for the reply until the real usage is known
+
+# Lower number = served first
+PRIORITY_INTERACTIVE = 0   # Chatbot and translator, a user is watching
+PRIORITY_STANDARD = 1      # Report-style tabs
+PRIORITY_BACKGROUND = 2    # Trivia and other work that can wait
+LLM_PRIORITY = contextvars.ContextVar("llm_priority", default=PRIORITY_STANDARD)
+
+class RateLimitTimeout(Exception):
+    """Raised when a request cannot get Groq capacity within LLM_QUEUE_TIMEOUT."""
+
+@contextlib.contextmanager
+def llm_priority(priority):
+    """Runs the enclosed Groq calls at the given queue priority."""
+    token = LLM_PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        LLM_PRIORITY.reset(token)
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute` / 60 per second."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.refill_rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        """Corrects a reservation once the real cost is known (negative amounts charge more)."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self):
+        self.refill()
+        self.tokens = min(self.tokens, 0.0)
+
+class GroqRateLimiter:
+    """
+    Admits Groq requests in priority order per model, within the request/token
+    budgets of that model and a global AIMD-adjusted concurrency limit.
+    """
+
+    def __init__(self, model_limits, max_concurrency, queue_timeout):
+        self.cond = threading.Condition()
+        # model -> (requests bucket, tokens bucket or None)
+        self.buckets = {
+            model: (TokenBucket(rpm), TokenBucket(tpm) if tpm else None)
+            for model, (rpm, tpm) in model_limits.items()
+        }
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = {model: [] for model in model_limits}  # model -> heap of (priority, seq)
+        self.sequence = itertools.count()
+        self.counters = {"admitted": 0, "throttled": 0, "timeouts": 0, "max_queue_depth": 0}
+
+    def try_admit(self, model, ticket, tokens):
+        """Caller holds the lock. Returns 0 when admitted, else seconds to wait (None = until notified)."""
+        if self.waiting[model][0] != ticket:
+            return None  # Someone with a higher priority (or earlier arrival) goes first
+        if self.in_flight >= max(1, int(self.concurrency_limit)):
+            return None
+
+        request_bucket, token_bucket = self.buckets[model]
+        wait = request_bucket.wait_time(1)
+        if token_bucket is not None:
+            wait = max(wait, token_bucket.wait_time(tokens))
+        if wait > 0:
+            return wait
+
+        request_bucket.take(1)
+        if token_bucket is not None:
+            token_bucket.take(tokens)
+        heapq.heappop(self.waiting[model])
+        self.in_flight += 1
+        self.counters["admitted"] += 1
+        self.cond.notify_all()
+        return 0
+
+    def enqueue(self, model):
+        ticket = (LLM_PRIORITY.get(), next(self.sequence))
+        heapq.heappush(self.waiting[model], ticket)
+        queue_depth = sum(len(queue) for queue in self.waiting.values())
+        self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], queue_depth)
+        return ticket
+
+    def abandon(self, model, ticket, timed_out=True):
+        """Caller holds the lock. Removes a ticket that gave up waiting."""
+        if ticket in self.waiting[model]:
+            self.waiting[model].remove(ticket)
+            heapq.heapify(self.waiting[model])
+        if timed_out:
+            self.counters["timeouts"] += 1
+        self.cond.notify_all()
+
+    def acquire(self, model, tokens=0):
+        """Blocks the calling thread until the request may be sent."""
+        if model not in self.buckets:
+            with self.cond:
+                self.in_flight += 1
+            return
+        deadline = time.monotonic() + self.queue_timeout
+        with self.cond:
+            ticket = self.enqueue(model)
+            while True:
+                wait = self.try_admit(model, ticket, tokens)
+                if wait == 0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.abandon(model, ticket)
+                    raise RateLimitTimeout(f"Groq is busy; the request waited over {self.queue_timeout:g}s for capacity. Please try again.")
+                self.cond.wait(min(wait, remaining) if wait else remaining)
+
+    async def acquire_async(self, model, tokens=0):
+        """Same as acquire() without blocking the event loop."""
+        if model not in self.buckets:
+            with self.cond:
+                self.in_flight += 1
+            return
+        deadline = time.monotonic() + self.queue_timeout
+        with self.cond:
+            ticket = self.enqueue(model)
+        while True:
+            with self.cond:
+                wait = self.try_admit(model, ticket, tokens)
+                remaining = deadline - time.monotonic()
+                if wait != 0 and remaining <= 0:
+                    self.abandon(model, ticket)
+                    raise RateLimitTimeout(f"Groq is busy; the request waited over {self.queue_timeout:g}s for capacity. Please try again.")
+            if wait == 0:
+                return
+            try:
+                await asyncio.sleep(min(wait or 0.05, remaining))
+            except asyncio.CancelledError:
+                with self.cond:
+                    self.abandon(model, ticket, timed_out=False)
+                raise
+
+    def release(self, model, reserved_tokens=0, used_tokens=None, throttled=False):
+        """Frees the concurrency slot and applies the AIMD adjustment."""
+        with self.cond:
+            self.in_flight -= 1
+            buckets = self.buckets.get(model)
+            if throttled:
+                # Multiplicative decrease, and stop sending to this model until its buckets refill
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                self.counters["throttled"] += 1
+                if buckets:
+                    for bucket in buckets:
+                        if bucket is not None:
+                            bucket.drain()
+            else:
+                # Additive increase: roughly +1 after a full window of successful calls
+                self.concurrency_limit = min(float(self.max_concurrency), self.concurrency_limit + 1.0 / self.concurrency_limit)
+                if buckets and buckets[1] is not None and used_tokens is not None:
+                    buckets[1].give_back(reserved_tokens - used_tokens)
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {
+                **self.counters,
+                "in_flight": self.in_flight,
+                "concurrency_limit": round(self.concurrency_limit, 2),
+                "queue_depth": {model: len(queue) for model, queue in self.waiting.items()}
+            }
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text):
+    """Local token estimate: ~4 characters per token, but at least one per word or symbol."""
+    text = str(text or "")
+    return max((len(text) + 3) // 4, len(TOKEN_PATTERN.findall(text)))
+
+def estimate_request_tokens(kwargs):
+    """Rough prompt size plus room for the reply."""
+    prompt_tokens = sum(estimate_tokens(message.get("content", "")) for message in kwargs.get("messages", []))
+    return prompt_tokens + kwargs.get("max_tokens", COMPLETION_TOKEN_RESERVE)
+
+def is_rate_limit_error(error):
+    return getattr(error, "status_code", None) == 429
+
+class SlotHoldingStream:
+    """
+    Streamed reply that keeps the concurrency slot until it is exhausted, fails, is
+    closed, or is garbage collected unread. Unlike a generator's finally block, the
+    last case also frees the slot of a stream that was never iterated.
+    """
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release_slot = release
+        self.iterator = None  # Opened on the first read
+        self.lock = threading.Lock()
+        self.released = False
+
+    def release(self):
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+        self.release_slot()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            if self.iterator is None:
+                self.iterator = iter(self.stream)
+            return next(self.iterator)
+        except BaseException:  # StopIteration included
+            self.release()
+            raise
+
+    def close(self):
+        try:
+            close = getattr(self.stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.release()
+
+class AsyncSlotHoldingStream(SlotHoldingStream):
+    """SlotHoldingStream for AsyncGroq streams."""
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            if self.iterator is None:
+                self.iterator = self.stream.__aiter__()
+            return await self.iterator.__anext__()
+        except BaseException:  # StopAsyncIteration included
+            self.release()
+            raise
+
+    def close(self):
+        self.release()  # Outside a coroutine the async stream cannot be awaited closed; free the slot anyway
+
+    async def aclose(self):
+        try:
+            close = getattr(self.stream, "close", None)  # AsyncStream.close is a coroutine
+            if close is not None:
+                await close()
+        finally:
+            self.release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+class RateLimitedCompletions:
+    """chat.completions facade that waits for limiter capacity before each request."""
+
+    def __init__(self, completions, limiter):
+        self.completions = completions
+        self.limiter = limiter
+
+    def create(self, **kwargs):
+        model = kwargs.get("model")
+        reserved = estimate_request_tokens(kwargs)
+        self.limiter.acquire(model, reserved)
+        try:
+            response = self.completions.create(**kwargs)
+        except BaseException as e:
+            self.limiter.release(model, reserved, throttled=is_rate_limit_error(e))
+            raise
+        if kwargs.get("stream"):
+            return SlotHoldingStream(response, lambda: self.limiter.release(model, reserved))
+        usage = getattr(response, "usage", None)
+        self.limiter.release(model, reserved, getattr(usage, "total_tokens", None))
+        return response
+
+class AsyncRateLimitedCompletions(RateLimitedCompletions):
+    """chat.completions facade for AsyncGroq."""
+
+    async def create(self, **kwargs):
+        model = kwargs.get("model")
+        reserved = estimate_request_tokens(kwargs)
+        await self.limiter.acquire_async(model, reserved)
+        try:
+            response = await self.completions.create(**kwargs)
+        except BaseException as e:  # Cancellation while waiting for the reply must free the slot too
+            self.limiter.release(model, reserved, throttled=is_rate_limit_error(e))
+            raise
+        if kwargs.get("stream"):
+            return AsyncSlotHoldingStream(response, lambda: self.limiter.release(model, reserved))
+        usage = getattr(response, "usage", None)
+        self.limiter.release(model, reserved, getattr(usage, "total_tokens", None))
+        return response
+
+class RateLimitedTranscriptions:
+    """audio.transcriptions facade; Whisper is budgeted by requests per minute only."""
+
+    def __init__(self, transcriptions, limiter):
+        self.transcriptions = transcriptions
+        self.limiter = limiter
+
+    def create(self, **kwargs):
+        model = kwargs.get("model")
+        self.limiter.acquire(model)
+        try:
+            response = self.transcriptions.create(**kwargs)
+        except Exception as e:
+            self.limiter.release(model, throttled=is_rate_limit_error(e))
+            raise
+        self.limiter.release(model)
+        return response
+
+class AsyncRateLimitedTranscriptions(RateLimitedTranscriptions):
+    """audio.transcriptions facade for AsyncGroq."""
+
+    async def create(self, **kwargs):
+        model = kwargs.get("model")
+        await self.limiter.acquire_async(model)
+        try:
+            response = await self.transcriptions.create(**kwargs)
+        except Exception as e:
+            self.limiter.release(model, throttled=is_rate_limit_error(e))
+            raise
+        self.limiter.release(model)
+        return response
+
+class RateLimitedClient:
+    """Wraps a Groq client so chat and transcription calls go through the limiter."""
+
+    completions_class = RateLimitedCompletions
+    transcriptions_class = RateLimitedTranscriptions
+
+    def __init__(self, inner, limiter):
+        self.inner = inner
+        self.chat = SimpleNamespace(completions=self.completions_class(inner.chat.completions, limiter))
+        self.audio = SimpleNamespace(transcriptions=self.transcriptions_class(inner.audio.transcriptions, limiter))
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+class AsyncRateLimitedClient(RateLimitedClient):
+    """Wraps an AsyncGroq client."""
+
+    completions_class = AsyncRateLimitedCompletions
+    transcriptions_class = AsyncRateLimitedTranscriptions
+
+# Shared by the sync and async clients so both paths draw from the same budgets
+GROQ_RATE_LIMITER = GroqRateLimiter(
+    {
+        GROQ_CHAT_MODEL: (GROQ_CHAT_RPM, GROQ_CHAT_TPM),
+        GROQ_WHISPER_MODEL: (GROQ_WHISPER_RPM, None),
+    },
+    max_concurrency=GROQ_MAX_CONCURRENCY,
+    queue_timeout=LLM_QUEUE_TIMEOUT
+)
+
+# --- Retries, Deadlines & Circuit Breaker ---
+# Every Groq request (chat, transcription, translation, itinerary, budget, route,
+# trivia) is retried on transient failures with exponential backoff and jitter,
+# honours Retry-After, stays within a total deadline, and fails fast while the
+# circuit breaker is open. The SDK's own retries are disabled (max_retries=0).
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 0.5))   # seconds before the first retry
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 8.0))     # cap for a single backoff
+LLM_REQUEST_DEADLINE = float(os.environ.get("LLM_REQUEST_DEADLINE", 60.0))  # total seconds per request, all attempts
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", 30.0))
+
+class CircuitOpenError(Exception):
+    """Raised without calling Groq while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive server-side failures, rejects calls for
+    `reset_timeout` seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.counters = {"opened": 0, "rejected": 0}
+
+    def before_call(self):
+        """Raises CircuitOpenError while open; returns True when this caller is the half-open trial."""
+        with self.lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"  # This caller is the trial request
+                return True
+            self.counters["rejected"] += 1
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(f"Groq appears to be unavailable; not sending requests for another {retry_in:.0f}s.")
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.trip()
+
+    def trip(self):
+        """Opens the breaker for a fresh reset_timeout. Callers hold the lock."""
+        if self.state != "open":
+            self.counters["opened"] += 1
+        self.state = "open"
+        self.opened_at = time.monotonic()
+
+    @contextlib.contextmanager
+    def guard(self):
+        """
+        before_call() for one attempt. A half-open trial that ends without
+        record_success() (4xx, 429, local rate-limit timeout, cancellation)
+        reopens the breaker, so it can never stay half-open.
+        """
+        trial = self.before_call()
+        try:
+            yield
+        finally:
+            if trial:
+                with self.lock:
+                    if self.state == "half_open":
+                        self.trip()
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "state": self.state, "consecutive_failures": self.consecutive_failures}
+
+def is_transient_error(error):
+    """Connection problems, timeouts, 408/409/429 and 5xx are worth another attempt."""
+    if isinstance(error, APIConnectionError):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code in (408, 409, 429) or (status_code is not None and status_code >= 500)
+
+def is_server_failure(error):
+    """Failures that suggest Groq itself is down (429 only means we are going too fast)."""
+    return is_transient_error(error) and getattr(error, "status_code", None) != 429
+
+def retry_after_seconds(error):
+    """Reads retry-after-ms / retry-after (seconds or HTTP date) from an API error response."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                retry_at = email.utils.parsedate_to_datetime(retry_after)
+                return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def backoff_delay(attempt, error):
+    """Retry-After when the server sent one, else capped exponential backoff with equal jitter."""
+    server_delay = retry_after_seconds(error)
+    if server_delay is not None:
+        return min(server_delay, LLM_REQUEST_DEADLINE)
+    delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def prepare_attempt(kwargs, deadline):
+    """Per-attempt kwargs: rewinds uploaded files and bounds the attempt by the remaining deadline."""
+    audio_file = kwargs.get("file")
+    if hasattr(audio_file, "seek"):
+        audio_file.seek(0)
+    attempt_kwargs = dict(kwargs)
+    attempt_kwargs.setdefault("timeout", max(1.0, deadline - time.monotonic()))
+    return attempt_kwargs
+
+class RetryingEndpoint:
+    """Wraps any `create(**kwargs)` endpoint with retries, a deadline and the circuit breaker."""
+
+    def __init__(self, endpoint, breaker):
+        self.endpoint = endpoint
+        self.breaker = breaker
+
+    def next_delay(self, attempt, error, deadline):
+        """Seconds to sleep before the next attempt, or None to give up and re-raise."""
+        if not is_transient_error(error) or attempt >= LLM_MAX_RETRIES:
+            return None
+        delay = backoff_delay(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def record(self, error=None):
+        if error is None:
+            self.breaker.record_success()
+        elif is_server_failure(error):
+            self.breaker.record_failure()
+        # Other errors (4xx, 429, RateLimitTimeout) say nothing about Groq's health
+
+    def create(self, **kwargs):
+        deadline = time.monotonic() + LLM_REQUEST_DEADLINE
+        attempt = 0
+        while True:
+            with self.breaker.guard():
+                try:
+                    response = self.endpoint.create(**prepare_attempt(kwargs, deadline))
+                    error = None
+                except Exception as e:
+                    error = e
+                self.record(error)
+            if error is None:
+                return response
+            delay = self.next_delay(attempt, error, deadline)
+            if delay is None:
+                raise error
+            print(f"Groq call failed ({error}); retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+class AsyncRetryingEndpoint(RetryingEndpoint):
+    """RetryingEndpoint for AsyncGroq endpoints."""
+
+    async def create(self, **kwargs):
+        deadline = time.monotonic() + LLM_REQUEST_DEADLINE
+        attempt = 0
+        while True:
+            with self.breaker.guard():
+                try:
+                    response = await self.endpoint.create(**prepare_attempt(kwargs, deadline))
+                    error = None
+                except Exception as e:
+                    error = e
+                self.record(error)
+            if error is None:
+                return response
+            delay = self.next_delay(attempt, error, deadline)
+            if delay is None:
+                raise error
+            print(f"Groq call failed ({error}); retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+class RetryingClient:
+    """Applies RetryingEndpoint to chat.completions and audio.transcriptions."""
+
+    endpoint_class = RetryingEndpoint
+
+    def __init__(self, inner, breaker):
+        self.inner = inner
+        self.chat = SimpleNamespace(completions=self.endpoint_class(inner.chat.completions, breaker))
+        self.audio = SimpleNamespace(transcriptions=self.endpoint_class(inner.audio.transcriptions, breaker))
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+class AsyncRetryingClient(RetryingClient):
+    """Wraps an AsyncGroq client."""
+
+    endpoint_class = AsyncRetryingEndpoint
+
+GROQ_CIRCUIT_BREAKER = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+
+# --- Single-Flight Request Coalescing ---
+class SingleFlight:
+    """
+    Collapses identical concurrent calls: the first caller for a key runs the
+    upstream call, later callers with the same key wait for and share its result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}  # key -> {"event", "result", "error"}
+        self.in_flight_async = {}  # (event loop id, key) -> asyncio.Future
+        self.counters = {"executed": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = {"event": threading.Event(), "result": None, "error": None}
+                self.in_flight[key] = call
+                self.counters["executed"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not is_leader:
+            call["event"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call["event"].set()
+
+    async def do_async(self, key, coro_fn):
+        """Same as do() for coroutines; followers await the leader's future."""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self.lock:
+            future = self.in_flight_async.get(flight_key)
+            is_leader = future is None
+            if is_leader:
+                future = loop.create_future()
+                self.in_flight_async[flight_key] = future
+                self.counters["executed"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not is_leader:
+            return await asyncio.shield(future)
+
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so a lone leader does not log "never retrieved"
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight_async[flight_key]
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "in_flight": len(self.in_flight) + len(self.in_flight_async)}
+
+class SingleFlightCompletions:
+    """chat.completions facade that coalesces identical non-streaming requests."""
+
+    def __init__(self, completions, flight):
+        self.completions = completions
+        self.flight = flight
+
+    def create(self, **kwargs):
+        if kwargs.get("stream"):
+            return self.completions.create(**kwargs)  # Stream iterators cannot be shared
+        key = hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return self.flight.do(key, lambda: self.completions.create(**kwargs))
+
+class AsyncSingleFlightCompletions(SingleFlightCompletions):
+    """chat.completions facade for AsyncGroq."""
+
+    async def create(self, **kwargs):
+        if kwargs.get("stream"):
+            return await self.completions.create(**kwargs)
+        key = hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return await self.flight.do_async(key, lambda: self.completions.create(**kwargs))
+
+class SingleFlightClient:
+    """Wraps a Groq client; everything except chat.completions passes straight through."""
+
+    completions_class = SingleFlightCompletions
+
+    def __init__(self, inner, flight):
+        self.inner = inner
+        self.chat = SimpleNamespace(completions=self.completions_class(inner.chat.completions, flight))
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+class AsyncSingleFlightClient(SingleFlightClient):
+    """Wraps an AsyncGroq client."""
+
+    completions_class = AsyncSingleFlightCompletions
+
+LLM_SINGLE_FLIGHT = SingleFlight()
+
 # --- Groq Client Initialization ---
 client = None
 if API_KEY:
     try:
-        client = Groq(api_key=API_KEY)
+        # Coalesce -> retry -> rate limit -> Groq (SDK retries off; RetryingClient owns them)
+        client = SingleFlightClient(
+            RetryingClient(RateLimitedClient(Groq(api_key=API_KEY, max_retries=0), GROQ_RATE_LIMITER), GROQ_CIRCUIT_BREAKER),
+            LLM_SINGLE_FLIGHT
+        )
     except Exception as e:
         print(f"Error initializing Groq client: {e}")
         client = None
 
+async_client = None
+if API_KEY and USE_ASYNC_HANDLERS:
+    try:
+        async_client = AsyncSingleFlightClient(
+            AsyncRetryingClient(AsyncRateLimitedClient(AsyncGroq(api_key=API_KEY, max_retries=0), GROQ_RATE_LIMITER), GROQ_CIRCUIT_BREAKER),
+            LLM_SINGLE_FLIGHT
+        )
+    except Exception as e:
+        print(f"Error initializing async Groq client: {e}")
+        async_client = None
+
+# --- LLM Response Cache ---
+# Deterministic tabs (culture, itinerary, budget, route) are cached on
+# model + system prompt + normalized user inputs: an in-memory LRU in front of
+# an optional SQLite tier that survives restarts (set RESPONSE_CACHE_DB_FILE="" to disable).
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 24 * 60 * 60))  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+RESPONSE_CACHE_DB_FILE = os.environ.get("RESPONSE_CACHE_DB_FILE", "travel_response_cache.sqlite3")
+
+class MemoryResponseCache:
+    """Thread-safe in-memory LRU cache whose entries expire after `ttl` seconds."""
+
+    in_memory = True  # Cheap enough to query on the event loop
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (time.time() + (ttl or self.ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class SQLiteResponseCache:
+    """Persistent cache tier backed by a SQLite file in WAL mode."""
+
+    def __init__(self, path, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + (ttl or self.ttl))
+            )
+            self.conn.commit()
+
+class TieredResponseCache:
+    """
+    Looks up each tier in order, promoting hits into the faster tiers.
+    Any object with get(key) / set(key, value, ttl=None) can be used as a tier;
+    tiers with a true `in_memory` attribute must come first.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.memory_tiers = sum(1 for tier in tiers if getattr(tier, "in_memory", False))
+        self.counters = {"hits": 0, "misses": 0, "tier_hits": [0] * len(tiers)}
+        self.lock = threading.Lock()
+
+    def lookup(self, key, start, stop):
+        """Checks tiers[start:stop]; a hit is promoted into every faster tier and counted."""
+        for index in range(start, stop):
+            tier = self.tiers[index]
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                print(f"Response cache tier {type(tier).__name__} failed on get: {e}")
+                continue
+            if value is not None:
+                for faster_tier in self.tiers[:index]:
+                    faster_tier.set(key, value)
+                with self.lock:
+                    self.counters["hits"] += 1
+                    self.counters["tier_hits"][index] += 1
+                return value
+        return None
+
+    def get(self, key):
+        value = self.lookup(key, 0, len(self.tiers))
+        if value is None:
+            with self.lock:
+                self.counters["misses"] += 1
+        return value
+
+    async def get_async(self, key):
+        """get() for async handlers: memory tiers answer on the event loop, disk tiers in a worker thread."""
+        value = self.lookup(key, 0, self.memory_tiers)
+        if value is None and self.memory_tiers < len(self.tiers):
+            value = await asyncio.to_thread(self.lookup, key, self.memory_tiers, len(self.tiers))
+        if value is None:
+            with self.lock:
+                self.counters["misses"] += 1
+        return value
+
+    def store(self, key, value, ttl, start, stop):
+        for tier in self.tiers[start:stop]:
+            try:
+                tier.set(key, value, ttl)
+            except Exception as e:
+                print(f"Response cache tier {type(tier).__name__} failed on set: {e}")
+
+    def set(self, key, value, ttl=None):
+        self.store(key, value, ttl, 0, len(self.tiers))
+
+    async def set_async(self, key, value, ttl=None):
+        """set() for async handlers; disk tiers are written from a worker thread."""
+        self.store(key, value, ttl, 0, self.memory_tiers)
+        if self.memory_tiers < len(self.tiers):
+            await asyncio.to_thread(self.store, key, value, ttl, self.memory_tiers, len(self.tiers))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "tier_hits": list(self.counters["tier_hits"]),
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0
+            }
+
+def normalize_cache_input(value):
+    """Case-folds and collapses whitespace so 'Kyoto,  Japan' and 'kyoto, japan' share an entry."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Sliders may send 3.0 for 3
+    return re.sub(r"\s+", " ", str(value if value is not None else "")).strip().casefold()
+
+def llm_cache_key(model, system_prompt, *user_inputs):
+    """Stable cache key for one model + system prompt + normalized user inputs."""
+    payload = json.dumps(
+        [model, system_prompt, [normalize_cache_input(value) for value in user_inputs]],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def build_response_cache():
+    """Memory tier always; SQLite tier when RESPONSE_CACHE_DB_FILE is set and usable."""
+    tiers = [MemoryResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL)]
+    if RESPONSE_CACHE_DB_FILE:
+        try:
+            tiers.append(SQLiteResponseCache(RESPONSE_CACHE_DB_FILE, RESPONSE_CACHE_TTL))
+        except Exception as e:
+            print(f"Persistent response cache disabled: {e}")
+    return TieredResponseCache(tiers)
+
+RESPONSE_CACHE = build_response_cache()
+
+# --- Shared Completion Helpers ---
+def read_file_bytes(path):
+    """Reads a whole file; used with asyncio.to_thread by the async handlers."""
+    with open(path, "rb") as f:
+        return f.read()
+
+def parse_llm_json(raw_json_string):
+    """
+    Parses the first JSON object in an answer, ignoring ``` fences and surrounding prose.
+    On failure the JSONDecodeError's .doc holds the raw text for error messages.
+    """
+    return extract_json_object(raw_json_string)
+
+def complete_chat(messages, cache_key=None, parse=None, **params):
+    """
+    Runs one non-streaming chat completion and returns its text, or parse(text).
+    Extra params (e.g. max_tokens) go to the API. With a cache_key the response
+    cache is consulted first; only responses that parse successfully are stored.
+    """
+    text = RESPONSE_CACHE.get(cache_key) if cache_key else None
+    is_fresh = text is None
+    if is_fresh:
+        chat_completion = client.chat.completions.create(
+            messages=messages,
+            model=GROQ_CHAT_MODEL,
+            **params
+        )
+        text = chat_completion.choices[0].message.content.strip()
+
+    result = parse(text) if parse else text
+    if is_fresh and cache_key:
+        RESPONSE_CACHE.set(cache_key, text)
+    return result
+
+async def complete_chat_async(messages, cache_key=None, parse=None, **params):
+    """
+    Async version of complete_chat, using the AsyncGroq client.
+    """
+    text = await RESPONSE_CACHE.get_async(cache_key) if cache_key else None
+    is_fresh = text is None
+    if is_fresh:
+        chat_completion = await async_client.chat.completions.create(
+            messages=messages,
+            model=GROQ_CHAT_MODEL,
+            **params
+        )
+        text = chat_completion.choices[0].message.content.strip()
+
+    result = parse(text) if parse else text
+    if is_fresh and cache_key:
+        await RESPONSE_CACHE.set_async(cache_key, text)
+    return result
+
+def select_handler(sync_handler, async_handler):
+    """Picks the async handler when GROQ_ASYNC_HANDLERS is enabled."""
+    return async_handler if USE_ASYNC_HANDLERS and async_client is not None else sync_handler
+
+# --- Structured LLM Output ---
+# Itinerary, budget and trivia answers are requested in Groq's JSON mode
+# (GROQ_JSON_MODE=0 turns it off). The first balanced JSON object is extracted
+# from whatever comes back, tolerating prose around it, ``` fences, // comments
+# and trailing commas. It is then checked against the tool's schema. A reply that
+# fails gets at most one repair request quoting the problems. Parse failures are
+# counted per tool.
+STRUCTURED_JSON_MODE = os.environ.get("GROQ_JSON_MODE", "1").strip().lower() in ("1", "true", "yes")
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+STRUCTURED_STATS = {}  # tool -> {"requests", "parse_failures", "repaired", "failed"}
+STRUCTURED_STATS_LOCK = threading.Lock()
+
+class StructuredOutputError(json.JSONDecodeError):
+    """No usable JSON object in a reply; .doc holds the raw reply and .problems what was wrong."""
+
+    def __init__(self, problems, doc):
+        super().__init__("; ".join(problems), doc, 0)
+        self.problems = problems
+
+def balanced_json_candidate(text, start):
+    """
+    JSON source of the object opening at text[start] with // comments and trailing
+    commas dropped, or None when its braces never balance (e.g. a truncated reply).
+    """
+    out, depth, in_string, escaped, position = [], 0, False, False, start
+    while position < len(text):
+        char = text[position]
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            out.append(char)
+        elif text.startswith("//", position):
+            newline = text.find("\n", position)
+            position = len(text) if newline == -1 else newline
+            continue
+        elif char in "}]":
+            last = len(out) - 1
+            while last >= 0 and out[last].isspace():
+                last -= 1
+            if last >= 0 and out[last] == ",":
+                del out[last]
+            out.append(char)
+            depth -= 1
+            if depth == 0:
+                return "".join(out)
+        else:
+            if char in "{[":
+                depth += 1
+            out.append(char)
+        position += 1
+    return None
+
+def extract_json_object(text):
+    """First balanced `{...}` in `text` that parses as a JSON object; StructuredOutputError otherwise."""
+    text = text or ""
+    start = text.find("{")
+    while start != -1:
+        candidate = balanced_json_candidate(text, start)
+        if candidate is None:
+            break  # Later braces sit inside the same unbalanced object
+        try:
+            data = json.loads(candidate)
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            pass
+        start = text.find("{", start + 1)
+    raise StructuredOutputError(["the reply does not contain a complete JSON object"], text)
+
+def schema_problems(value, spec, path="reply"):
+    """
+    Mismatches between a parsed value and a schema spec: a type (or tuple of types),
+    a dict of required fields, or a one-item list describing every element.
+    """
+    if isinstance(spec, dict):
+        if not isinstance(value, dict):
+            return [f"{path} must be an object"]
+        problems = []
+        for key, field_spec in spec.items():
+            if key not in value:
+                problems.append(f"{path}.{key} is missing")
+            else:
+                problems.extend(schema_problems(value[key], field_spec, f"{path}.{key}"))
+        return problems
+    if isinstance(spec, list):
+        if not isinstance(value, list) or not value:
+            return [f"{path} must be a non-empty list"]
+        return [problem for index, item in enumerate(value) for problem in schema_problems(item, spec[0], f"{path}[{index}]")]
+    if not isinstance(value, spec):
+        expected = " or ".join(kind.__name__ for kind in spec) if isinstance(spec, tuple) else spec.__name__
+        return [f"{path} must be a {expected}"]
+    return []
+
+def budget_problems(data):
+    if not budget_line_items(data["estimated_daily_budget"]):
+        return ["reply.estimated_daily_budget needs numeric USD amounts"]
+    return []
+
+def trivia_problems(data, path="reply"):
+    letters = tuple("ABCD"[:len(data["options"])])  # A tuple, so "" or "AB" is not a substring match
+    if len(data["options"]) < 2:
+        return [f"{path}.options needs at least two options"]
+    if data["correct_answer"] not in letters:
+        return [f"{path}.correct_answer must be one of the letters {', '.join(letters)}"]
+    return []
+
+def trivia_set_problems(data):
+    return [problem for index, question in enumerate(data["questions"]) for problem in trivia_problems(question, f"reply.questions[{index}]")]
+
+def batch_translation_problems(data):
+    # Languages the reply leaves out are translated one at a time, so one usable entry is enough
+    if not any(isinstance(value, str) and value.strip() for value in data.values()):
+        return ["reply must map each language name to its translated text"]
+    return []
+
+# tool -> (schema spec, extra check or None)
+STRUCTURED_SCHEMAS = {
+    "itinerary": ({"daily_plan": [{"morning": str, "afternoon": str, "evening": str}]}, None),
+    "budget": ({"estimated_daily_budget": {}}, budget_problems),
+    "trivia": ({"question": str, "options": [str], "correct_answer": str}, trivia_problems),
+    "trivia_set": ({"questions": [{"question": str, "options": [str], "correct_answer": str}]}, trivia_set_problems),
+    "batch_translation": ({}, batch_translation_problems),
+}
+
+def parse_structured(tool, text):
+    """Extracts and validates the JSON object for `tool`; raises StructuredOutputError."""
+    data = extract_json_object(text)
+    spec, check = STRUCTURED_SCHEMAS[tool]
+    problems = schema_problems(data, spec)
+    if not problems and check:
+        problems = check(data)
+    if problems:
+        raise StructuredOutputError(problems, text)
+    return data
+
+def record_structured_result(tool, outcome):
+    """outcome: "ok", "repaired" or "failed"."""
+    with STRUCTURED_STATS_LOCK:
+        stats = STRUCTURED_STATS.setdefault(tool, {"requests": 0, "parse_failures": 0, "repaired": 0, "failed": 0})
+        stats["requests"] += 1
+        if outcome != "ok":
+            stats["parse_failures"] += 1
+            stats[outcome] += 1
+
+def structured_output_stats():
+    """Per-tool counters plus the share of first replies that failed to parse or validate."""
+    with STRUCTURED_STATS_LOCK:
+        return {
+            tool: {**stats, "parse_failure_rate": round(stats["parse_failures"] / stats["requests"], 4) if stats["requests"] else 0.0}
+            for tool, stats in STRUCTURED_STATS.items()
+        }
+
+def json_mode_failed_generation(error):
+    """
+    Groq answers a JSON-mode reply that is not valid JSON with a 400 json_validate_failed;
+    returns the rejected text so it can be repaired, or None for any other error.
+    """
+    if getattr(error, "status_code", None) != 400:
+        return None
+    body = getattr(error, "body", None)
+    details = body.get("error", body) if isinstance(body, dict) else None
+    if not isinstance(details, dict) or details.get("code") != "json_validate_failed":
+        return None
+    return details.get("failed_generation") or ""
+
+def build_repair_messages(messages, bad_reply, problems):
+    return messages + [
+        {"role": "assistant", "content": bad_reply or "(empty reply)"},
+        {"role": "user", "content": (
+            f"Your previous reply could not be used: {'; '.join(problems)}. "
+            f"Reply again with ONLY the corrected JSON object, following the schema in the system prompt."
+        )}
+    ]
+
+def request_structured_text(messages, **params):
+    params = {**params, "response_format": JSON_RESPONSE_FORMAT} if STRUCTURED_JSON_MODE else params
+    try:
+        return complete_chat(messages, **params)
+    except APIError as e:
+        failed_generation = json_mode_failed_generation(e)
+        if failed_generation is None:
+            raise
+        return failed_generation
+
+async def request_structured_text_async(messages, **params):
+    params = {**params, "response_format": JSON_RESPONSE_FORMAT} if STRUCTURED_JSON_MODE else params
+    try:
+        return await complete_chat_async(messages, **params)
+    except APIError as e:
+        failed_generation = json_mode_failed_generation(e)
+        if failed_generation is None:
+            raise
+        return failed_generation
+
+def cached_structured(tool, cached_text):
+    """Validated object from a response cache entry, or None."""
+    if cached_text is None:
+        return None
+    try:
+        return parse_structured(tool, cached_text)
+    except json.JSONDecodeError:
+        return None  # Stored before validation existed; fetch a fresh answer
+
+def complete_structured(tool, messages, cache_key=None, **params):
+    """
+    Structured counterpart of complete_chat: returns the validated JSON object for
+    `tool`, repairing an unusable reply once. Only validated objects are cached.
+    """
+    data = cached_structured(tool, RESPONSE_CACHE.get(cache_key) if cache_key else None)
+    if data is not None:
+        return data
+
+    reply = request_structured_text(messages, **params)
+    try:
+        data = parse_structured(tool, reply)
+        record_structured_result(tool, "ok")
+    except StructuredOutputError as e:
+        print(f"{tool} reply unusable ({e.msg}); requesting a repair")
+        repaired_reply = request_structured_text(build_repair_messages(messages, reply, e.problems), **params)
+        try:
+            data = parse_structured(tool, repaired_reply)
+        except StructuredOutputError:
+            record_structured_result(tool, "failed")
+            raise
+        record_structured_result(tool, "repaired")
+
+    if cache_key:
+        RESPONSE_CACHE.set(cache_key, json.dumps(data, ensure_ascii=False))
+    return data
+
+async def complete_structured_async(tool, messages, cache_key=None, **params):
+    """
+    Async version of complete_structured.
+    """
+    data = cached_structured(tool, await RESPONSE_CACHE.get_async(cache_key) if cache_key else None)
+    if data is not None:
+        return data
+
+    reply = await request_structured_text_async(messages, **params)
+    try:
+        data = parse_structured(tool, reply)
+        record_structured_result(tool, "ok")
+    except StructuredOutputError as e:
+        print(f"{tool} reply unusable ({e.msg}); requesting a repair")
+        repaired_reply = await request_structured_text_async(build_repair_messages(messages, reply, e.problems), **params)
+        try:
+            data = parse_structured(tool, repaired_reply)
+        except StructuredOutputError:
+            record_structured_result(tool, "failed")
+            raise
+        record_structured_result(tool, "repaired")
+
+    if cache_key:
+        await RESPONSE_CACHE.set_async(cache_key, json.dumps(data, ensure_ascii=False))
+    return data
+
+# --- Chat History Context Management ---
+# The chatbot keeps the system prompt and the most recent turns verbatim within
+# CHAT_HISTORY_TOKEN_BUDGET; older turns are folded into a rolling summary. Summaries
+# are cached by a hash of the history prefix they cover, so each turn of a long
+# conversation only summarizes the turns that newly fell out of the window.
+CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", 2000))
+CHAT_HISTORY_LOW_WATERMARK = 0.5   # After summarizing, recent turns use at most this share of the budget
+CHAT_SUMMARY_MAX_TOKENS = 300      # Length cap for the rolling summary
+CHAT_SUMMARY_CACHE_SIZE = 2048     # Conversation prefixes whose summaries are kept in memory
+
+CHAT_SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a traveller and a tourism assistant. "
+    "Merge the new turns into the existing summary. Keep destinations, dates, budgets, preferences, "
+    "the language the traveller writes in, and any facts or recommendations already given. "
+    "Write compact plain prose, at most 150 words, with no preamble."
+)
+
+CHAT_SUMMARY_CACHE = OrderedDict()  # prefix hash -> summary of the turns in that prefix
+CHAT_SUMMARY_LOCK = threading.Lock()
+
+def history_prefix_hashes(turns):
+    """hashes[k] identifies turns[:k]; each hash chains the previous one, so this is one pass."""
+    hashes = [hashlib.sha256(b"").hexdigest()]
+    for human, assistant in turns:
+        turn_bytes = json.dumps([human, assistant], ensure_ascii=False).encode("utf-8")
+        hashes.append(hashlib.sha256(hashes[-1].encode("ascii") + turn_bytes).hexdigest())
+    return hashes
+
+def turn_tokens(turn):
+    human, assistant = turn
+    return estimate_tokens(human) + estimate_tokens(assistant)
+
+def plan_chat_context(message, history):
+    """
+    Works out which turns stay verbatim and which must still be summarized.
+    Returns (turns, hashes, start, end, summary): turns[:start] are covered by `summary`,
+    turns[start:end] need folding into it, and turns[end:] are sent verbatim.
+    """
+    turns = [(human or "", assistant or "") for human, assistant in history]
+    hashes = history_prefix_hashes(turns)
+
+    # Longest prefix that already has a summary
+    start, summary = 0, ""
+    with CHAT_SUMMARY_LOCK:
+        for k in range(len(turns), 0, -1):
+            if hashes[k] in CHAT_SUMMARY_CACHE:
+                start, summary = k, CHAT_SUMMARY_CACHE[hashes[k]]
+                CHAT_SUMMARY_CACHE.move_to_end(hashes[k])
+                break
+
+    recent_tokens = [turn_tokens(turn) for turn in turns[start:]]
+    if not recent_tokens or sum(recent_tokens) + estimate_tokens(message) + estimate_tokens(summary) <= CHAT_HISTORY_TOKEN_BUDGET:
+        return turns, hashes, start, start, summary
+
+    # Over budget: keep the newest turns that fit under the low watermark (at least one)
+    end = len(turns) - 1
+    kept_tokens = recent_tokens[-1] if recent_tokens else 0
+    target = CHAT_HISTORY_TOKEN_BUDGET * CHAT_HISTORY_LOW_WATERMARK
+    while end > start and kept_tokens + recent_tokens[end - 1 - start] <= target:
+        end -= 1
+        kept_tokens += recent_tokens[end - start]
+    return turns, hashes, start, end, summary
+
+def next_summary_chunk(turns, start, end):
+    """End index of the next batch of turns to summarize, bounded by the history budget."""
+    stop, chunk_tokens = start, 0
+    while stop < end and (stop == start or chunk_tokens + turn_tokens(turns[stop]) <= CHAT_HISTORY_TOKEN_BUDGET):
+        chunk_tokens += turn_tokens(turns[stop])
+        stop += 1
+    return stop
+
+def build_summary_messages(summary, turns):
+    transcript = "\n".join(f"Traveller: {human}\nAssistant: {assistant}" for human, assistant in turns)
+    return [
+        {"role": "system", "content": CHAT_SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"}
+    ]
+
+def remember_chat_summary(prefix_hash, summary):
+    with CHAT_SUMMARY_LOCK:
+        CHAT_SUMMARY_CACHE[prefix_hash] = summary
+        CHAT_SUMMARY_CACHE.move_to_end(prefix_hash)
+        while len(CHAT_SUMMARY_CACHE) > CHAT_SUMMARY_CACHE_SIZE:
+            CHAT_SUMMARY_CACHE.popitem(last=False)
+
+def assemble_chat_messages(summary, recent_turns, message):
+    """System prompt, rolling summary, verbatim recent turns, then the new user message."""
+    messages = [{"role": "system", "content": TOURISM_EXPERT_SYSTEM_PROMPT}]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+
+    for human, assistant in recent_turns:
+        messages.append({"role": "user", "content": human})
+        messages.append({"role": "assistant", "content": assistant})
+
+    messages.append({"role": "user", "content": message})
+    return messages
+
+# --- Chat Stream Batching ---
+# Tokens are collected in a list and handed to Gradio at most every
+# CHAT_STREAM_FLUSH_INTERVAL seconds instead of once per token. Gradio streams
+# each yield to the browser as a diff against the previous value, so fewer,
+# larger yields mean fewer messages and far less re-diffing of a growing reply.
+CHAT_STREAM_FLUSH_INTERVAL = float(os.environ.get("CHAT_STREAM_FLUSH_INTERVAL", 0.05))  # seconds
+STREAM_STATS = {"replies": 0, "deltas": 0, "flushes": 0, "chars_flushed": 0}
+STREAM_STATS_LOCK = threading.Lock()
+
+class StreamBuffer:
+    """Accumulates streamed deltas and decides when the reply so far should be flushed."""
+
+    def __init__(self, flush_interval=CHAT_STREAM_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.parts = []
+        self.pending = False
+        self.deltas = 0
+        self.flushes = 0
+        self.chars_flushed = 0
+        self.last_flush = 0.0  # The first delta is flushed immediately
+
+    def text(self):
+        # Collapse the parts so the next join only copies the new tail once
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+        return self.parts[0] if self.parts else ""
+
+    def flush(self):
+        text = self.text()
+        self.pending = False
+        self.last_flush = time.monotonic()
+        self.flushes += 1
+        self.chars_flushed += len(text)
+        return text
+
+    def add(self, delta):
+        """Returns the reply so far when a flush is due, otherwise None."""
+        self.parts.append(delta)
+        self.pending = True
+        self.deltas += 1
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            return self.flush()
+        return None
+
+    def finish(self):
+        """Returns the complete reply if anything is still unflushed, otherwise None."""
+        text = self.flush() if self.pending else None
+        with STREAM_STATS_LOCK:
+            STREAM_STATS["replies"] += 1
+            STREAM_STATS["deltas"] += self.deltas
+            STREAM_STATS["flushes"] += self.flushes
+            STREAM_STATS["chars_flushed"] += self.chars_flushed
+        return text
+
+def chunk_delta(chunk):
+    """Text carried by one streamed completion chunk, if any."""
+    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+        return chunk.choices[0].delta.content
+    return None
+
+# --- Audio Pre-processing & Chunking (ffmpeg) ---
+# Uploads are normalized before Whisper sees them: downmixed to mono, resampled to
+# 16kHz, leading/trailing silence trimmed and encoded as FLAC, which is several
+# times smaller than the browser's 44.1/48kHz WAV. Long recordings are then cut at
+# silences into ~TRANSCRIBE_CHUNK_SECONDS pieces and transcribed in parallel.
+# Transcripts are cached by a hash of the uploaded bytes, so re-uploading the same
+# clip skips the API. Needs the ffmpeg binary; without it every file is sent to
+# Whisper unchanged in one request.
+try:
+    import ffmpeg
+except ImportError:
+    ffmpeg = None
+
+WHISPER_MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # Groq Whisper request size limit
+WHISPER_SAMPLE_RATE = 16000         # Whisper resamples to 16kHz mono internally anyway
+TRANSCRIBE_CHUNK_SECONDS = float(os.environ.get("TRANSCRIBE_CHUNK_SECONDS", 600))  # Target chunk length
+TRANSCRIBE_CUT_WINDOW = 90.0        # Look this many seconds before the target for a silence to cut at
+TRANSCRIBE_MAX_PARALLEL = int(os.environ.get("TRANSCRIBE_MAX_PARALLEL", 4))
+SILENCE_NOISE_LEVEL = "-35dB"       # silencedetect / silenceremove threshold
+SILENCE_MIN_DURATION = 0.4          # seconds of quiet that count as a pause
+TRIM_TAIL_MAX_SECONDS = 600         # Trailing-silence trim buffers the clip in memory (~64 KB/s at 16kHz mono float)
+TRANSCRIPT_CACHE_TTL = int(os.environ.get("TRANSCRIPT_CACHE_TTL", 30 * 24 * 60 * 60))  # seconds
+
+AUDIO_STATS = {
+    "uploads": 0, "cache_hits": 0, "requests": 0,
+    "bytes_in": 0, "bytes_sent": 0, "normalize_seconds": 0.0, "upload_seconds": 0.0
+}
+AUDIO_STATS_LOCK = threading.Lock()
+
+def audio_stats():
+    """AUDIO_STATS plus derived bytes saved and average upload latency."""
+    with AUDIO_STATS_LOCK:
+        stats = dict(AUDIO_STATS)
+    sent_uploads = stats["uploads"] - stats["cache_hits"]
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_sent"]
+    stats["avg_upload_seconds"] = round(stats["upload_seconds"] / sent_uploads, 3) if sent_uploads else 0.0
+    return stats
+
+def record_audio_upload(audio_filepath, sent_paths=(), normalize_seconds=0.0, upload_seconds=0.0):
+    """Adds one transcription to AUDIO_STATS; a cache hit sends nothing."""
+    bytes_in = os.path.getsize(audio_filepath)
+    bytes_sent = sum(os.path.getsize(path) for path in sent_paths)
+    with AUDIO_STATS_LOCK:
+        AUDIO_STATS["uploads"] += 1
+        AUDIO_STATS["cache_hits"] += 0 if sent_paths else 1
+        AUDIO_STATS["requests"] += len(sent_paths)
+        AUDIO_STATS["bytes_in"] += bytes_in
+        AUDIO_STATS["bytes_sent"] += bytes_sent if sent_paths else bytes_in
+        AUDIO_STATS["normalize_seconds"] += normalize_seconds
+        AUDIO_STATS["upload_seconds"] += upload_seconds
+    if sent_paths:
+        print(f"Transcription upload: {bytes_in} -> {bytes_sent} bytes in {len(sent_paths)} request(s), "
+              f"normalize {normalize_seconds:.2f}s, Whisper {upload_seconds:.2f}s")
+
+def transcript_cache_key(audio_filepath):
+    """Response-cache key from the SHA-256 of the uploaded bytes."""
+    digest = hashlib.sha256()
+    with open(audio_filepath, "rb") as audio_file:
+        for block in iter(lambda: audio_file.read(1024 * 1024), b""):
+            digest.update(block)
+    return llm_cache_key(GROQ_WHISPER_MODEL, "transcription", digest.hexdigest())
+
+def probe_audio_duration(audio_filepath):
+    """Duration in seconds, or None if ffmpeg is unavailable or cannot read the file."""
+    if ffmpeg is None:
+        return None
+    try:
+        return float(ffmpeg.probe(audio_filepath)["format"]["duration"])
+    except Exception as e:
+        print(f"Could not probe audio duration: {e}")
+        return None
+
+def detect_silences(audio_filepath):
+    """List of (start, end) seconds of silence reported by ffmpeg's silencedetect filter."""
+    _, stderr = (
+        ffmpeg.input(audio_filepath)
+        .filter("silencedetect", noise=SILENCE_NOISE_LEVEL, d=SILENCE_MIN_DURATION)
+        .output("-", format="null")
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    log = stderr.decode("utf-8", errors="replace")
+    starts = [float(value) for value in re.findall(r"silence_start: (-?[\d.]+)", log)]
+    ends = [float(value) for value in re.findall(r"silence_end: ([\d.]+)", log)]
+    return list(zip(starts, ends))
+
+def plan_audio_chunks(duration, silences, chunk_seconds=TRANSCRIBE_CHUNK_SECONDS):
+    """
+    (start, end) pieces of about chunk_seconds each, cut in the middle of the last
+    silence before each target point (or hard at the target if there is none).
+    """
+    pause_points = sorted((start + end) / 2 for start, end in silences)
+    chunks, chunk_start = [], 0.0
+    while duration - chunk_start > chunk_seconds:
+        target = chunk_start + chunk_seconds
+        # Only pauses past chunk_start, or a chunk length under the cut window would never advance
+        candidates = [point for point in pause_points if max(chunk_start, target - TRANSCRIBE_CUT_WINDOW) < point <= target]
+        cut = candidates[-1] if candidates else target
+        chunks.append((chunk_start, cut))
+        chunk_start = cut
+    chunks.append((chunk_start, duration))
+    return chunks
+
+def encode_audio_chunk(audio_filepath, output_path, start=None, length=None):
+    """Writes [start, start + length) of the input as 16kHz mono 16-bit FLAC."""
+    input_args = {}
+    if start is not None:
+        input_args["ss"] = start
+    if length is not None:
+        input_args["t"] = length
+    (
+        ffmpeg.input(audio_filepath, **input_args)
+        .output(output_path, ac=1, ar=WHISPER_SAMPLE_RATE, sample_fmt="s16", format="flac")
+        .overwrite_output()
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    return output_path
+
+def encode_audio_chunks_one_by_one(audio_filepath, work_dir, chunks):
+    """Fallback for encode_audio_chunks: one seek-and-encode ffmpeg run per chunk."""
+    return [
+        encode_audio_chunk(audio_filepath, os.path.join(work_dir, f"chunk_{index:04d}.flac"), start, end - start)
+        for index, (start, end) in enumerate(chunks)
+    ]
+
+def encode_audio_chunks(audio_filepath, work_dir, chunks):
+    """
+    Writes consecutive (start, end) pieces as 16kHz mono 16-bit FLAC files in a single
+    ffmpeg pass (segment muxer), rather than one seek-and-decode run per chunk. Returns
+    the chunk paths in order; raises ValueError if the muxer wrote a different number.
+    """
+    pattern = os.path.join(work_dir, "chunk_%04d.flac")
+    (
+        ffmpeg.input(audio_filepath).audio
+        .output(
+            pattern, format="segment", segment_format="flac", reset_timestamps=1,
+            segment_times=",".join(f"{end:.3f}" for _, end in chunks[:-1]),
+            ac=1, ar=WHISPER_SAMPLE_RATE, sample_fmt="s16", acodec="flac"
+        )
+        .overwrite_output()
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    chunk_paths = sorted(
+        os.path.join(work_dir, name) for name in os.listdir(work_dir)
+        if name.startswith("chunk_") and name.endswith(".flac")
+    )
+    if len(chunk_paths) != len(chunks):
+        raise ValueError(f"segment muxer wrote {len(chunk_paths)} chunks, expected {len(chunks)}")
+    return chunk_paths
+
+def trim_silence(stream, duration):
+    """Drops leading silence, and trailing silence for clips up to TRIM_TAIL_MAX_SECONDS."""
+    trim = {"start_periods": 1, "start_threshold": SILENCE_NOISE_LEVEL, "start_silence": 0.1}
+    stream = stream.filter("silenceremove", **trim)
+    if duration <= TRIM_TAIL_MAX_SECONDS:
+        stream = stream.filter("areverse").filter("silenceremove", **trim).filter("areverse")
+    return stream
+
+def normalize_audio(audio_filepath, work_dir, duration):
+    """Mono 16kHz FLAC copy of the upload with leading/trailing silence trimmed."""
+    output_path = os.path.join(work_dir, "normalized.flac")
+    # Downmix and resample first, so the silence filters (and areverse's buffer) see 16kHz mono
+    stream = ffmpeg.input(audio_filepath).audio.filter(
+        "aformat", sample_fmts="flt", channel_layouts="mono", sample_rates=WHISPER_SAMPLE_RATE
+    )
+    (
+        trim_silence(stream, duration)
+        .output(output_path, ac=1, ar=WHISPER_SAMPLE_RATE, sample_fmt="s16", format="flac")
+        .overwrite_output()
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    return output_path
+
+def split_audio_for_transcription(audio_filepath, work_dir, duration):
+    """
+    Paths to transcribe, in order. Short, small files come back unchanged;
+    long or oversized ones are split at silences into FLAC files inside work_dir.
+    """
+    if duration <= TRANSCRIBE_CHUNK_SECONDS and os.path.getsize(audio_filepath) <= WHISPER_MAX_UPLOAD_BYTES:
+        return [audio_filepath]
+
+    try:
+        silences = detect_silences(audio_filepath)
+    except Exception as e:
+        print(f"Silence detection failed, cutting at fixed intervals: {e}")
+        silences = []
+
+    chunks = plan_audio_chunks(duration, silences)
+    if len(chunks) == 1:
+        return [encode_audio_chunk(audio_filepath, os.path.join(work_dir, "chunk_0000.flac"))]
+    try:
+        return encode_audio_chunks(audio_filepath, work_dir, chunks)
+    except Exception as e:
+        stderr = getattr(e, "stderr", None)
+        detail = stderr.decode("utf-8", errors="replace").strip().splitlines()[-1:] if stderr else [str(e)]
+        print(f"Single-pass chunking failed, encoding chunks one at a time: {' '.join(detail)}")
+        return encode_audio_chunks_one_by_one(audio_filepath, work_dir, chunks)
+
+def prepare_audio_for_whisper(audio_filepath, work_dir):
+    """
+    Paths to send to Whisper, in order: the normalized upload, split when it is long.
+    Keeps the original when ffmpeg is unavailable, fails, trims the clip to nothing,
+    or the original is already smaller (e.g. a compressed upload).
+    """
+    duration = probe_audio_duration(audio_filepath)
+    if duration is None:
+        return [audio_filepath]
+
+    try:
+        normalized_path = normalize_audio(audio_filepath, work_dir, duration)
+        normalized_duration = probe_audio_duration(normalized_path)
+        if normalized_duration and os.path.getsize(normalized_path) < os.path.getsize(audio_filepath):
+            audio_filepath, duration = normalized_path, normalized_duration
+    except Exception as e:
+        print(f"Audio normalization failed, sending the original upload: {e}")
+
+    return split_audio_for_transcription(audio_filepath, work_dir, duration)
+
+def stitch_transcripts(texts):
+    """Joins per-chunk transcripts in order."""
+    return " ".join(text.strip() for text in texts if text and text.strip())
+
+# --- Translation Memory ---
+# Exact-match memory for the translator, keyed on the normalized source text and the
+# language pair. Lookups go through a built-in phrasebook of common travel phrases,
+# an in-memory LRU and a persistent SQLite store (set TRANSLATION_MEMORY_DB_FILE=""
+# to keep it in memory only), so repeat translations never reach Groq.
+TRANSLATION_MEMORY_MAX_ENTRIES = int(os.environ.get("TRANSLATION_MEMORY_MAX_ENTRIES", 4096))
+TRANSLATION_MEMORY_TTL = int(os.environ.get("TRANSLATION_MEMORY_TTL", 365 * 24 * 60 * 60))  # seconds
+TRANSLATION_MEMORY_DB_FILE = os.environ.get("TRANSLATION_MEMORY_DB_FILE", "travel_translation_memory.sqlite3")
+
+# One dict per phrase, covering every entry of LANGUAGES
+TRAVEL_PHRASEBOOK = [
+    {"English": "Hello", "Spanish": "Hola", "French": "Bonjour", "German": "Hallo", "Italian": "Ciao",
+     "Portuguese": "Olá", "Japanese": "こんにちは", "Korean": "안녕하세요", "Mandarin Chinese": "你好",
+     "Hindi": "नमस्ते", "Russian": "Здравствуйте", "Arabic": "مرحبا"},
+    {"English": "Thank you", "Spanish": "Gracias", "French": "Merci", "German": "Danke", "Italian": "Grazie",
+     "Portuguese": "Obrigado", "Japanese": "ありがとうございます", "Korean": "감사합니다", "Mandarin Chinese": "谢谢",
+     "Hindi": "धन्यवाद", "Russian": "Спасибо", "Arabic": "شكرا"},
+    {"English": "Please", "Spanish": "Por favor", "French": "S'il vous plaît", "German": "Bitte", "Italian": "Per favore",
+     "Portuguese": "Por favor", "Japanese": "お願いします", "Korean": "부탁합니다", "Mandarin Chinese": "请",
+     "Hindi": "कृपया", "Russian": "Пожалуйста", "Arabic": "من فضلك"},
+    {"English": "Excuse me", "Spanish": "Disculpe", "French": "Excusez-moi", "German": "Entschuldigung", "Italian": "Mi scusi",
+     "Portuguese": "Com licença", "Japanese": "すみません", "Korean": "실례합니다", "Mandarin Chinese": "打扰一下",
+     "Hindi": "माफ़ कीजिए", "Russian": "Извините", "Arabic": "عفوا"},
+    {"English": "Do you speak English?", "Spanish": "¿Habla inglés?", "French": "Parlez-vous anglais ?",
+     "German": "Sprechen Sie Englisch?", "Italian": "Parla inglese?", "Portuguese": "Fala inglês?",
+     "Japanese": "英語を話せますか？", "Korean": "영어 할 줄 아세요?", "Mandarin Chinese": "你会说英语吗？",
+     "Hindi": "क्या आप अंग्रेज़ी बोलते हैं?", "Russian": "Вы говорите по-английски?", "Arabic": "هل تتكلم الإنجليزية؟"},
+    {"English": "Where is the train station?", "Spanish": "¿Dónde está la estación de tren?", "French": "Où est la gare ?",
+     "German": "Wo ist der Bahnhof?", "Italian": "Dov'è la stazione ferroviaria?", "Portuguese": "Onde fica a estação de trem?",
+     "Japanese": "駅はどこですか？", "Korean": "기차역이 어디예요?", "Mandarin Chinese": "火车站在哪里？",
+     "Hindi": "रेलवे स्टेशन कहाँ है?", "Russian": "Где вокзал?", "Arabic": "أين محطة القطار؟"},
+    {"English": "How much is this?", "Spanish": "¿Cuánto cuesta esto?", "French": "Combien ça coûte ?",
+     "German": "Wie viel kostet das?", "Italian": "Quanto costa questo?", "Portuguese": "Quanto custa isto?",
+     "Japanese": "これはいくらですか？", "Korean": "이거 얼마예요?", "Mandarin Chinese": "这个多少钱？",
+     "Hindi": "यह कितने का है?", "Russian": "Сколько это стоит?", "Arabic": "بكم هذا؟"},
+    {"English": "Where is the bathroom?", "Spanish": "¿Dónde está el baño?", "French": "Où sont les toilettes ?",
+     "German": "Wo ist die Toilette?", "Italian": "Dov'è il bagno?", "Portuguese": "Onde fica o banheiro?",
+     "Japanese": "トイレはどこですか？", "Korean": "화장실이 어디예요?", "Mandarin Chinese": "洗手间在哪里？",
+     "Hindi": "शौचालय कहाँ है?", "Russian": "Где туалет?", "Arabic": "أين الحمام؟"},
+    {"English": "I need help", "Spanish": "Necesito ayuda", "French": "J'ai besoin d'aide", "German": "Ich brauche Hilfe",
+     "Italian": "Ho bisogno di aiuto", "Portuguese": "Preciso de ajuda", "Japanese": "助けが必要です",
+     "Korean": "도움이 필요해요", "Mandarin Chinese": "我需要帮助", "Hindi": "मुझे मदद चाहिए",
+     "Russian": "Мне нужна помощь", "Arabic": "أحتاج إلى مساعدة"},
+    {"English": "The bill, please", "Spanish": "La cuenta, por favor", "French": "L'addition, s'il vous plaît",
+     "German": "Die Rechnung, bitte", "Italian": "Il conto, per favore", "Portuguese": "A conta, por favor",
+     "Japanese": "お会計お願いします", "Korean": "계산서 주세요", "Mandarin Chinese": "请结账",
+     "Hindi": "कृपया बिल दीजिए", "Russian": "Счёт, пожалуйста", "Arabic": "الحساب من فضلك"},
+    {"English": "I don't understand", "Spanish": "No entiendo", "French": "Je ne comprends pas", "German": "Ich verstehe nicht",
+     "Italian": "Non capisco", "Portuguese": "Não entendo", "Japanese": "わかりません", "Korean": "이해가 안 돼요",
+     "Mandarin Chinese": "我不明白", "Hindi": "मुझे समझ नहीं आया", "Russian": "Я не понимаю", "Arabic": "لا أفهم"},
+]
+
+TRANSLATION_STATS = {"local": 0, "local_seconds": 0.0, "groq": 0, "groq_seconds": 0.0}
+TRANSLATION_STATS_LOCK = threading.Lock()
+
+def normalize_translation_text(text):
+    """normalize_cache_input without surrounding sentence punctuation, so 'Where is it?' matches 'where is it'."""
+    return normalize_cache_input(text).strip(" .!?¿¡。！？؟")
+
+def translation_memory_key(text, source_lang, target_lang):
+    return llm_cache_key(GROQ_CHAT_MODEL, "translation", normalize_translation_text(text), source_lang, target_lang)
+
+class PhrasebookTier:
+    """Read-only cache tier answering every language pair of TRAVEL_PHRASEBOOK."""
+
+    in_memory = True
+
+    def __init__(self, phrasebook):
+        self.entries = {}
+        for phrase in phrasebook:
+            for source_lang, source_text in phrase.items():
+                for target_lang, target_text in phrase.items():
+                    if target_lang != source_lang:
+                        key = translation_memory_key(source_text, source_lang, target_lang)
+                        self.entries.setdefault(key, target_text)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, ttl=None):
+        pass  # The phrasebook is fixed; new translations live in the other tiers
+
+def build_translation_memory():
+    """Phrasebook, memory LRU, then SQLite when TRANSLATION_MEMORY_DB_FILE is set and usable."""
+    tiers = [
+        PhrasebookTier(TRAVEL_PHRASEBOOK),
+        MemoryResponseCache(TRANSLATION_MEMORY_MAX_ENTRIES, TRANSLATION_MEMORY_TTL)
+    ]
+    if TRANSLATION_MEMORY_DB_FILE:
+        try:
+            tiers.append(SQLiteResponseCache(TRANSLATION_MEMORY_DB_FILE, TRANSLATION_MEMORY_TTL))
+        except Exception as e:
+            print(f"Persistent translation memory disabled: {e}")
+    return TieredResponseCache(tiers)
+
+def record_translation(source, started, count=1):
+    """Counts translations served from "local" memory or from "groq", with their latency."""
+    with TRANSLATION_STATS_LOCK:
+        TRANSLATION_STATS[source] += count
+        TRANSLATION_STATS[f"{source}_seconds"] += count * (time.perf_counter() - started)
+
+def translation_memory_stats():
+    """Hit rate per tier (phrasebook, memory, SQLite) plus average local and Groq latency."""
+    with TRANSLATION_STATS_LOCK:
+        stats = dict(TRANSLATION_STATS)
+    for source in ("local", "groq"):
+        count = stats[source]
+        stats[f"avg_{source}_ms"] = round(1000 * stats[f"{source}_seconds"] / count, 2) if count else 0.0
+    return {**TRANSLATION_MEMORY.stats(), **stats}
+
+TRANSLATION_MEMORY = build_translation_memory()
+
 # ----------------------------------------------------------------------
 # 1. Tourism Chatbot Function
 # ----------------------------------------------------------------------
 
+def build_chat_messages(message, history):
+    """
+    Builds the prompt for a chat turn within CHAT_HISTORY_TOKEN_BUDGET, summarizing
+    turns that no longer fit. If summarizing fails they are simply dropped.
+    """
+    turns, hashes, start, end, summary = plan_chat_context(message, history)
+
+    while start < end:
+        stop = next_summary_chunk(turns, start, end)
+        try:
+            with llm_priority(PRIORITY_INTERACTIVE):
+                summary = complete_chat(build_summary_messages(summary, turns[start:stop]), max_tokens=CHAT_SUMMARY_MAX_TOKENS)
+        except Exception as e:
+            print(f"Could not summarize chat history, dropping older turns: {e}")
+            start = end
+            break
+        remember_chat_summary(hashes[stop], summary)
+        start = stop
+
+    return assemble_chat_messages(summary, turns[start:], message)
+
+async def build_chat_messages_async(message, history):
+    """
+    Async version of build_chat_messages.
+    """
+    turns, hashes, start, end, summary = plan_chat_context(message, history)
+
+    while start < end:
+        stop = next_summary_chunk(turns, start, end)
+        try:
+            with llm_priority(PRIORITY_INTERACTIVE):
+                summary = await complete_chat_async(build_summary_messages(summary, turns[start:stop]), max_tokens=CHAT_SUMMARY_MAX_TOKENS)
+        except Exception as e:
+            print(f"Could not summarize chat history, dropping older turns: {e}")
+            start = end
+            break
+        remember_chat_summary(hashes[stop], summary)
+        start = stop
+
+    return assemble_chat_messages(summary, turns[start:], message)
+
 def groq_chat(message, history):
     """
     Handles the standard multilingual conversational exchange for the Tourism Chatbot.
@@ -217,39 +2495,230 @@ def groq_chat(message, history):
         yield "Error: The Groq API client is not initialized."
         return
 
-    messages = [{"role": "system", "content": TOURISM_EXPERT_SYSTEM_PROMPT}]
+    messages = build_chat_messages(message, history)
 
-    for human, assistant in history:
-        messages.append({"role": "user", "content": human})
-        messages.append({"role": "assistant", "content": assistant})
+    try:
+        with llm_priority(PRIORITY_INTERACTIVE):
+            chat_completion = client.chat.completions.create(
+                messages=messages,
+                model=GROQ_CHAT_MODEL,
+                stream=True
+            )
 
-    messages.append({"role": "user", "content": message})
+        stream_buffer = StreamBuffer()
+        for chunk in chat_completion:
+            delta = chunk_delta(chunk)
+            if delta:
+                response_content = stream_buffer.add(delta)
+                if response_content is not None:
+                    yield response_content
+
+        response_content = stream_buffer.finish()
+        if response_content is not None:
+            yield response_content
+
+    except APIError as e:
+        yield f"**[API Error]** Groq Chatbot failed: {e}. Check API key and rate limits."
+    except Exception as e:
+        yield f"**[Error]** An unexpected error occurred: {e}"
+
+async def groq_chat_async(message, history):
+    """
+    Async-generator version of groq_chat; streams without holding a worker thread.
+    """
+    if async_client is None:
+        yield "Error: The Groq API client is not initialized."
+        return
+
+    messages = await build_chat_messages_async(message, history)
 
     try:
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=GROQ_CHAT_MODEL,
-            stream=True
-        )
+        with llm_priority(PRIORITY_INTERACTIVE):
+            chat_completion = await async_client.chat.completions.create(
+                messages=messages,
+                model=GROQ_CHAT_MODEL,
+                stream=True
+            )
 
-        response_content = ""
-        for chunk in chat_completion:
-            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                response_content += chunk.choices[0].delta.content
-                yield response_content
+        stream_buffer = StreamBuffer()
+        async for chunk in chat_completion:
+            delta = chunk_delta(chunk)
+            if delta:
+                response_content = stream_buffer.add(delta)
+                if response_content is not None:
+                    yield response_content
+
+        response_content = stream_buffer.finish()
+        if response_content is not None:
+            yield response_content
 
     except APIError as e:
         yield f"**[API Error]** Groq Chatbot failed: {e}. Check API key and rate limits."
     except Exception as e:
         yield f"**[Error]** An unexpected error occurred: {e}"
 
+# --- Chat Streaming Benchmark ---
+# `python app.py --benchmark-chat-stream [tokens] [token_interval]` replays one
+# simulated Groq stream through groq_chat and through the old per-token loop
+# (append, then yield the whole reply), and reports yields, characters and CPU
+# per reply for both.
+def simulated_chat_stream(tokens, token_interval):
+    """Completion chunks of one word each, `token_interval` seconds apart."""
+    for index in range(tokens):
+        time.sleep(token_interval)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=f"word{index % 97} "))])
+
+def per_token_chat_stream(chat_completion):
+    """The pre-batching groq_chat loop, kept as the benchmark baseline."""
+    response_content = ""
+    for chunk in chat_completion:
+        delta = chunk_delta(chunk)
+        if delta:
+            response_content += delta
+            yield response_content
+
+def measure_chat_stream(replies):
+    """
+    Consumes one streamed reply the way Gradio does: each yield is compared with
+    the previous value and only the appended tail goes over the websocket.
+    """
+    started = time.process_time()
+    previous, yields, full_chars, diff_chars = "", 0, 0, 0
+    for value in replies:
+        tail = value[len(previous):] if value.startswith(previous) else value
+        yields += 1
+        full_chars += len(value)
+        diff_chars += len(tail)
+        previous = value
+    return {
+        "yields": yields,
+        "full_value_chars": full_chars,
+        "websocket_diff_chars": diff_chars,
+        "cpu_ms": round((time.process_time() - started) * 1000, 1),
+    }
+
+def benchmark_chat_streaming(tokens=3000, token_interval=0.001):
+    """Per-token vs batched streaming of the same simulated reply."""
+    global client
+    saved = client
+    try:
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kwargs: simulated_chat_stream(tokens, token_interval)
+        )))
+        batched = measure_chat_stream(groq_chat("Benchmark question", []))
+    finally:
+        client = saved
+    per_token = measure_chat_stream(per_token_chat_stream(simulated_chat_stream(tokens, token_interval)))
+
+    # CPU spent producing and sleeping through the simulated stream itself, common to both
+    started = time.process_time()
+    for _ in simulated_chat_stream(tokens, token_interval):
+        pass
+    stream_cpu_ms = round((time.process_time() - started) * 1000, 1)
+    return {"tokens": tokens, "token_interval": token_interval, "stream_cpu_ms": stream_cpu_ms, "per_token": per_token, "batched": batched}
+
 # ----------------------------------------------------------------------
 # 2. Audio Translator Functions
 # ----------------------------------------------------------------------
 
+def transcribe_audio_file(audio_filepath):
+    """One Whisper request for one file."""
+    with open(audio_filepath, "rb") as audio_file, llm_priority(PRIORITY_INTERACTIVE):
+        transcript = client.audio.transcriptions.create(
+            model=GROQ_WHISPER_MODEL,
+            file=audio_file
+        )
+    return transcript.text
+
+async def transcribe_audio_file_async(audio_filepath):
+    """Async version of transcribe_audio_file."""
+    # Read the file off the event loop
+    audio_bytes = await asyncio.to_thread(read_file_bytes, audio_filepath)
+    with llm_priority(PRIORITY_INTERACTIVE):
+        transcript = await async_client.audio.transcriptions.create(
+            model=GROQ_WHISPER_MODEL,
+            file=(os.path.basename(audio_filepath), audio_bytes)
+        )
+    return transcript.text
+
+def iter_transcript_chunks(audio_filepath):
+    """
+    Yields the transcript chunk by chunk, in order, as soon as each chunk is ready;
+    the remaining chunks keep transcribing in the background meanwhile. The full
+    transcript is cached once every chunk is done.
+    """
+    cache_key = transcript_cache_key(audio_filepath)
+    cached_text = RESPONSE_CACHE.get(cache_key)
+    if cached_text is not None:
+        record_audio_upload(audio_filepath)
+        yield cached_text
+        return
+
+    def transcribe_chunk(chunk_path):
+        return transcribe_audio_file(chunk_path), time.perf_counter()
+
+    texts = []
+    with tempfile.TemporaryDirectory(prefix="zenix_audio_") as work_dir:
+        started = time.perf_counter()
+        chunk_paths = prepare_audio_for_whisper(audio_filepath, work_dir)
+        prepared = finished = time.perf_counter()
+
+        pool = ThreadPoolExecutor(max_workers=TRANSCRIBE_MAX_PARALLEL)
+        try:
+            futures = [pool.submit(transcribe_chunk, path) for path in chunk_paths]
+            for future in futures:
+                text, done_at = future.result()
+                finished = max(finished, done_at)
+                texts.append(text)
+                yield text
+        finally:
+            # Also runs when the consumer stops early; chunk files must outlive the requests
+            pool.shutdown(wait=True, cancel_futures=True)
+        record_audio_upload(audio_filepath, chunk_paths, prepared - started, finished - prepared)
+
+    RESPONSE_CACHE.set(cache_key, stitch_transcripts(texts), TRANSCRIPT_CACHE_TTL)
+
+async def iter_transcript_chunks_async(audio_filepath):
+    """Async-generator version of iter_transcript_chunks."""
+    cache_key = await asyncio.to_thread(transcript_cache_key, audio_filepath)
+    cached_text = await RESPONSE_CACHE.get_async(cache_key)
+    if cached_text is not None:
+        record_audio_upload(audio_filepath)
+        yield cached_text
+        return
+
+    semaphore = asyncio.Semaphore(TRANSCRIBE_MAX_PARALLEL)
+
+    async def transcribe_chunk(chunk_path):
+        async with semaphore:
+            return await transcribe_audio_file_async(chunk_path), time.perf_counter()
+
+    texts = []
+    with tempfile.TemporaryDirectory(prefix="zenix_audio_") as work_dir:
+        started = time.perf_counter()
+        chunk_paths = await asyncio.to_thread(prepare_audio_for_whisper, audio_filepath, work_dir)
+        prepared = finished = time.perf_counter()
+
+        tasks = [asyncio.ensure_future(transcribe_chunk(path)) for path in chunk_paths]
+        try:
+            for task in tasks:
+                text, done_at = await task
+                finished = max(finished, done_at)
+                texts.append(text)
+                yield text
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        record_audio_upload(audio_filepath, chunk_paths, prepared - started, finished - prepared)
+
+    await RESPONSE_CACHE.set_async(cache_key, stitch_transcripts(texts), TRANSCRIPT_CACHE_TTL)
+
 def groq_transcribe(audio_filepath):
     """
     Converts audio input to text using the Groq Whisper model.
+    The upload is normalized first; long recordings are split at silences and the
+    chunks transcribed in parallel. Repeat uploads are answered from the cache.
     """
     if not audio_filepath:
         return None, "Error: Please upload or record audio first."
@@ -257,68 +2726,495 @@ def groq_transcribe(audio_filepath):
         return None, "Error: Groq client not initialized."
 
     try:
-        with open(audio_filepath, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model=GROQ_WHISPER_MODEL,
-                file=audio_file
-            )
-        return transcript.text, None
+        return stitch_transcripts(iter_transcript_chunks(audio_filepath)), None
     except APIError as e:
         return None, f"**[Transcription API Error]** Failed to transcribe audio: {e}"
     except Exception as e:
         return None, f"**[Error]** An unexpected error occurred during transcription: {e}"
 
-def groq_translate_text(text, source_lang, target_lang):
+async def groq_transcribe_async(audio_filepath):
     """
-    Translates text using the Groq LLM.
+    Async version of groq_transcribe.
     """
-    if not text:
-        return None, "Error: Transcription failed, no text to translate."
-    if client is None:
+    if not audio_filepath:
+        return None, "Error: Please upload or record audio first."
+    if async_client is None:
         return None, "Error: Groq client not initialized."
 
+    try:
+        return stitch_transcripts([text async for text in iter_transcript_chunks_async(audio_filepath)]), None
+    except APIError as e:
+        return None, f"**[Transcription API Error]** Failed to transcribe audio: {e}"
+    except Exception as e:
+        return None, f"**[Error]** An unexpected error occurred during transcription: {e}"
+
+def build_translation_messages(text, source_lang, target_lang):
+    """Translator system prompt plus the text to translate."""
     translation_prompt = (
         f"You are a professional, highly accurate language translator. "
         f"Translate the following text from **{source_lang}** to **{target_lang}**. "
         f"Only return the translated text, with no extra commentary or formatting."
     )
 
-    messages = [
+    return [
         {"role": "system", "content": translation_prompt},
         {"role": "user", "content": text}
     ]
 
+def fetch_translation(text, source_lang, target_lang, memory_key, started):
+    """One Groq translation, remembered in the translation memory."""
+    translated_text = complete_chat(build_translation_messages(text, source_lang, target_lang))
+    TRANSLATION_MEMORY.set(memory_key, translated_text)
+    record_translation("groq", started)
+    return translated_text
+
+async def fetch_translation_async(text, source_lang, target_lang, memory_key, started):
+    """Async version of fetch_translation."""
+    translated_text = await complete_chat_async(build_translation_messages(text, source_lang, target_lang))
+    await TRANSLATION_MEMORY.set_async(memory_key, translated_text)
+    record_translation("groq", started)
+    return translated_text
+
+def groq_translate_text(text, source_lang, target_lang):
+    """
+    Translates text using the Groq LLM.
+    """
+    if not text:
+        return None, "Error: Transcription failed, no text to translate."
+    if client is None:
+        return None, "Error: Groq client not initialized."
+
     try:
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=GROQ_CHAT_MODEL
-        )
-        return chat_completion.choices[0].message.content.strip(), None
+        started = time.perf_counter()
+        memory_key = translation_memory_key(text, source_lang, target_lang)
+        translated_text = TRANSLATION_MEMORY.get(memory_key)
+        if translated_text is not None:
+            record_translation("local", started)
+            return translated_text, None
+
+        with llm_priority(PRIORITY_INTERACTIVE):
+            return fetch_translation(text, source_lang, target_lang, memory_key, started), None
     except APIError as e:
         return None, f"**[Translation API Error]** Failed to translate text: {e}"
     except Exception as e:
         return None, f"**[Error]** An unexpected error occurred during translation: {e}"
 
+async def groq_translate_text_async(text, source_lang, target_lang):
+    """
+    Async version of groq_translate_text.
+    """
+    if not text:
+        return None, "Error: Transcription failed, no text to translate."
+    if async_client is None:
+        return None, "Error: Groq client not initialized."
+
+    try:
+        started = time.perf_counter()
+        memory_key = translation_memory_key(text, source_lang, target_lang)
+        translated_text = await TRANSLATION_MEMORY.get_async(memory_key)
+        if translated_text is not None:
+            record_translation("local", started)
+            return translated_text, None
+
+        with llm_priority(PRIORITY_INTERACTIVE):
+            return await fetch_translation_async(text, source_lang, target_lang, memory_key, started), None
+    except APIError as e:
+        return None, f"**[Translation API Error]** Failed to translate text: {e}"
+    except Exception as e:
+        return None, f"**[Error]** An unexpected error occurred during translation: {e}"
+
+
+def stream_translation(text, source_lang, target_lang):
+    """
+    Yields the translation of `text` so far, batched like the chatbot stream.
+    Translation-memory hits are yielded whole without calling Groq.
+    """
+    started = time.perf_counter()
+    memory_key = translation_memory_key(text, source_lang, target_lang)
+    translated_text = TRANSLATION_MEMORY.get(memory_key)
+    if translated_text is not None:
+        record_translation("local", started)
+        yield translated_text
+        return
+
+    with llm_priority(PRIORITY_INTERACTIVE):
+        chat_completion = client.chat.completions.create(
+            messages=build_translation_messages(text, source_lang, target_lang),
+            model=GROQ_CHAT_MODEL,
+            stream=True
+        )
+
+    stream_buffer = StreamBuffer()
+    for chunk in chat_completion:
+        delta = chunk_delta(chunk)
+        if delta:
+            translated_text = stream_buffer.add(delta)
+            if translated_text is not None:
+                yield translated_text
+
+    translated_text = stream_buffer.finish()
+    if translated_text is not None:
+        yield translated_text
+    if stream_buffer.text().strip():
+        TRANSLATION_MEMORY.set(memory_key, stream_buffer.text().strip())
+    record_translation("groq", started)
+
+async def stream_translation_async(text, source_lang, target_lang):
+    """Async-generator version of stream_translation."""
+    started = time.perf_counter()
+    memory_key = translation_memory_key(text, source_lang, target_lang)
+    translated_text = await TRANSLATION_MEMORY.get_async(memory_key)
+    if translated_text is not None:
+        record_translation("local", started)
+        yield translated_text
+        return
+
+    with llm_priority(PRIORITY_INTERACTIVE):
+        chat_completion = await async_client.chat.completions.create(
+            messages=build_translation_messages(text, source_lang, target_lang),
+            model=GROQ_CHAT_MODEL,
+            stream=True
+        )
+
+    stream_buffer = StreamBuffer()
+    async for chunk in chat_completion:
+        delta = chunk_delta(chunk)
+        if delta:
+            translated_text = stream_buffer.add(delta)
+            if translated_text is not None:
+                yield translated_text
+
+    translated_text = stream_buffer.finish()
+    if translated_text is not None:
+        yield translated_text
+    if stream_buffer.text().strip():
+        await TRANSLATION_MEMORY.set_async(memory_key, stream_buffer.text().strip())
+    record_translation("groq", started)
+
+def translate_pipeline_error(stage, error):
+    """Error box text for a failure while transcribing or translating."""
+    if isinstance(error, APIError):
+        if stage == "translation":
+            return f"**[Translation API Error]** Failed to translate text: {error}"
+        return f"**[Transcription API Error]** Failed to transcribe audio: {error}"
+    return f"**[Error]** An unexpected error occurred during {stage}: {error}"
 
 def translate_pipeline(audio_filepath, source_lang, target_lang):
     """
-    Full pipeline: S2T -> T2T.
+    Full pipeline: S2T -> T2T, streamed into (transcript, error, translation).
+    Each transcript chunk is shown as soon as it arrives and its translation streams
+    in token by token while the following chunks are still being transcribed.
     """
-    transcribed_text, error = groq_transcribe(audio_filepath)
-    if error:
-        return "", error, ""
+    if not audio_filepath:
+        yield "", "Error: Please upload or record audio first.", ""
+        return
+    if client is None:
+        yield "", "Error: Groq client not initialized.", ""
+        return
+
+    transcript_parts, translated_parts = [], []
+    transcript = translation = ""
+    stage = "transcription"
+    try:
+        for chunk_text in iter_transcript_chunks(audio_filepath):
+            transcript_parts.append(chunk_text)
+            transcript = stitch_transcripts(transcript_parts)
+            yield transcript, "", translation
+            if not chunk_text.strip():
+                continue
+
+            stage = "translation"
+            chunk_translation = ""
+            for chunk_translation in stream_translation(chunk_text.strip(), source_lang, target_lang):
+                yield transcript, "", stitch_transcripts(translated_parts + [chunk_translation])
+            translated_parts.append(chunk_translation)
+            translation = stitch_transcripts(translated_parts)
+            stage = "transcription"
+
+        if not transcript:
+            yield "", "Error: Transcription failed, no text to translate.", ""
+    except Exception as e:
+        yield transcript, translate_pipeline_error(stage, e), translation
+
+async def translate_pipeline_async(audio_filepath, source_lang, target_lang):
+    """
+    Async-generator version of translate_pipeline.
+    """
+    if not audio_filepath:
+        yield "", "Error: Please upload or record audio first.", ""
+        return
+    if async_client is None:
+        yield "", "Error: Groq client not initialized.", ""
+        return
+
+    transcript_parts, translated_parts = [], []
+    transcript = translation = ""
+    stage = "transcription"
+    try:
+        async for chunk_text in iter_transcript_chunks_async(audio_filepath):
+            transcript_parts.append(chunk_text)
+            transcript = stitch_transcripts(transcript_parts)
+            yield transcript, "", translation
+            if not chunk_text.strip():
+                continue
+
+            stage = "translation"
+            chunk_translation = ""
+            async for chunk_translation in stream_translation_async(chunk_text.strip(), source_lang, target_lang):
+                yield transcript, "", stitch_transcripts(translated_parts + [chunk_translation])
+            translated_parts.append(chunk_translation)
+            translation = stitch_transcripts(translated_parts)
+            stage = "transcription"
+
+        if not transcript:
+            yield "", "Error: Transcription failed, no text to translate.", ""
+    except Exception as e:
+        yield transcript, translate_pipeline_error(stage, e), translation
+
+
+# --- Batch Translation ---
+# One text into many target languages. Translation-memory hits are served locally;
+# the rest are requested in a single JSON completion when the combined reply fits in
+# BATCH_TRANSLATION_MAX_TOKENS, otherwise (and for any language that reply missed)
+# as concurrent per-language calls, at most BATCH_TRANSLATION_MAX_PARALLEL at a time.
+BATCH_TRANSLATION_MAX_TOKENS = int(os.environ.get("BATCH_TRANSLATION_MAX_TOKENS", 3000))
+BATCH_TRANSLATION_MAX_PARALLEL = int(os.environ.get("BATCH_TRANSLATION_MAX_PARALLEL", 4))
+
+def estimate_batch_reply_tokens(text, language_count):
+    """Rough JSON reply size; non-Latin scripts take about twice the source's tokens."""
+    return language_count * (2 * estimate_tokens(text) + 10)
+
+def build_batch_translation_messages(text, source_lang, target_langs):
+    """Batch translator system prompt plus the text to translate."""
+    return [
+        {"role": "system", "content": BATCH_TRANSLATION_SYSTEM_PROMPT.format(
+            source_lang=source_lang, target_langs=", ".join(target_langs)
+        )},
+        {"role": "user", "content": text}
+    ]
+
+def read_batch_translations(reply, target_langs):
+    """Language -> text for every requested language found in the parsed JSON reply."""
+    if not isinstance(reply, dict):
+        return {}
+    values = {str(key).strip().casefold(): value for key, value in reply.items()}
+    translations = {}
+    for target_lang in target_langs:
+        value = values.get(target_lang.casefold())
+        if isinstance(value, str) and value.strip():
+            translations[target_lang] = value.strip()
+    return translations
+
+def recall_batch_translations(text, source_lang, target_langs):
+    """
+    Translation-memory pass over target_langs.
+    Returns (translations found, languages still to translate, memory key per language).
+    """
+    started = time.perf_counter()
+    translations, memory_keys = {}, {}
+    for target_lang in target_langs:
+        if target_lang == source_lang:
+            translations[target_lang] = text
+            continue
+        memory_keys[target_lang] = translation_memory_key(text, source_lang, target_lang)
+        translated_text = TRANSLATION_MEMORY.get(memory_keys[target_lang])
+        if translated_text is not None:
+            translations[target_lang] = translated_text
+            record_translation("local", started)
+    missing = [target_lang for target_lang in memory_keys if target_lang not in translations]
+    return translations, missing, memory_keys
+
+def remember_batch_translations(translations, memory_keys, started):
+    for target_lang, translated_text in translations.items():
+        TRANSLATION_MEMORY.set(memory_keys[target_lang], translated_text)
+    if translations:
+        record_translation("groq", started, count=len(translations))
+
+def batch_translate_text(text, source_lang, target_langs):
+    """
+    Translates `text` into every language in target_langs.
+    Returns (language -> translated text in target_langs order, error message or None).
+    """
+    if not text or not text.strip():
+        return {}, "Error: Please enter some text to translate."
+    if not target_langs:
+        return {}, "Error: Please select at least one target language."
+    if client is None:
+        return {}, "Error: Groq client not initialized."
+
+    translations, missing, memory_keys = recall_batch_translations(text, source_lang, target_langs)
+    errors = []
+    try:
+        if len(missing) > 1 and estimate_batch_reply_tokens(text, len(missing)) <= BATCH_TRANSLATION_MAX_TOKENS:
+            started = time.perf_counter()
+            try:
+                reply = complete_structured(
+                    "batch_translation",
+                    build_batch_translation_messages(text, source_lang, missing),
+                    max_tokens=BATCH_TRANSLATION_MAX_TOKENS
+                )
+            except Exception as e:
+                # Whatever sank the combined request (API error, open breaker, deadline, unusable
+                # JSON), the per-language calls below still get a chance and report their own errors
+                print(f"Batch translation request failed, translating one language at a time: {e}")
+                reply = {}
+            fresh = read_batch_translations(reply, missing)
+            remember_batch_translations(fresh, memory_keys, started)
+            translations.update(fresh)
+            missing = [target_lang for target_lang in missing if target_lang not in fresh]
+
+        def translate_one(target_lang):
+            return fetch_translation(text, source_lang, target_lang, memory_keys[target_lang], time.perf_counter())
+
+        with ThreadPoolExecutor(max_workers=BATCH_TRANSLATION_MAX_PARALLEL) as pool:
+            futures = {target_lang: pool.submit(translate_one, target_lang) for target_lang in missing}
+            for target_lang, future in futures.items():
+                try:
+                    translations[target_lang] = future.result()
+                except Exception as e:
+                    errors.append(f"{target_lang}: {e}")
+    except APIError as e:
+        errors.append(f"**[Translation API Error]** Failed to translate text: {e}")
+    except Exception as e:
+        errors.append(f"**[Error]** An unexpected error occurred during translation: {e}")
 
-    translated_text, error = groq_translate_text(transcribed_text, source_lang, target_lang)
+    ordered = {target_lang: translations[target_lang] for target_lang in target_langs if target_lang in translations}
+    return ordered, "\n".join(errors) or None
+
+async def batch_translate_text_async(text, source_lang, target_langs):
+    """
+    Async version of batch_translate_text.
+    """
+    if not text or not text.strip():
+        return {}, "Error: Please enter some text to translate."
+    if not target_langs:
+        return {}, "Error: Please select at least one target language."
+    if async_client is None:
+        return {}, "Error: Groq client not initialized."
+
+    translations, missing, memory_keys = await asyncio.to_thread(recall_batch_translations, text, source_lang, target_langs)
+    errors = []
+    try:
+        if len(missing) > 1 and estimate_batch_reply_tokens(text, len(missing)) <= BATCH_TRANSLATION_MAX_TOKENS:
+            started = time.perf_counter()
+            try:
+                reply = await complete_structured_async(
+                    "batch_translation",
+                    build_batch_translation_messages(text, source_lang, missing),
+                    max_tokens=BATCH_TRANSLATION_MAX_TOKENS
+                )
+            except Exception as e:
+                # Whatever sank the combined request (API error, open breaker, deadline, unusable
+                # JSON), the per-language calls below still get a chance and report their own errors
+                print(f"Batch translation request failed, translating one language at a time: {e}")
+                reply = {}
+            fresh = read_batch_translations(reply, missing)
+            await asyncio.to_thread(remember_batch_translations, fresh, memory_keys, started)
+            translations.update(fresh)
+            missing = [target_lang for target_lang in missing if target_lang not in fresh]
+
+        semaphore = asyncio.Semaphore(BATCH_TRANSLATION_MAX_PARALLEL)
+
+        async def translate_one(target_lang):
+            async with semaphore:
+                return await fetch_translation_async(text, source_lang, target_lang, memory_keys[target_lang], time.perf_counter())
+
+        results = await asyncio.gather(*(translate_one(target_lang) for target_lang in missing), return_exceptions=True)
+        for target_lang, result in zip(missing, results):
+            if isinstance(result, Exception):
+                errors.append(f"{target_lang}: {result}")
+            else:
+                translations[target_lang] = result
+    except APIError as e:
+        errors.append(f"**[Translation API Error]** Failed to translate text: {e}")
+    except Exception as e:
+        errors.append(f"**[Error]** An unexpected error occurred during translation: {e}")
+
+    ordered = {target_lang: translations[target_lang] for target_lang in target_langs if target_lang in translations}
+    return ordered, "\n".join(errors) or None
+
+# --- Batch Translation Benchmark ---
+# `python app.py --benchmark-batch-translation [languages] [latency]` translates one
+# announcement into `languages` targets against a simulated Groq endpoint: the serial
+# groq_translate_text loop, one batched JSON call, the concurrent per-language
+# fan-out, and a repeat served from translation memory.
+def benchmark_batch_translation(languages=11, latency=0.3):
+    """Wall time and Groq calls for each way of translating one text into many languages."""
+    global client, TRANSLATION_MEMORY, BATCH_TRANSLATION_MAX_TOKENS
+    saved = client, TRANSLATION_MEMORY, BATCH_TRANSLATION_MAX_TOKENS
+    source_lang = "English"
+    target_langs = [language for language in LANGUAGES if language != source_lang][:languages]
+    batch_prompt = build_batch_translation_messages("", source_lang, target_langs)[0]["content"]
+
+    def reply(kwargs):
+        if kwargs["messages"][0]["content"] == batch_prompt:
+            return json.dumps({target_lang: f"({target_lang}) announcement" for target_lang in target_langs})
+        return "translated announcement"
+
+    completions = SimulatedChatCompletions(latency, reply)
+
+    def measure(run):
+        calls, started = completions.calls, time.perf_counter()
+        run()
+        return {"seconds": round(time.perf_counter() - started, 3), "groq_calls": completions.calls - calls}
+
+    def serial_loop(text):
+        for target_lang in target_langs:
+            groq_translate_text(text, source_lang, target_lang)
+
+    def fan_out(text):
+        global BATCH_TRANSLATION_MAX_TOKENS
+        BATCH_TRANSLATION_MAX_TOKENS = 0  # Never fits, so every language gets its own call
+        batch_translate_text(text, source_lang, target_langs)
+
+    results = {"languages": len(target_langs), "latency_seconds": latency}
+    try:
+        client = SingleFlightClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)), SingleFlight())
+        TRANSLATION_MEMORY = TieredResponseCache([MemoryResponseCache(TRANSLATION_MEMORY_MAX_ENTRIES, TRANSLATION_MEMORY_TTL)])
+        # A different text per run, so no run is answered from an earlier one's memory
+        results["serial_loop"] = measure(lambda: serial_loop("Benchmark announcement one"))
+        results["batch_json"] = measure(lambda: batch_translate_text("Benchmark announcement two", source_lang, target_langs))
+        results["memory_repeat"] = measure(lambda: batch_translate_text("Benchmark announcement two", source_lang, target_langs))
+        results["fan_out"] = measure(lambda: fan_out("Benchmark announcement three"))
+    finally:
+        client, TRANSLATION_MEMORY, BATCH_TRANSLATION_MAX_TOKENS = saved
+    return results
+
+def format_batch_translation_markdown(translations, error):
+    """One section per language, followed by any failures."""
+    markdown_output = ""
+    for target_lang, translated_text in translations.items():
+        markdown_output += f"### {target_lang}\n{translated_text}\n\n"
     if error:
-        return transcribed_text, error, ""
+        markdown_output += f"**Some translations failed:**\n\n{error}\n"
+    return markdown_output
 
-    return transcribed_text, "", translated_text
+def translate_announcement(text, source_lang, target_langs):
+    """
+    Batch Translator tab: renders one text in every selected language.
+    """
+    return format_batch_translation_markdown(*batch_translate_text(text, source_lang, target_langs))
+
+async def translate_announcement_async(text, source_lang, target_langs):
+    """
+    Async version of translate_announcement.
+    """
+    return format_batch_translation_markdown(*await batch_translate_text_async(text, source_lang, target_langs))
 
 
 # ----------------------------------------------------------------------
 # 3. Culture & Tradition Function
 # ----------------------------------------------------------------------
 
+def build_culture_messages(place, topic):
+    """Analyst system prompt plus the report request."""
+    user_query = f"Generate a comprehensive report on the {topic} of {place}. Start with a title and structured content."
+
+    return [
+        {"role": "system", "content": CULTURE_SYSTEM_PROMPT.format(topic=topic, place=place)},
+        {"role": "user", "content": user_query}
+    ]
+
 def fetch_culture_info(place, topic):
     """
     Generates a factual report by prompting the LLM to act as a historical analyst.
@@ -326,38 +3222,125 @@ def fetch_culture_info(place, topic):
     if client is None:
         return f"Error: Groq client not initialized."
 
-    user_query = f"Generate a comprehensive report on the {topic} of {place}. Start with a title and structured content."
-
-    messages = [
-        {"role": "system", "content": CULTURE_SYSTEM_PROMPT.format(topic=topic, place=place)},
-        {"role": "user", "content": user_query}
-    ]
+    cache_key = llm_cache_key(GROQ_CHAT_MODEL, CULTURE_SYSTEM_PROMPT, place, topic)
 
     try:
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=GROQ_CHAT_MODEL
-        )
-        return chat_completion.choices[0].message.content
+        return complete_chat(build_culture_messages(place, topic), cache_key=cache_key)
     except APIError as e:
         return f"**[API Error]** Factual retrieval failed: {e}. Check API key and rate limits."
     except Exception as e:
         return f"**[Error]** An unexpected error occurred: {e}"
 
-# ----------------------------------------------------------------------
-# 4. Itinerary Planner Function
-# ----------------------------------------------------------------------
-
-def generate_itinerary(destination, total_days, trip_focus):
+async def fetch_culture_info_async(place, topic):
     """
-    Generates a structured JSON itinerary and converts it to Markdown.
+    Async version of fetch_culture_info.
     """
-    if client is None:
+    if async_client is None:
         return f"Error: Groq client not initialized."
 
-    if not destination or not total_days:
-        return f"Error: Please provide a destination and number of days."
+    cache_key = llm_cache_key(GROQ_CHAT_MODEL, CULTURE_SYSTEM_PROMPT, place, topic)
+
+    try:
+        return await complete_chat_async(build_culture_messages(place, topic), cache_key=cache_key)
+    except APIError as e:
+        return f"**[API Error]** Factual retrieval failed: {e}. Check API key and rate limits."
+    except Exception as e:
+        return f"**[Error]** An unexpected error occurred: {e}"
 
+# --- Async vs Threaded Load Benchmark ---
+# `python app.py --benchmark-async [users] [latency] [threads]` sends `users` culture
+# requests at once through the threaded handler on a `threads`-worker pool (Gradio's
+# default is 40) and through the async handler, against a simulated Groq endpoint
+# with a fixed latency, and reports throughput and peak concurrency for each path.
+class SimulatedChatCompletions:
+    """
+    chat.completions stand-in that answers after `latency` seconds with reply(kwargs)
+    (by default a short report) and counts calls and peak concurrency.
+    """
+
+    def __init__(self, latency, reply=None):
+        self.latency = latency
+        self.reply = reply or (lambda kwargs: f"Simulated report on {kwargs['messages'][-1]['content'][:80]}")
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    def enter(self):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def leave(self, kwargs):
+        with self.lock:
+            self.in_flight -= 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply(kwargs)))])
+
+    def create(self, **kwargs):
+        self.enter()
+        time.sleep(self.latency)
+        return self.leave(kwargs)
+
+class AsyncSimulatedChatCompletions(SimulatedChatCompletions):
+    """SimulatedChatCompletions for the async handlers."""
+
+    async def create(self, **kwargs):
+        self.enter()
+        await asyncio.sleep(self.latency)
+        return self.leave(kwargs)
+
+def benchmark_async_handlers(users=200, latency=0.2, threads=40):
+    """Runs the culture handler both ways with the real cache tiers (in a scratch directory); returns the timings."""
+    global client, async_client, RESPONSE_CACHE
+    saved = client, async_client, RESPONSE_CACHE
+
+    def summarize(started, replies, completions):
+        elapsed = time.perf_counter() - started
+        return {
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(users / elapsed, 1),
+            "peak_concurrent_requests": completions.peak,
+            "errors": sum(reply.startswith(("Error", "**[")) for reply in replies),
+        }
+
+    async def run_async_users():
+        semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY_LIMIT)  # Gradio's per-event limit in async mode
+        async def one_user(index):
+            async with semaphore:
+                return await fetch_culture_info_async(f"Async City {index}", "History")
+        return await asyncio.gather(*(one_user(index) for index in range(users)))
+
+    results = {"users": users, "latency_seconds": latency, "threads": threads}
+    with tempfile.TemporaryDirectory(prefix="zenix_benchmark_") as directory:
+        try:
+            RESPONSE_CACHE = TieredResponseCache([
+                MemoryResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL),
+                SQLiteResponseCache(os.path.join(directory, "response_cache.sqlite3"), RESPONSE_CACHE_TTL),
+            ])
+
+            completions = SimulatedChatCompletions(latency)
+            client = SingleFlightClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)), SingleFlight())
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                replies = list(pool.map(lambda index: fetch_culture_info(f"Threaded City {index}", "History"), range(users)))
+            results["threaded"] = summarize(started, replies, completions)
+
+            completions = AsyncSimulatedChatCompletions(latency)
+            async_client = AsyncSingleFlightClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)), SingleFlight())
+            started = time.perf_counter()
+            replies = asyncio.run(run_async_users())
+            results["async"] = summarize(started, replies, completions)
+        finally:
+            client, async_client, RESPONSE_CACHE = saved
+    return results
+
+# ----------------------------------------------------------------------
+# 4. Itinerary Planner Function
+# ----------------------------------------------------------------------
+
+def build_itinerary_messages(destination, total_days, trip_focus):
+    """Itinerary JSON-schema prompt plus the trip request."""
     user_query = (
         f"Create a travel itinerary for: "
         f"Destination: {destination}, "
@@ -366,38 +3349,73 @@ def generate_itinerary(destination, total_days, trip_focus):
         f"Adhere strictly to the JSON schema provided in the system prompt."
     )
 
-    messages = [
+    return [
         {"role": "system", "content": ITINERARY_SYSTEM_PROMPT},
         {"role": "user", "content": user_query}
     ]
 
+def format_itinerary_markdown(itinerary_data):
+    """Format JSON output as human-readable Markdown."""
+    markdown_output = f"# ✈️ {itinerary_data.get('destination', 'Trip')} Itinerary ({itinerary_data.get('total_days', '')} Days)\n"
+    markdown_output += f"**Focus:** {itinerary_data.get('trip_focus', 'General')}\n\n"
+
+    for day_plan in itinerary_data.get('daily_plan', []):
+        markdown_output += f"## Day {day_plan.get('day', '?')}: {day_plan.get('theme', 'Activities')}\n"
+        markdown_output += f"- **Morning:** {day_plan.get('morning', 'N/A')}\n"
+        markdown_output += f"- **Afternoon:** {day_plan.get('afternoon', 'N/A')}\n"
+        markdown_output += f"- **Evening:** {day_plan.get('evening', 'N/A')}\n\n"
+
+    return markdown_output
+
+def generate_itinerary(destination, total_days, trip_focus):
+    """
+    Generates a structured JSON itinerary and converts it to Markdown.
+    """
+    if client is None:
+        return f"Error: Groq client not initialized."
+
+    if not destination or not total_days:
+        return f"Error: Please provide a destination and number of days."
+
+    cache_key = llm_cache_key(GROQ_CHAT_MODEL, ITINERARY_SYSTEM_PROMPT, destination, total_days, trip_focus)
+
     try:
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=GROQ_CHAT_MODEL,
+        itinerary_data = complete_structured(
+            "itinerary",
+            build_itinerary_messages(destination, total_days, trip_focus),
+            cache_key=cache_key
         )
-        raw_json_string = chat_completion.choices[0].message.content.strip()
+        return format_itinerary_markdown(itinerary_data)
 
-        # Clean up Markdown/JSON wrappers
-        if raw_json_string.startswith("```json"):
-            raw_json_string = raw_json_string.strip("```json").strip("```").strip()
+    except json.JSONDecodeError as e:
+        return f"**[Error]** Could not parse JSON response from the model. Raw output:\n\n```json\n{e.doc}\n```"
+    except APIError as e:
+        return f"**[API Error]** Itinerary generation failed: {e}. Check API key and rate limits."
+    except Exception as e:
+        return f"**[Error]** An unexpected error occurred: {e}"
 
-        itinerary_data = json.loads(raw_json_string)
+async def generate_itinerary_async(destination, total_days, trip_focus):
+    """
+    Async version of generate_itinerary.
+    """
+    if async_client is None:
+        return f"Error: Groq client not initialized."
 
-        # Format JSON output as human-readable Markdown
-        markdown_output = f"# ✈️ {itinerary_data.get('destination', 'Trip')} Itinerary ({itinerary_data.get('total_days', '')} Days)\n"
-        markdown_output += f"**Focus:** {itinerary_data.get('trip_focus', 'General')}\n\n"
+    if not destination or not total_days:
+        return f"Error: Please provide a destination and number of days."
 
-        for day_plan in itinerary_data.get('daily_plan', []):
-            markdown_output += f"## Day {day_plan.get('day', '?')}: {day_plan.get('theme', 'Activities')}\n"
-            markdown_output += f"- **Morning:** {day_plan.get('morning', 'N/A')}\n"
-            markdown_output += f"- **Afternoon:** {day_plan.get('afternoon', 'N/A')}\n"
-            markdown_output += f"- **Evening:** {day_plan.get('evening', 'N/A')}\n\n"
+    cache_key = llm_cache_key(GROQ_CHAT_MODEL, ITINERARY_SYSTEM_PROMPT, destination, total_days, trip_focus)
 
-        return markdown_output
+    try:
+        itinerary_data = await complete_structured_async(
+            "itinerary",
+            build_itinerary_messages(destination, total_days, trip_focus),
+            cache_key=cache_key
+        )
+        return format_itinerary_markdown(itinerary_data)
 
-    except json.JSONDecodeError:
-        return f"**[Error]** Could not parse JSON response from the model. Raw output:\n\n```json\n{raw_json_string}\n```"
+    except json.JSONDecodeError as e:
+        return f"**[Error]** Could not parse JSON response from the model. Raw output:\n\n```json\n{e.doc}\n```"
     except APIError as e:
         return f"**[API Error]** Itinerary generation failed: {e}. Check API key and rate limits."
     except Exception as e:
@@ -407,72 +3425,1212 @@ def generate_itinerary(destination, total_days, trip_focus):
 # 5. Currency Converter Function (Stable, Direct Logic)
 # ----------------------------------------------------------------------
 
-def perform_conversion(amount, from_currency, to_currency):
+# --- Exchange Rate Provider ---
+# Rates come from dated snapshot files in RATE_SNAPSHOT_DIR:
+#   *.json  {"date": "2024-05-02", "base": "USD", "rates": {"EUR": 0.93, ...}}, or a time
+#           series {"base": "EUR", "rates": {"2024-05-02": {"USD": 1.07, ...}, ...}}
+#   *.csv   ECB-style table: a Date column plus one column per currency, quoted per
+#           RATE_CSV_DEFAULT_BASE unless a Base column says otherwise
+# Every snapshot is rebased to USD and stored in one (date x currency) NumPy table,
+# forward-filled so each date sees the latest known rate of every currency. The
+# directory is re-scanned at most every RATE_RELOAD_INTERVAL seconds, so new files
+# take effect without a restart. With no usable files SIMULATED_RATES is served.
+RATE_SNAPSHOT_DIR = os.environ.get("RATE_SNAPSHOT_DIR", "exchange_rates")
+RATE_RELOAD_INTERVAL = float(os.environ.get("RATE_RELOAD_INTERVAL", 60))  # seconds
+RATE_CSV_DEFAULT_BASE = "EUR"  # ECB historical tables quote units per euro
+RATE_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+def parse_rate_date(value):
+    """datetime.date from 'YYYY-MM-DD'; None when blank, ValueError when malformed."""
+    if isinstance(value, datetime.date):
+        return value
+    value = str(value or "").strip()
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{value}' is not a valid date; use YYYY-MM-DD.") from None
+
+def parse_snapshot_date(value):
+    """Like parse_rate_date, but None for a malformed date, so one bad row does not sink the file."""
+    try:
+        return parse_rate_date(value)
+    except ValueError:
+        return None
+
+def rebase_to_usd(base, rates):
+    """{code: units per base} -> {code: units per USD}, or None when the snapshot has no USD rate."""
+    rates = {code.strip().upper(): float(rate) for code, rate in rates.items()}
+    rates[base.strip().upper()] = 1.0
+    usd_rate = rates.get("USD")
+    if not usd_rate:
+        return None
+    return {code: rate / usd_rate for code, rate in rates.items() if rate > 0}
+
+def read_json_snapshots(path):
+    """[(date, {code: units per USD}), ...] from a single-date or time-series JSON file."""
+    with open(path, encoding="utf-8") as snapshot_file:
+        data = json.load(snapshot_file)
+    base = data.get("base", "USD")
+    rates = data.get("rates") or {}
+
+    if rates and all(isinstance(value, dict) for value in rates.values()):
+        dated_rates = list(rates.items())
+    else:
+        date_text = data.get("date")
+        if not date_text:
+            match = RATE_DATE_PATTERN.search(os.path.basename(path))
+            if not match:
+                raise ValueError("no 'date' field and no YYYY-MM-DD in the file name")
+            date_text = match.group(0)
+        dated_rates = [(date_text, rates)]
+    return [(parse_snapshot_date(date_text), rebase_to_usd(base, day_rates)) for date_text, day_rates in dated_rates]
+
+def read_csv_snapshots(path):
+    """[(date, {code: units per USD}), ...] from an ECB-style CSV table; non-numeric cells (N/A) are skipped."""
+    snapshots = []
+    with open(path, newline="", encoding="utf-8-sig") as snapshot_file:
+        for row in csv.DictReader(snapshot_file):
+            values = {key.strip(): (value or "").strip() for key, value in row.items() if key and key.strip()}
+            columns = {key.lower(): key for key in values}
+            date_text = values.pop(columns.get("date", ""), "")
+            base = values.pop(columns.get("base", ""), "") or RATE_CSV_DEFAULT_BASE
+            rates = {code: value for code, value in values.items() if is_number(value)}
+            snapshots.append((parse_snapshot_date(date_text), rebase_to_usd(base, rates)))
+    return snapshots
+
+class RateIndex:
+    """
+    Immutable (date x currency) rate table. `dates` holds ascending date ordinals and
+    rates[d, c] is units of codes[c] per USD on dates[d] (NaN before a currency first appears).
+    """
+
+    def __init__(self, snapshots, source):
+        merged = {}
+        for snapshot_date, rates in snapshots:
+            merged.setdefault(snapshot_date, {}).update(rates)  # Later files win per currency
+        dates = sorted(merged)
+        self.codes = sorted({code for rates in merged.values() for code in rates}, key=lambda code: (code != "USD", code))
+        self.column = {code: position for position, code in enumerate(self.codes)}
+        self.dates = np.array([snapshot_date.toordinal() for snapshot_date in dates], dtype=np.int64)
+
+        table = np.full((len(dates), len(self.codes)), np.nan)
+        for row, snapshot_date in enumerate(dates):
+            for code, rate in merged[snapshot_date].items():
+                table[row, self.column[code]] = rate
+        # Forward-fill: a date without a quote for some currency keeps its previous rate
+        for row in range(1, len(dates)):
+            missing = np.isnan(table[row])
+            table[row, missing] = table[row - 1, missing]
+        self.rates = table
+        self.source = source
+        self.converters = {}  # row -> CurrencyConverter
+        self.lock = threading.Lock()
+
+    def date_of(self, row):
+        return datetime.date.fromordinal(int(self.dates[row]))
+
+    def row_for(self, on_date=None):
+        """Row of the latest snapshot on or before on_date (the newest when None)."""
+        if on_date is None:
+            return len(self.dates) - 1
+        row = int(np.searchsorted(self.dates, on_date.toordinal(), side="right")) - 1
+        if row < 0:
+            raise ValueError(f"No exchange rates on or before {on_date.isoformat()}; the earliest snapshot is {self.date_of(0).isoformat()}.")
+        return row
+
+    def rates_at(self, row):
+        return {code: float(rate) for code, rate in zip(self.codes, self.rates[row]) if not np.isnan(rate)}
+
+    def rates_on(self, on_date=None):
+        """(snapshot date, {code: units per USD}) in effect on on_date."""
+        row = self.row_for(on_date)
+        return self.date_of(row), self.rates_at(row)
+
+    def converter(self, on_date=None):
+        """CurrencyConverter for the snapshot in effect on on_date, built once per snapshot."""
+        row = self.row_for(on_date)
+        with self.lock:
+            converter = self.converters.get(row)
+            if converter is None:
+                converter = CurrencyConverter(self.rates_at(row), as_of=self.date_of(row), source=self.source)
+                self.converters[row] = converter
+        return converter
+
+class StaticRateProvider:
+    """Rate provider serving one fixed {code: units per USD} table for every date."""
+
+    def __init__(self, rates, source="simulated"):
+        self.index = RateIndex([(datetime.date.min, rates)], source)
+
+    def current_index(self):
+        return self.index
+
+    def codes(self):
+        return list(self.current_index().codes)
+
+    def rates_on(self, on_date=None):
+        return self.current_index().rates_on(on_date)
+
+    def converter(self, on_date=None):
+        return self.current_index().converter(on_date)
+
+class SnapshotRateProvider(StaticRateProvider):
+    """Rate provider backed by the snapshot files in `directory`, reloaded when they change."""
+
+    def __init__(self, directory, fallback_rates, reload_interval):
+        super().__init__(fallback_rates)
+        self.fallback_index = self.index
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.signature = None
+        self.checked_at = float("-inf")
+
+    def directory_signature(self):
+        """(name, mtime, size) of every snapshot file; changes whenever a file is added, edited or removed."""
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.lower().endswith((".json", ".csv")))
+        except OSError:
+            return ()
+        signature = []
+        for name in names:
+            try:
+                file_stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            signature.append((name, file_stat.st_mtime_ns, file_stat.st_size))
+        return tuple(signature)
+
+    def load(self, signature):
+        """
+        RateIndex over every readable snapshot; the current index if building it fails,
+        so a bad file is reported once rather than breaking every conversion.
+        """
+        snapshots = []
+        for name, _, _ in signature:
+            read_snapshots = read_csv_snapshots if name.lower().endswith(".csv") else read_json_snapshots
+            try:
+                file_snapshots = read_snapshots(os.path.join(self.directory, name))
+            except Exception as e:
+                print(f"Skipping exchange-rate snapshot {name}: {e}")
+                continue
+            undated = sum(1 for snapshot_date, _ in file_snapshots if snapshot_date is None)
+            if undated:
+                print(f"Skipping {undated} exchange-rate snapshot(s) in {name} without a valid YYYY-MM-DD date")
+            snapshots.extend(snapshot for snapshot in file_snapshots if snapshot[0] is not None and snapshot[1])
+        if not snapshots:
+            return self.fallback_index
+        try:
+            index = RateIndex(snapshots, "snapshot")
+        except Exception as e:
+            print(f"Could not build the exchange-rate table, keeping the previous rates: {e}")
+            return self.index
+        print(f"Loaded exchange rates: {len(index.dates)} dates x {len(index.codes)} currencies from {self.directory}")
+        return index
+
+    def current_index(self):
+        if time.monotonic() - self.checked_at >= self.reload_interval:
+            with self.lock:
+                if time.monotonic() - self.checked_at >= self.reload_interval:
+                    signature = self.directory_signature()
+                    if signature != self.signature:
+                        self.index = self.load(signature)
+                        self.signature = signature  # Recorded even when load failed, so the files are not re-read every call
+                    self.checked_at = time.monotonic()
+        return self.index
+
+def rates_note(converter):
+    """Footnote naming where the rates of a conversion came from."""
+    if converter.source == "simulated":
+        return "*Note: Rates are simulated for demonstration purposes.*"
+    return f"*Rates as of {converter.as_of.isoformat()} from local snapshot files.*"
+
+RATE_PROVIDER = SnapshotRateProvider(RATE_SNAPSHOT_DIR, SIMULATED_RATES, RATE_RELOAD_INTERVAL)
+CURRENCY_CODES = RATE_PROVIDER.codes()
+
+def perform_conversion(amount, from_currency, to_currency, rate_date=""):
     """
-    Performs direct arithmetic conversion using hardcoded simulated rates.
-    This bypasses the LLM for stability.
+    Performs direct arithmetic conversion with the exchange rates in effect on
+    rate_date (the latest snapshot when blank). This bypasses the LLM for stability.
     """
     try:
         # Robustly convert input to float
         amount = float(amount)
         if amount <= 0:
             return "Error: Amount must be a positive number."
-    except ValueError:
+    except (TypeError, ValueError):
         return "Error: Invalid amount entered. Please enter a valid number."
 
-    if from_currency not in SIMULATED_RATES or to_currency not in SIMULATED_RATES:
-        return "Error: Selected currency code is not supported."
+    try:
+        converter = RATE_PROVIDER.converter(parse_rate_date(rate_date))
+    except ValueError as e:
+        return f"Error: {e}"
 
-    rate_from = SIMULATED_RATES[from_currency]
-    rate_to = SIMULATED_RATES[to_currency]
+    if from_currency not in converter.index or to_currency not in converter.index:
+        return "Error: Selected currency code is not supported."
 
-    # Convert to base USD, then convert to target currency
-    base_amount = amount / rate_from
-    converted_amount = base_amount * rate_to
+    rate = converter.rate(from_currency, to_currency)
+    converted_amount = amount * rate
 
     # Format the output nicely
     return (
         f"Conversion Result:\n\n"
         f"**Original Amount:** {amount:,.2f} {from_currency}\n"
-        f"**Exchange Rate (1 {from_currency} = {rate_to / rate_from:.4f} {to_currency})**\n"
+        f"**Exchange Rate (1 {from_currency} = {rate:.4f} {to_currency})**\n"
         f"**Converted Amount:** {converted_amount:,.2f} {to_currency}\n\n"
-        f"*Note: Rates are simulated for demonstration purposes.*"
+        f"{rates_note(converter)}"
     )
 
+# --- Bulk Currency Conversion ---
+# Whole ledgers are converted in one pass: a cross-rate matrix over every currency
+# is built once per rate snapshot and amounts are converted as NumPy arrays.
+# Exact mode uses Decimal arithmetic, rounded half-up to each currency's minor unit,
+# for accounting exports where float rounding is not acceptable.
+CURRENCY_MINOR_UNITS = {"JPY": 0, "KRW": 0}  # Decimal places; every other currency uses 2
+
+def currency_decimal_places(currency):
+    return CURRENCY_MINOR_UNITS.get(currency, 2)
+
+class CurrencyConverter:
+    """Converts single amounts or whole arrays between the currencies of a {code: units per USD} table."""
+
+    def __init__(self, rates, as_of=None, source="simulated"):
+        self.as_of = as_of      # Snapshot date of the rates
+        self.source = source    # "simulated" or "snapshot"
+        self.codes = list(rates)
+        self.index = {code: position for position, code in enumerate(self.codes)}
+        usd_rates = np.array([rates[code] for code in self.codes], dtype=np.float64)
+        # cross_rates[i, j] = units of currency j per unit of currency i
+        self.cross_rates = usd_rates[np.newaxis, :] / usd_rates[:, np.newaxis]
+        self.decimal_rates = {code: decimal.Decimal(str(rate)) for code, rate in rates.items()}
+
+    def rate(self, from_currency, to_currency):
+        return float(self.cross_rates[self.index[from_currency], self.index[to_currency]])
+
+    def currency_indices(self, currencies):
+        """Matrix indices for a sequence of currency codes; unknown codes raise ValueError."""
+        try:
+            return np.fromiter(map(self.index.__getitem__, currencies), dtype=np.intp, count=len(currencies))
+        except KeyError:
+            unknown = sorted({str(code) for code in currencies if code not in self.index})
+            raise ValueError(f"Unsupported currency code(s): {', '.join(unknown)}") from None
+
+    def convert(self, amounts, from_currencies, to_currencies):
+        """
+        Float64 conversion of an array of amounts. Each currency argument is either one
+        code for every amount or an array of codes, one per amount.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if isinstance(from_currencies, str) and isinstance(to_currencies, str):
+            return amounts * self.rate(from_currencies, to_currencies)
+        from_index = self.index[from_currencies] if isinstance(from_currencies, str) else self.currency_indices(from_currencies)
+        to_index = self.index[to_currencies] if isinstance(to_currencies, str) else self.currency_indices(to_currencies)
+        return amounts * self.cross_rates[from_index, to_index]
+
+    def convert_exact(self, amounts, from_currencies, to_currencies):
+        """Decimal version of convert(); returns a list of Decimals rounded to the target's minor unit."""
+        count = len(amounts)
+        if isinstance(from_currencies, str):
+            from_currencies = [from_currencies] * count
+        if isinstance(to_currencies, str):
+            to_currencies = [to_currencies] * count
+        unknown = (set(from_currencies) | set(to_currencies)) - self.decimal_rates.keys()
+        if unknown:
+            raise ValueError(f"Unsupported currency code(s): {', '.join(sorted(unknown))}")
+
+        quanta = {code: decimal.Decimal(1).scaleb(-currency_decimal_places(code)) for code in set(to_currencies)}
+        converted = []
+        for amount, from_currency, to_currency in zip(amounts, from_currencies, to_currencies):
+            value = decimal.Decimal(str(amount).strip()) * self.decimal_rates[to_currency] / self.decimal_rates[from_currency]
+            converted.append(value.quantize(quanta[to_currency], rounding=decimal.ROUND_HALF_UP))
+        return converted
+
+def is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+def convert_csv_ledger(csv_path, amount_column, currency_column, from_currency, to_currency, exact=False, converter=None):
+    """
+    Adds a converted-amount column to a CSV ledger. Each row's source currency comes
+    from currency_column when given, else from_currency. Uses the latest rates unless
+    a CurrencyConverter is passed in.
+    Returns (output CSV path, row count, seconds spent converting).
+    """
+    with open(csv_path, newline="", encoding="utf-8-sig") as ledger_file:
+        reader = csv.DictReader(ledger_file)
+        fieldnames = list(reader.fieldnames or [])
+        rows = list(reader)
+
+    for column in (amount_column, currency_column):
+        if column and column not in fieldnames:
+            raise ValueError(f"Column '{column}' not found. Available columns: {', '.join(fieldnames)}")
+
+    amount_texts = [(row[amount_column] or "").replace(",", "").strip() for row in rows]
+    sources = [(row[currency_column] or "").strip().upper() for row in rows] if currency_column else from_currency
+    try:
+        amounts = [decimal.Decimal(text) for text in amount_texts] if exact else np.array(amount_texts, dtype=np.float64)
+    except (ValueError, decimal.InvalidOperation):
+        line, text = next((line, text) for line, text in enumerate(amount_texts, start=2) if not is_number(text))
+        raise ValueError(f"Line {line}: '{text}' in column '{amount_column}' is not a number.")
+
+    converter = converter or RATE_PROVIDER.converter()
+    started = time.perf_counter()
+    if exact:
+        values = converter.convert_exact(amounts, sources, to_currency)
+    else:
+        values = converter.convert(amounts, sources, to_currency)
+    seconds = time.perf_counter() - started
+
+    if exact:
+        converted = [str(value) for value in values]
+    else:
+        places = currency_decimal_places(to_currency)
+        converted = [f"{value:.{places}f}" for value in values.round(places)]
+
+    output_column = f"{amount_column}_{to_currency}"
+    with tempfile.NamedTemporaryFile("w", newline="", encoding="utf-8", prefix="converted_", suffix=".csv", delete=False) as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=fieldnames + [output_column])
+        writer.writeheader()
+        for row, value in zip(rows, converted):
+            row[output_column] = value
+            writer.writerow(row)
+    return output_file.name, len(rows), seconds
+
+def convert_ledger(csv_file, amount_column, currency_column, from_currency, to_currency, rate_date, exact):
+    """
+    Bulk CSV tab: converts a ledger column and returns (summary Markdown, converted CSV path).
+    """
+    if not csv_file:
+        return "Error: Please upload a CSV file.", None
+    if not amount_column or not amount_column.strip():
+        return "Error: Please enter the name of the amount column.", None
+
+    try:
+        converter = RATE_PROVIDER.converter(parse_rate_date(rate_date))
+        output_path, row_count, seconds = convert_csv_ledger(
+            csv_file, amount_column.strip(), (currency_column or "").strip(), from_currency, to_currency, exact, converter
+        )
+    except KeyError:
+        return "Error: Selected currency code is not supported.", None
+    except ValueError as e:
+        return f"Error: {e}", None
+    except Exception as e:
+        return f"**[Error]** Could not convert the ledger: {e}", None
+
+    rows_per_second = f"{row_count / seconds:,.0f} rows/s" if seconds > 0 else "instant"
+    return (
+        f"Conversion Result:\n\n"
+        f"**Rows converted:** {row_count:,} to {to_currency} ({'Decimal-exact' if exact else 'vectorized float'} mode)\n"
+        f"**Conversion time:** {seconds * 1000:.1f} ms ({rows_per_second})\n\n"
+        f"{rates_note(converter)}"
+    ), output_path
+
+# --- Bulk Conversion Benchmark ---
+# `python app.py --benchmark-currency [rows] [exact_rows] [loop_rows]` times the same
+# random ledger through each conversion path on the built-in simulated rates. The slow
+# paths run on fewer rows and are reported as rows per second.
+def benchmark_currency_conversion(rows=5_000_000, exact_rows=200_000, loop_rows=100_000):
+    """Rows per second for the vectorized, per-row-currency, Decimal-exact and per-call conversion paths."""
+    converter = CurrencyConverter(SIMULATED_RATES)
+    generator = np.random.default_rng(0)
+    amounts = generator.uniform(0.01, 10_000, rows).round(2)
+    codes = np.array(converter.codes)
+    from_codes = codes[generator.integers(len(codes), size=rows)].tolist()
+    amount_texts = [f"{amount:.2f}" for amount in amounts[:exact_rows]]
+
+    def measure(row_count, run):
+        started = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - started
+        return {"rows": row_count, "seconds": round(seconds, 3), "rows_per_second": round(row_count / seconds)}
+
+    def call_loop():
+        for amount, from_currency in zip(amounts[:loop_rows].tolist(), from_codes):
+            perform_conversion(amount, from_currency, "EUR")
+
+    return {
+        "currencies": len(codes),
+        "single_pair": measure(rows, lambda: converter.convert(amounts, "USD", "EUR")),
+        "per_row_currencies": measure(rows, lambda: converter.convert(amounts, from_codes, "EUR")),
+        "decimal_exact": measure(exact_rows, lambda: converter.convert_exact(amount_texts, from_codes[:exact_rows], "EUR")),
+        "perform_conversion_loop": measure(loop_rows, call_loop),
+    }
+
 # ----------------------------------------------------------------------
 # 6. Route Planner Function
 # ----------------------------------------------------------------------
 
-def generate_route_and_map(origin, destination, mode="driving"):
+# --- Offline Geocoding & Route Estimation ---
+# Places are resolved against a bundled GeoNames-style table (GEOCODER_DATA_FILE;
+# a GeoNames dump such as cities15000.txt also works) by exact name, then name
+# prefix, then trigram similarity. Distance and time come from the great-circle
+# distance, a per-mode detour factor and speed bands, so no Groq call is needed.
+# The LLM estimate is only used when a place cannot be resolved.
+GEOCODER_DATA_FILE = os.environ.get("GEOCODER_DATA_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "travel_places.tsv"))
+GEOCODER_MAX_ALTERNATE_NAMES = 8   # Alternate names indexed per place (GeoNames lists dozens)
+GEOCODER_MIN_PREFIX = 4            # Shortest query that may match by prefix
+GEOCODER_MIN_SIMILARITY = 0.7      # Trigram Dice coefficient needed for a fuzzy match
+GEOCODER_MIN_LENGTH_RATIO = 0.85   # Shorter/longer name length for a fuzzy match ('Parish' is not 'Paris')
+# Country names accepted as context ('Paris, France'); two-letter codes work for every country
+GEOCODER_COUNTRY_NAMES = {
+    "argentina": "AR", "australia": "AU", "austria": "AT", "belgium": "BE", "brazil": "BR",
+    "cambodia": "KH", "canada": "CA", "chile": "CL", "china": "CN", "colombia": "CO",
+    "croatia": "HR", "cuba": "CU", "czech republic": "CZ", "czechia": "CZ", "denmark": "DK",
+    "ecuador": "EC", "egypt": "EG", "england": "GB", "finland": "FI", "france": "FR",
+    "germany": "DE", "greece": "GR", "hong kong": "HK", "hungary": "HU", "iceland": "IS",
+    "india": "IN", "indonesia": "ID", "ireland": "IE", "israel": "IL", "italy": "IT",
+    "japan": "JP", "jordan": "JO", "kenya": "KE", "malaysia": "MY", "maldives": "MV",
+    "mexico": "MX", "morocco": "MA", "nepal": "NP", "netherlands": "NL", "new zealand": "NZ",
+    "norway": "NO", "oman": "OM", "peru": "PE", "philippines": "PH", "poland": "PL",
+    "portugal": "PT", "qatar": "QA", "russia": "RU", "saudi arabia": "SA", "scotland": "GB",
+    "singapore": "SG", "south africa": "ZA", "south korea": "KR", "korea": "KR", "spain": "ES",
+    "sri lanka": "LK", "sweden": "SE", "switzerland": "CH", "taiwan": "TW", "tanzania": "TZ",
+    "thailand": "TH", "turkey": "TR", "turkiye": "TR", "uae": "AE", "united arab emirates": "AE",
+    "uk": "GB", "united kingdom": "GB", "united states": "US", "usa": "US", "vatican": "VA",
+    "vatican city": "VA", "vietnam": "VN", "viet nam": "VN",
+}
+EARTH_RADIUS_KM = 6371.0088
+
+# mode -> (road distance / straight-line distance, ((band end km, km/h), ...), fixed minutes)
+ROUTE_MODE_MODELS = {
+    "driving": (1.3, ((10, 25), (50, 60), (float("inf"), 90)), 0),
+    "walking": (1.25, ((float("inf"), 4.8),), 0),
+    "bicycling": (1.25, ((float("inf"), 15),), 0),
+    "transit": (1.25, ((10, 18), (60, 45), (float("inf"), 110)), 10),
+}
+ROUTE_PRACTICAL_KM = {"walking": 40, "bicycling": 250}  # Longer trips get a warning
+
+def normalize_place_name(name):
+    """Accent- and case-free words: 'Zürich,  Switzerland' -> 'zurich switzerland'."""
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(char for char in name if not unicodedata.combining(char)).casefold()
+    return " ".join(re.sub(r"[^\w]+", " ", name).split())
+
+def name_trigrams(name):
+    padded = f"  {name} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+class PlaceIndex:
+    """
+    Places in parallel arrays, with a sorted name list for prefix search and a
+    trigram -> name-ids index for fuzzy search. A name can belong to several places.
+    """
+
+    def __init__(self, rows):
+        # rows: (name, alternate names, lat, lon, country code, population, feature class)
+        self.names = [row[0] for row in rows]
+        self.countries = [row[4] for row in rows]
+        self.feature_classes = [row[6] for row in rows]
+        self.lat = np.radians(np.array([row[2] for row in rows], dtype=np.float64))
+        self.lon = np.radians(np.array([row[3] for row in rows], dtype=np.float64))
+        self.population = np.array([row[5] for row in rows], dtype=np.int64)
+
+        places_by_name = {}
+        for place, row in enumerate(rows):
+            for name in [row[0]] + row[1][:GEOCODER_MAX_ALTERNATE_NAMES]:
+                key = normalize_place_name(name)
+                if key:
+                    places_by_name.setdefault(key, set()).add(place)
+        self.keys = sorted(places_by_name)
+        self.key_places = [sorted(places_by_name[key], key=lambda place: -self.population[place]) for key in self.keys]
+        self.key_lookup = {key: index for index, key in enumerate(self.keys)}
+        self.key_trigram_counts = np.array([len(name_trigrams(key)) for key in self.keys], dtype=np.int32)
+        self.key_lengths = np.array([len(key) for key in self.keys], dtype=np.int32)
+
+        trigram_keys = {}
+        for index, key in enumerate(self.keys):
+            for trigram in name_trigrams(key):
+                trigram_keys.setdefault(trigram, []).append(index)
+        self.trigrams = {trigram: np.array(ids, dtype=np.int32) for trigram, ids in trigram_keys.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    def match_key(self, query):
+        """(key id, match kind) for a normalized query, or None."""
+        if query in self.key_lookup:
+            return self.key_lookup[query], "exact"
+
+        if len(query) >= GEOCODER_MIN_PREFIX:
+            start = bisect.bisect_left(self.keys, query)
+            end = bisect.bisect_left(self.keys, query + "\uffff")
+            if start < end:
+                best = max(range(start, end), key=lambda index: self.population[self.key_places[index][0]])
+                return best, "prefix"
+
+        query_trigrams = [self.trigrams[trigram] for trigram in name_trigrams(query) if trigram in self.trigrams]
+        if not query_trigrams:
+            return None
+        shared = np.bincount(np.concatenate(query_trigrams), minlength=len(self.keys))
+        similarity = 2 * shared / (len(name_trigrams(query)) + self.key_trigram_counts)
+        # Trigrams alone rate 'Berlin Wall' close to 'Berlin'; names of very different length never match
+        length_ratio = np.minimum(self.key_lengths, len(query)) / np.maximum(self.key_lengths, len(query))
+        similarity[length_ratio < GEOCODER_MIN_LENGTH_RATIO] = 0
+        best = int(np.argmax(similarity))
+        if similarity[best] < GEOCODER_MIN_SIMILARITY:
+            return None
+        return best, "fuzzy"
+
+    def lookup(self, query):
+        """
+        Resolves 'Place' or 'Place, Context, ...'. The first part must match; later
+        parts (a city, a country name or a country code) choose between places sharing
+        a name, and a context that fits none of them ('Paris, Texas') resolves nothing.
+        Returns a dict with name, country, lat/lon in degrees and match kind, or None.
+        """
+        parts = [normalize_place_name(part) for part in (query or "").split(",")]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+
+        joined = " ".join(parts)  # e.g. 'Washington, DC' is the name 'washington dc'
+        if len(parts) > 1 and joined in self.key_lookup:
+            key, match, context = self.key_lookup[joined], "exact", []
+        else:
+            matched = self.match_key(parts[0])
+            if matched is None:
+                return None
+            (key, match), context = matched, parts[1:]
+
+        candidates = self.key_places[key]
+        if context:
+            context_countries = {part.upper() for part in context if len(part) == 2}
+            context_countries.update(GEOCODER_COUNTRY_NAMES[part] for part in context if part in GEOCODER_COUNTRY_NAMES)
+            for part in context:
+                context_key = self.key_lookup.get(part)
+                if context_key is not None:
+                    context_countries.update(self.countries[place] for place in self.key_places[context_key])
+            candidates = [place for place in candidates if self.countries[place] in context_countries]
+            if not candidates:
+                return None  # The context rules out every place with this name; leave it to the LLM
+        place = candidates[0]
+
+        return {
+            "name": self.names[place],
+            "country": self.countries[place],
+            "lat": float(np.degrees(self.lat[place])),
+            "lon": float(np.degrees(self.lon[place])),
+            "match": match,
+        }
+
+def read_geonames_rows(path):
+    """Rows from a GeoNames-format TSV (geoname table columns); '#' lines are comments."""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            columns = line.rstrip("\n").split("\t")
+            try:
+                alternates = [name for name in columns[3].split(",") if name] + ([columns[2]] if columns[2] != columns[1] else [])
+                population = int(columns[14]) if len(columns) > 14 and columns[14] else 0
+                rows.append((columns[1], alternates, float(columns[4]), float(columns[5]), columns[8], population, columns[6]))
+            except (IndexError, ValueError):
+                continue  # Malformed line
+    return rows
+
+def load_place_index(path):
+    try:
+        return PlaceIndex(read_geonames_rows(path))
+    except OSError as e:
+        print(f"Place data unavailable ({e}); routes will use LLM estimates.")
+        return PlaceIndex([])
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between two points given in degrees."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+def travel_minutes(road_km, mode):
+    """Minutes to cover road_km, spending each distance band at that band's speed."""
+    _, bands, fixed_minutes = ROUTE_MODE_MODELS[mode]
+    minutes, covered = fixed_minutes, 0.0
+    for band_end, speed in bands:
+        leg = min(road_km, band_end) - covered
+        if leg <= 0:
+            break
+        minutes += leg / speed * 60
+        covered += leg
+    return minutes
+
+def format_duration(minutes):
+    minutes = max(1, round(minutes))
+    if minutes < 60:
+        return f"{minutes} min"
+    hours, minutes = divmod(minutes, 60)
+    if hours >= 48:
+        return f"{hours / 24:.1f} days"
+    return f"{hours} h {minutes:02d} min"
+
+def format_distance(km):
+    return f"{km:,.1f} km" if km < 10 else f"{km:,.0f} km"
+
+def estimate_route_locally(origin, destination, mode):
+    """Travel estimate text from the offline index, or None when either place is unknown."""
+    start, end = PLACE_INDEX.lookup(origin), PLACE_INDEX.lookup(destination)
+    if start is None or end is None or mode not in ROUTE_MODE_MODELS:
+        return None
+
+    straight_km = haversine_km(start["lat"], start["lon"], end["lat"], end["lon"])
+    road_km = straight_km * ROUTE_MODE_MODELS[mode][0]
+    estimate = (
+        f"About **{format_distance(road_km)}** by {mode} "
+        f"({format_distance(straight_km)} in a straight line), roughly **{format_duration(travel_minutes(road_km, mode))}**. "
+        f"Resolved as {start['name']} ({start['country']}) → {end['name']} ({end['country']})."
+    )
+    if road_km > ROUTE_PRACTICAL_KM.get(mode, float("inf")):
+        estimate += f" This is not a practical {mode} trip."
+    return estimate
+
+PLACE_INDEX = load_place_index(GEOCODER_DATA_FILE)
+
+# --- Offline Road Graph Routing ---
+# Shortest paths over an OpenStreetMap extract, no Google needed. Build the graph once
+# with `python app.py --build-road-graph region.osm.bz2` (OSM XML, plain, .bz2 or
+# .gz). Each mode gets a CSR graph saved as .npy files in ROAD_GRAPH_DIR, which is
+# memory-mapped at startup. Driving queries search a contraction hierarchy
+# precomputed at build time; the other modes run A* on travel time. Both start from
+# the nearest road node of each place, and routes outside the extract (or too long
+# for the mode) fall back to the estimates above.
+ROAD_GRAPH_DIR = os.environ.get("ROAD_GRAPH_DIR", "road_graph")
+ROAD_GRAPH_MODES = ("driving", "walking", "bicycling")
+# Modes that get a contraction hierarchy. It pays off where roads form a speed hierarchy;
+# walking and cycling trips are short enough for A* and barely shrink under contraction.
+ROAD_GRAPH_CH_MODES = tuple(m.strip() for m in os.environ.get("ROAD_GRAPH_CH_MODES", "driving").split(",") if m.strip())
+ROAD_SNAP_CELL_DEGREES = 0.01      # Grid cell size (~1 km) for nearest-node search
+ROAD_SNAP_MAX_METERS = 2000        # Places farther than this from any road are not routed
+CH_WITNESS_SETTLE_LIMIT = 60       # Nodes a witness search may settle before giving up (adds a shortcut)
+
+# highway tag -> default driving speed in km/h (None: not open to cars)
+OSM_HIGHWAY_SPEEDS = {
+    "motorway": 110, "motorway_link": 60, "trunk": 90, "trunk_link": 50,
+    "primary": 70, "primary_link": 40, "secondary": 60, "secondary_link": 40,
+    "tertiary": 50, "tertiary_link": 30, "unclassified": 40, "residential": 30,
+    "living_street": 10, "service": 20, "road": 30, "track": None,
+    "pedestrian": None, "footway": None, "path": None, "cycleway": None,
+    "steps": None, "bridleway": None,
+}
+OSM_WALKING_SPEED, OSM_STEPS_SPEED, OSM_BICYCLING_SPEED = 5.0, 2.0, 15.0
+OSM_NO_ACCESS = ("no", "private")
+
+def osm_maxspeed(value):
+    """km/h from an OSM maxspeed tag ('50', '30 mph'), or None."""
+    match = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", value or "")
+    if not match:
+        return None
+    return float(match.group(1)) * (1.609344 if match.group(2) else 1.0)
+
+def osm_way_modes(tags):
+    """
+    {mode: (forward allowed, backward allowed, km/h)} for a highway way; modes
+    that may not use the way are left out.
+    """
+    highway = tags.get("highway")
+    if highway not in OSM_HIGHWAY_SPEEDS or tags.get("area") == "yes":
+        return {}
+    access = tags.get("access")
+    oneway = tags.get("oneway", "yes" if highway in ("motorway", "motorway_link") or tags.get("junction") == "roundabout" else "no")
+    forward, backward = oneway != "-1", oneway in ("no", "false", "0", "-1")
+    modes = {}
+
+    car_speed = OSM_HIGHWAY_SPEEDS[highway]
+    if car_speed and access not in OSM_NO_ACCESS and tags.get("motor_vehicle") not in OSM_NO_ACCESS and tags.get("motorcar") not in OSM_NO_ACCESS:
+        modes["driving"] = (forward, backward, osm_maxspeed(tags.get("maxspeed")) or car_speed)
+
+    foot = tags.get("foot")
+    if not highway.startswith("motorway") and foot not in OSM_NO_ACCESS and (access not in OSM_NO_ACCESS or foot in ("yes", "designated")):
+        modes["walking"] = (True, True, OSM_STEPS_SPEED if highway == "steps" else OSM_WALKING_SPEED)
+
+    bicycle = tags.get("bicycle")
+    bicycle_allowed = highway not in ("steps", "footway", "pedestrian") or bicycle in ("yes", "designated")
+    if not highway.startswith("motorway") and bicycle_allowed and bicycle not in OSM_NO_ACCESS and (access not in OSM_NO_ACCESS or bicycle in ("yes", "designated")):
+        contraflow = tags.get("oneway:bicycle") == "no"
+        modes["bicycling"] = (forward or contraflow, backward or contraflow, OSM_BICYCLING_SPEED)
+    return modes
+
+def open_osm_file(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".pbf"):
+        raise ValueError("PBF extracts are not supported; convert to XML first (e.g. `osmium cat region.osm.pbf -o region.osm`).")
+    return open(path, "rb")
+
+def read_osm_ways(path):
+    """First pass: (node refs, modes) for every routable way."""
+    ways = []
+    with open_osm_file(path) as f:
+        root = None
+        for event, element in ElementTree.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = element  # <osm>; cleared below so finished elements do not pile up under it
+            if event != "end":
+                continue
+            if element.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                modes = osm_way_modes(tags)
+                if modes:
+                    ways.append(([int(nd.get("ref")) for nd in element.iter("nd")], modes))
+                root.clear()
+            elif element.tag in ("node", "relation"):
+                root.clear()
+    return ways
+
+def read_osm_nodes(path, wanted):
+    """Second pass: {osm id: (lat, lon)} for the nodes the ways use. Stops at the first way."""
+    coordinates = {}
+    with open_osm_file(path) as f:
+        root = None
+        for event, element in ElementTree.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = element
+            if event != "end":
+                continue
+            if element.tag == "node":
+                node_id = int(element.get("id"))
+                if node_id in wanted:
+                    coordinates[node_id] = (float(element.get("lat")), float(element.get("lon")))
+                root.clear()
+            elif element.tag == "way":
+                break  # OSM files list all nodes before the ways
+    return coordinates
+
+def haversine_m_array(lat1, lon1, lat2, lon2):
+    """Element-wise great-circle distance in meters for arrays of degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(values) for values in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * 1000 * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+def snap_cell_keys(lat, lon):
+    """Grid cell id for each point; neighbouring cells differ by 1 (lon) or 36001 (lat)."""
+    rows = np.floor((np.asarray(lat) + 90) / ROAD_SNAP_CELL_DEGREES).astype(np.int64)
+    cols = np.floor((np.asarray(lon) + 180) / ROAD_SNAP_CELL_DEGREES).astype(np.int64)
+    return rows * 36001 + cols
+
+def ch_witness_distances(out_edges, start, skip, limit, targets):
+    """Costs from `start` to `targets` avoiding `skip`, searched up to `limit`; unreached ones are absent."""
+    dist, heap, settled, remaining = {start: 0.0}, [(0.0, start)], 0, set(targets)
+    while heap and remaining and settled < CH_WITNESS_SETTLE_LIMIT:
+        cost, node = heapq.heappop(heap)
+        if cost > dist[node]:
+            continue
+        if cost > limit:
+            break
+        settled += 1
+        remaining.discard(node)
+        for neighbor, (weight, _) in out_edges[node].items():
+            new_cost = cost + weight
+            if neighbor != skip and new_cost < dist.get(neighbor, float("inf")):
+                dist[neighbor] = new_cost
+                heapq.heappush(heap, (new_cost, neighbor))
+    return dist
+
+def ch_shortcuts(out_edges, in_edges, node):
+    """Shortcuts (u, x, cost) needed to keep u -> node -> x distances once `node` is removed."""
+    incoming, outgoing = in_edges[node], out_edges[node]
+    if not incoming or not outgoing:
+        return []
+    max_out = max(weight for weight, _ in outgoing.values())
+    shortcuts = []
+    for u, (weight_in, _) in incoming.items():
+        dist = ch_witness_distances(out_edges, u, node, weight_in + max_out, [x for x in outgoing if x != u])
+        for x, (weight_out, _) in outgoing.items():
+            if x != u and dist.get(x, float("inf")) > weight_in + weight_out:
+                shortcuts.append((u, x, weight_in + weight_out))
+    return shortcuts
+
+def build_contraction_hierarchy(node_count, sources, targets, weights):
+    """
+    Contracts nodes in edge-difference order (lazily updated). Returns the rank of
+    every node and two CSR graphs of (neighbor, weight, middle node or -1): edges up
+    to higher-ranked nodes indexed by tail, and edges down from higher-ranked nodes
+    indexed by head.
+    """
+    out_edges = [{} for _ in range(node_count)]  # node -> {head: (weight, middle)}
+    in_edges = [{} for _ in range(node_count)]   # node -> {tail: (weight, middle)}
+    for u, v, weight in zip(sources.tolist(), targets.tolist(), weights.tolist()):
+        if u != v and weight < out_edges[u].get(v, (float("inf"),))[0]:
+            out_edges[u][v] = in_edges[v][u] = (weight, -1)
+
+    deleted_neighbors = [0] * node_count
+    def priority(node):
+        shortcuts = ch_shortcuts(out_edges, in_edges, node)
+        return len(shortcuts) - len(in_edges[node]) - len(out_edges[node]) + deleted_neighbors[node], shortcuts
+
+    heap = [(priority(node)[0], node) for node in range(node_count)]
+    heapq.heapify(heap)
+    rank = np.zeros(node_count, dtype=np.int32)
+    up, down = [None] * node_count, [None] * node_count
+    next_rank, report_every = 0, max(1, node_count // 10)
+    while heap:
+        _, node = heapq.heappop(heap)
+        current, shortcuts = priority(node)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, node))  # Priority went stale; try again later
+            continue
+
+        for u, x, cost in shortcuts:
+            if cost < out_edges[u].get(x, (float("inf"),))[0]:
+                out_edges[u][x] = in_edges[x][u] = (cost, node)
+        up[node] = [(x, weight, middle) for x, (weight, middle) in out_edges[node].items()]
+        down[node] = [(u, weight, middle) for u, (weight, middle) in in_edges[node].items()]
+        for x in out_edges[node]:
+            del in_edges[x][node]
+            deleted_neighbors[x] += 1
+        for u in in_edges[node]:
+            del out_edges[u][node]
+            deleted_neighbors[u] += 1
+        out_edges[node], in_edges[node] = {}, {}
+
+        rank[node] = next_rank
+        next_rank += 1
+        if next_rank % report_every == 0:
+            print(f"  contracted {next_rank:,}/{node_count:,} nodes")
+
+    def to_csr(adjacency):
+        counts = np.array([len(edges) for edges in adjacency], dtype=np.int64)
+        flat = [edge for edges in adjacency for edge in edges]
+        return (
+            np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+            np.array([edge[0] for edge in flat], dtype=np.int32),
+            np.array([edge[1] for edge in flat], dtype=np.float32),
+            np.array([edge[2] for edge in flat], dtype=np.int32),
+        )
+    return rank, to_csr(up), to_csr(down)
+
+def build_road_graph(osm_path, out_dir=ROAD_GRAPH_DIR):
+    """Imports an OSM XML extract into per-mode CSR arrays in out_dir; returns the metadata."""
+    started = time.perf_counter()
+    ways = read_osm_ways(osm_path)
+    coordinates = read_osm_nodes(osm_path, {ref for refs, _ in ways for ref in refs})
+
+    node_ids = sorted(coordinates)
+    node_index = {node_id: index for index, node_id in enumerate(node_ids)}
+    lat = np.array([coordinates[node_id][0] for node_id in node_ids], dtype=np.float64)
+    lon = np.array([coordinates[node_id][1] for node_id in node_ids], dtype=np.float64)
+
+    os.makedirs(out_dir, exist_ok=True)
+    meta = {"source": os.path.basename(osm_path), "built_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "nodes": len(node_ids), "edges": {}, "max_speed_mps": {}, "shortcuts": {}}
+    for mode in ROAD_GRAPH_MODES:
+        sources, targets, speeds = [], [], []
+        for refs, modes in ways:
+            if mode not in modes:
+                continue
+            forward, backward, speed = modes[mode]
+            for a, b in zip(refs, refs[1:]):
+                if a not in node_index or b not in node_index:
+                    continue  # Way leaves the extract
+                if forward:
+                    sources.append(node_index[a]); targets.append(node_index[b]); speeds.append(speed)
+                if backward:
+                    sources.append(node_index[b]); targets.append(node_index[a]); speeds.append(speed)
+
+        sources = np.array(sources, dtype=np.int64)
+        order = np.argsort(sources, kind="stable")
+        sources, targets = sources[order], np.array(targets, dtype=np.int32)[order]
+        speeds_mps = np.array(speeds, dtype=np.float64)[order] / 3.6
+        meters = haversine_m_array(lat[sources], lon[sources], lat[targets], lon[targets])
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=len(node_ids))))).astype(np.int64)
+
+        seconds = meters / speeds_mps
+        np.save(os.path.join(out_dir, f"{mode}_offsets.npy"), offsets)
+        np.save(os.path.join(out_dir, f"{mode}_targets.npy"), targets)
+        np.save(os.path.join(out_dir, f"{mode}_seconds.npy"), seconds.astype(np.float32))
+        meta["edges"][mode] = int(len(targets))
+        meta["max_speed_mps"][mode] = float(speeds_mps.max()) if len(speeds_mps) else 1.0
+
+        if mode not in ROAD_GRAPH_CH_MODES:
+            continue
+        print(f"Contracting the {mode} graph ({len(node_ids):,} nodes, {len(targets):,} edges)")
+        rank, up, down = build_contraction_hierarchy(len(node_ids), sources, targets, seconds)
+        np.save(os.path.join(out_dir, f"{mode}_ch_rank.npy"), rank)
+        for direction, arrays in (("up", up), ("down", down)):
+            for name, values in zip(("offsets", "nodes", "seconds", "middle"), arrays):
+                np.save(os.path.join(out_dir, f"{mode}_ch_{direction}_{name}.npy"), values)
+        meta["shortcuts"][mode] = int(len(up[1]) + len(down[1]) - len(targets))
+
+    cells = snap_cell_keys(lat, lon)
+    cell_order = np.argsort(cells, kind="stable").astype(np.int32)
+    np.save(os.path.join(out_dir, "lat.npy"), lat)
+    np.save(os.path.join(out_dir, "lon.npy"), lon)
+    np.save(os.path.join(out_dir, "cell_keys.npy"), cells[cell_order])
+    np.save(os.path.join(out_dir, "cell_order.npy"), cell_order)
+
+    meta["build_seconds"] = round(time.perf_counter() - started, 2)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)  # Written last: a graph without meta.json is incomplete
+    return meta
+
+def encode_polyline(points, precision=5):
+    """Google encoded-polyline string for (lat, lon) points."""
+    factor, previous, chunks = 10 ** precision, (0, 0), []
+    for point in points:
+        current = (round(point[0] * factor), round(point[1] * factor))
+        for delta in (current[0] - previous[0], current[1] - previous[1]):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous = current
+    return "".join(chunks)
+
+class RoadGraph:
+    """Memory-mapped road graphs and contraction hierarchies written by build_road_graph."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        # Plain ndarray views of the mappings: same pages, without np.memmap's per-index overhead
+        load = lambda name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r").view(np.ndarray)
+        self.lat, self.lon = load("lat"), load("lon")
+        self.cell_keys, self.cell_order = load("cell_keys"), load("cell_order")
+        self.graphs = {mode: (load(f"{mode}_offsets"), load(f"{mode}_targets"), load(f"{mode}_seconds")) for mode in ROAD_GRAPH_MODES}
+        self.hierarchies = {  # Only the modes contracted at build time
+            mode: (
+                load(f"{mode}_ch_rank"),
+                tuple(load(f"{mode}_ch_up_{name}") for name in ("offsets", "nodes", "seconds", "middle")),
+                tuple(load(f"{mode}_ch_down_{name}") for name in ("offsets", "nodes", "seconds", "middle")),
+            )
+            for mode in self.meta.get("shortcuts", {})
+        }
+
+    def nearest_node(self, lat, lon, mode):
+        """(node, meters) of the closest node with outgoing edges for `mode`, or None."""
+        offsets = self.graphs[mode][0]
+        center = int(snap_cell_keys(lat, lon))
+        # Every cell within ROAD_SNAP_MAX_METERS: cells narrow with latitude, so the
+        # column reach uses the cosine at the band's most poleward edge
+        cell_meters = ROAD_SNAP_CELL_DEGREES * math.radians(1) * EARTH_RADIUS_KM * 1000
+        reach_degrees = ROAD_SNAP_MAX_METERS / (cell_meters / ROAD_SNAP_CELL_DEGREES)
+        cos_lat = max(math.cos(math.radians(min(90.0, abs(lat) + reach_degrees))), 1e-3)
+        rows = math.ceil(ROAD_SNAP_MAX_METERS / cell_meters)
+        cols = min(math.ceil(ROAD_SNAP_MAX_METERS / (cell_meters * cos_lat)), 18000)
+        candidates = []
+        for row in range(-rows, rows + 1):
+            first = center + row * 36001 - cols
+            start, end = np.searchsorted(self.cell_keys, [first, first + 2 * cols + 1])
+            candidates.append(self.cell_order[start:end])
+        candidates = np.concatenate(candidates)
+        candidates = candidates[offsets[candidates + 1] > offsets[candidates]]
+        if not len(candidates):
+            return None
+        distances = haversine_m_array(lat, lon, self.lat[candidates], self.lon[candidates])
+        best = int(np.argmin(distances))
+        if distances[best] > ROAD_SNAP_MAX_METERS:
+            return None
+        return int(candidates[best]), float(distances[best])
+
+    def shortest_path(self, mode, source, target):
+        """(seconds, node list) or None when target is unreachable."""
+        if mode in self.hierarchies:
+            return self.hierarchy_path(mode, source, target)
+        return self.astar_path(mode, source, target)
+
+    def hierarchy_path(self, mode, source, target):
+        """Bidirectional upward search in the contraction hierarchy; same result as astar_path."""
+        rank, up, down = self.hierarchies[mode]
+        searches = (up, down)  # Forward search climbs up edges, backward search climbs down edges in reverse
+        dist, parent = ({source: 0.0}, {target: 0.0}), ({source: None}, {target: None})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meeting = float("inf"), None
+        while heaps[0] or heaps[1]:
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            cost, node = heapq.heappop(heaps[side])
+            if cost >= best:
+                heaps[side].clear()  # Nothing left on this side can shorten the route
+                continue
+            if cost > dist[side][node]:
+                continue  # Stale heap entry
+            if node in dist[1 - side] and cost + dist[1 - side][node] < best:
+                best, meeting = cost + dist[1 - side][node], node
+            offsets, neighbors, weights, middles = searches[side]
+            start, end = int(offsets[node]), int(offsets[node + 1])
+            for neighbor, weight, middle in zip(neighbors[start:end].tolist(), weights[start:end].tolist(), middles[start:end].tolist()):
+                new_cost = cost + weight
+                if new_cost < dist[side].get(neighbor, float("inf")):
+                    dist[side][neighbor] = new_cost
+                    parent[side][neighbor] = (node, middle)
+                    heapq.heappush(heaps[side], (new_cost, neighbor))
+        if meeting is None:
+            return None
+
+        # Hierarchy edges source -> meeting -> target, then shortcuts expanded back into road nodes
+        edges, node = [], meeting
+        while parent[0][node] is not None:
+            previous, middle = parent[0][node]
+            edges.append((previous, node, middle))
+            node = previous
+        edges.reverse()
+        node = meeting
+        while parent[1][node] is not None:
+            following, middle = parent[1][node]
+            edges.append((node, following, middle))
+            node = following
+        path = [source]
+        for edge in edges:
+            path.extend(self.unpack_edge(rank, up, down, *edge))
+        return best, path
+
+    @staticmethod
+    def unpack_edge(rank, up, down, tail, head, middle):
+        """Road nodes after `tail` along a hierarchy edge, expanding shortcuts through their middle nodes."""
+        def middle_of(a, b):
+            # a -> b is stored as an up edge of a when b ranks higher, else as a down edge of b
+            offsets, neighbors, _, middles = up if rank[a] < rank[b] else down
+            owner, other = (a, b) if rank[a] < rank[b] else (b, a)
+            start, end = int(offsets[owner]), int(offsets[owner + 1])
+            return int(middles[start + neighbors[start:end].tolist().index(other)])
+
+        nodes, stack = [], [(tail, head, middle)]
+        while stack:
+            a, b, m = stack.pop()
+            if m == -1:
+                nodes.append(b)
+            else:
+                stack.append((m, b, middle_of(m, b)))  # Popped second
+                stack.append((a, m, middle_of(a, m)))
+        return nodes
+
+    def astar_path(self, mode, source, target):
+        """
+        A* on the uncontracted graph with a straight-line-at-top-speed heuristic.
+        Returns (seconds, node list) or None.
+        """
+        offsets, targets, seconds = self.graphs[mode]
+        max_speed = self.meta["max_speed_mps"][mode]
+        target_lat, target_lon = math.radians(self.lat[target]), math.radians(self.lon[target])
+        cos_target = math.cos(target_lat)
+
+        def heuristic(node):
+            node_lat, node_lon = math.radians(self.lat[node]), math.radians(self.lon[node])
+            a = math.sin((target_lat - node_lat) / 2) ** 2 + math.cos(node_lat) * cos_target * math.sin((target_lon - node_lon) / 2) ** 2
+            return 2 * EARTH_RADIUS_KM * 1000 * math.asin(math.sqrt(min(1.0, a))) / max_speed
+
+        best, came_from = {source: 0.0}, {}
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if cost > best[node]:
+                continue  # Stale heap entry
+            start, end = int(offsets[node]), int(offsets[node + 1])
+            for neighbor, edge_seconds in zip(targets[start:end].tolist(), seconds[start:end].tolist()):
+                new_cost = cost + edge_seconds
+                if new_cost < best.get(neighbor, float("inf")):
+                    best[neighbor] = new_cost
+                    came_from[neighbor] = node
+                    heapq.heappush(heap, (new_cost + heuristic(neighbor), new_cost, neighbor))
+        else:
+            return None
+
+        path = [target]
+        while path[-1] != source:
+            path.append(came_from[path[-1]])
+        return best[target], path[::-1]
+
+    def path_meters(self, path):
+        path = np.array(path, dtype=np.int64)
+        return float(haversine_m_array(self.lat[path[:-1]], self.lon[path[:-1]], self.lat[path[1:]], self.lon[path[1:]]).sum())
+
+    def route(self, start, end, mode):
+        """Route between two resolved places, or None if either is off the network or unreachable."""
+        if mode not in self.graphs:
+            return None
+        source, target = self.nearest_node(start["lat"], start["lon"], mode), self.nearest_node(end["lat"], end["lon"], mode)
+        if source is None or target is None:
+            return None
+        if mode not in self.hierarchies and haversine_km(start["lat"], start["lon"], end["lat"], end["lon"]) > ROUTE_PRACTICAL_KM.get(mode, float("inf")):
+            return None  # A* would explore most of the extract for a trip nobody makes this way
+        found = self.shortest_path(mode, source[0], target[0])
+        if found is None:
+            return None
+        seconds, path = found
+        return {
+            "seconds": seconds,
+            "meters": self.path_meters(path),
+            "snap_meters": max(source[1], target[1]),
+            "polyline": encode_polyline([(self.lat[node], self.lon[node]) for node in path]),
+        }
+
+def load_road_graph(directory):
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        return None
+    try:
+        return RoadGraph(directory)
+    except Exception as e:
+        print(f"Could not load road graph from {directory}: {e}")
+        return None
+
+def estimate_route_on_roads(origin, destination, mode):
+    """Travel estimate text from the road graph, or None when it cannot route the trip."""
+    if ROAD_GRAPH is None:
+        return None
+    start, end = PLACE_INDEX.lookup(origin), PLACE_INDEX.lookup(destination)
+    if start is None or end is None:
+        return None
+    found = ROAD_GRAPH.route(start, end, mode)
+    if found is None:
+        return None
+    return (
+        f"**{format_distance(found['meters'] / 1000)}** by {mode} along the road network, "
+        f"roughly **{format_duration(found['seconds'] / 60)}**. "
+        f"Resolved as {start['name']} ({start['country']}) → {end['name']} ({end['country']}), "
+        f"each within {found['snap_meters']:,.0f} m of the network.\n\n"
+        f"<details><summary>Route polyline (Google encoded, precision 5)</summary>\n\n`{found['polyline']}`\n\n</details>"
+    )
+
+def benchmark_road_graph(graph, mode="driving", queries=200, seed=7):
     """
-    Generates a factual report by prompting the LLM to act as a historical analyst.
+    Latency of random node-to-node queries. For contracted modes plain A* runs the
+    first 20 of them as a baseline, and travel times that disagree are counted.
     """
-    if client is None:
-        return "Error: Groq client not initialized."
+    rng = random.Random(seed)
+    nodes = np.flatnonzero(np.diff(graph.graphs[mode][0]) > 0)
+    pairs = [(int(nodes[rng.randrange(len(nodes))]), int(nodes[rng.randrange(len(nodes))])) for _ in range(queries)]
+
+    def latencies(search, sample):
+        results, timings = [], []
+        for source, target in sample:
+            started = time.perf_counter()
+            results.append(search(mode, source, target))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return results, {"p50_ms": round(timings[len(timings) // 2], 3), "p95_ms": round(timings[max(0, int(len(timings) * 0.95) - 1)], 3)}
+
+    astar_results, astar_latency = latencies(graph.astar_path, pairs[:min(queries, 20)])
+    if mode not in graph.hierarchies:
+        return {"astar": astar_latency, "routed": sum(result is not None for result in astar_results)}
+    ch_results, ch_latency = latencies(graph.hierarchy_path, pairs)
+    mismatches = sum(
+        (a is None) != (c is None) or (a is not None and abs(a[0] - c[0]) > 1e-3 * max(1.0, a[0]))
+        for a, c in zip(astar_results, ch_results)
+    )
+    return {"ch": ch_latency, "astar": astar_latency, "routed": sum(result is not None for result in ch_results), "mismatches": mismatches}
 
-    if not origin or not destination:
-        return "Error: Please provide both an origin and a destination."
+ROAD_GRAPH = load_road_graph(ROAD_GRAPH_DIR)
 
-    # 1. Get Estimated Travel Time/Distance from LLM (Simulated RAG)
+def build_route_messages(origin, destination, mode):
+    """Transport-analyst prompt plus the route estimation request."""
     user_query = f"Estimate the travel time and distance for a typical route from {origin} to {destination} using {mode} mode."
 
-    messages = [
+    return [
         {"role": "system", "content": ROUTE_SYSTEM_PROMPT},
         {"role": "user", "content": user_query}
     ]
 
-    try:
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=GROQ_CHAT_MODEL
-        )
-        travel_estimate = chat_completion.choices[0].message.content.strip()
-    except APIError as e:
-        travel_estimate = f"**[API Error]** Could not get travel estimate: {e}"
-    except Exception as e:
-        travel_estimate = f"**[Error]** An unexpected error occurred: {e}"
-
-    # 2. Generate Google Maps URLs
+def format_route_markdown(origin, destination, mode, travel_estimate, estimate_source="LLM Simulation"):
+    """Combines the travel estimate with Google Maps links and an embedded map."""
+    # Generate Google Maps URLs
     encoded_origin = quote_plus(origin)
     encoded_destination = quote_plus(destination)
 
@@ -497,10 +4655,10 @@ def generate_route_and_map(origin, destination, mode="driving"):
     </iframe>
     '''
 
-    # 3. Combined Markdown Output
+    # Combined Markdown Output
     markdown_output = (
         f"# 🗺 Route from {origin} to {destination}\n\n"
-        f"**Estimated Travel Details (LLM Simulation):** {travel_estimate}\n\n"
+        f"**Estimated Travel Details ({estimate_source}):** {travel_estimate}\n\n"
         f"## Live Interactive Map\n"
         f"To view the route and turn-by-turn directions, you can click [here]({direct_map_url}) or use the embedded map below.\n"
         f"{iframe_html}"
@@ -508,20 +4666,74 @@ def generate_route_and_map(origin, destination, mode="driving"):
 
     return markdown_output
 
-# ----------------------------------------------------------------------
-# 7. Budget Estimator Function (NEW)
-# ----------------------------------------------------------------------
-
-def generate_budget(destination, travel_style):
+def generate_route_and_map(origin, destination, mode="driving"):
     """
-    Generates a structured JSON budget estimate and converts it to a table.
+    Routes on the offline road graph when it covers the trip, otherwise estimates
+    travel time/distance locally (or with the LLM for places the offline index does
+    not know), and adds a Google Maps route preview.
     """
+    if not origin or not destination:
+        return "Error: Please provide both an origin and a destination."
+
+    travel_estimate = estimate_route_on_roads(origin, destination, mode)
+    if travel_estimate is not None:
+        return format_route_markdown(origin, destination, mode, travel_estimate, "Offline Road Network")
+
+    travel_estimate = estimate_route_locally(origin, destination, mode)
+    if travel_estimate is not None:
+        return format_route_markdown(origin, destination, mode, travel_estimate, "Local Estimate")
+
     if client is None:
-        return f"Error: Groq client not initialized."
+        return "Error: Groq client not initialized."
 
-    if not destination or not travel_style:
-        return f"Error: Please provide a destination and a travel style."
+    # Unknown place: get Estimated Travel Time/Distance from LLM (Simulated RAG)
+    cache_key = llm_cache_key(GROQ_CHAT_MODEL, ROUTE_SYSTEM_PROMPT, origin, destination, mode)
+
+    try:
+        travel_estimate = complete_chat(build_route_messages(origin, destination, mode), cache_key=cache_key)
+    except APIError as e:
+        travel_estimate = f"**[API Error]** Could not get travel estimate: {e}"
+    except Exception as e:
+        travel_estimate = f"**[Error]** An unexpected error occurred: {e}"
+
+    return format_route_markdown(origin, destination, mode, travel_estimate)
+
+async def generate_route_and_map_async(origin, destination, mode="driving"):
+    """
+    Async version of generate_route_and_map.
+    """
+    if not origin or not destination:
+        return "Error: Please provide both an origin and a destination."
+
+    # Graph search and place lookups are CPU-bound; keep them off the event loop
+    travel_estimate = await asyncio.to_thread(estimate_route_on_roads, origin, destination, mode)
+    if travel_estimate is not None:
+        return format_route_markdown(origin, destination, mode, travel_estimate, "Offline Road Network")
+
+    travel_estimate = await asyncio.to_thread(estimate_route_locally, origin, destination, mode)
+    if travel_estimate is not None:
+        return format_route_markdown(origin, destination, mode, travel_estimate, "Local Estimate")
+
+    if async_client is None:
+        return "Error: Groq client not initialized."
+
+    cache_key = llm_cache_key(GROQ_CHAT_MODEL, ROUTE_SYSTEM_PROMPT, origin, destination, mode)
+
+    try:
+        travel_estimate = await complete_chat_async(build_route_messages(origin, destination, mode), cache_key=cache_key)
+    except APIError as e:
+        travel_estimate = f"**[API Error]** Could not get travel estimate: {e}"
+    except Exception as e:
+        travel_estimate = f"**[Error]** An unexpected error occurred: {e}"
 
+    return format_route_markdown(origin, destination, mode, travel_estimate)
+
+# ----------------------------------------------------------------------
+# 7. Budget Estimator Function (NEW)
+# ----------------------------------------------------------------------
+
+def build_budget_messages(destination, travel_style):
+    """Budget JSON-schema prompt plus the estimate request."""
     user_query = (
         f"Estimate the daily budget for: "
         f"Destination: {destination}, "
@@ -529,42 +4741,114 @@ def generate_budget(destination, travel_style):
         f"Adhere strictly to the JSON schema provided in the system prompt."
     )
 
-    messages = [
+    return [
         {"role": "system", "content": BUDGET_SYSTEM_PROMPT},
         {"role": "user", "content": user_query}
     ]
 
+def budget_line_items(daily_budget):
+    """(category, USD per day) pairs; values the model did not give as numbers are skipped."""
+    line_items = []
+    for category, cost in (daily_budget or {}).items():
+        try:
+            line_items.append((category, float(str(cost).replace("$", "").replace(",", ""))))
+        except ValueError:
+            continue
+    return line_items
+
+def format_money(amount, currency):
+    if currency == "USD":
+        return f"${amount:,.2f}"
+    return f"{amount:,.{currency_decimal_places(currency)}f} {currency}"
+
+def format_budget_markdown(budget_data, trip_days=1, currency="USD"):
+    """
+    Format JSON output as a human-readable Markdown table, with every line item
+    converted from USD into `currency` at the local rates and totalled over trip_days.
+    """
+    line_items = budget_line_items(budget_data.get('estimated_daily_budget', {}))
+    converter = RATE_PROVIDER.converter()
+    if "USD" not in converter.index or currency not in converter.index:
+        return f"Error: Currency '{currency}' is not supported by the current exchange rates."
+
+    daily_costs = converter.convert([cost for _, cost in line_items], "USD", currency)
+    total_daily_cost = float(daily_costs.sum())
+
+    markdown_output = f"# 💰 Budget Estimate for {budget_data.get('destination', 'Destination')} ({budget_data.get('travel_style', 'Style')}, {trip_days} Days)\n\n"
+
+    markdown_output += f"| Category | Daily Cost ({currency}) | Trip Total ({currency}) |\n"
+    markdown_output += f"| :--- | :---: | :---: |\n"
+    for (category, _), cost in zip(line_items, daily_costs):
+        markdown_output += f"| {category.replace('_', ' ').title()} | {format_money(cost, currency)} | {format_money(cost * trip_days, currency)} |\n"
+
+    markdown_output += f"| **TOTAL ESTIMATED COST** | **{format_money(total_daily_cost, currency)}** | **{format_money(total_daily_cost * trip_days, currency)}** |\n\n"
+    markdown_output += f"**Analyst Notes:** {budget_data.get('notes', 'No specific notes provided.')}\n"
+    if currency != "USD":
+        markdown_output += f"\n*Converted from USD at 1 USD = {converter.rate('USD', currency):,.4f} {currency}.* {rates_note(converter)}\n"
+
+    return markdown_output
+
+def parse_trip_days(trip_days):
+    """Whole number of days, at least 1."""
     try:
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=GROQ_CHAT_MODEL,
-        )
-        raw_json_string = chat_completion.choices[0].message.content.strip()
+        return max(1, int(round(float(trip_days))))
+    except (TypeError, ValueError):
+        return 1
+
+def generate_budget(destination, travel_style, trip_days=1, currency="USD"):
+    """
+    Generates a structured JSON budget estimate and converts it to a table of daily
+    and whole-trip costs in the chosen currency.
+    """
+    if client is None:
+        return f"Error: Groq client not initialized."
 
-        # Clean up Markdown/JSON wrappers
-        if raw_json_string.startswith("```json"):
-            raw_json_string = raw_json_string.strip("```json").strip("```").strip()
+    if not destination or not travel_style:
+        return f"Error: Please provide a destination and a travel style."
 
-        budget_data = json.loads(raw_json_string)
+    # Days and currency are applied locally, so they stay out of the key: changing them
+    # re-renders the cached estimate without another Groq call
+    cache_key = llm_cache_key(GROQ_CHAT_MODEL, BUDGET_SYSTEM_PROMPT, destination, travel_style)
 
-        daily_budget = budget_data.get('estimated_daily_budget', {})
-        total_daily_cost = sum(daily_budget.values())
+    try:
+        budget_data = complete_structured(
+            "budget",
+            build_budget_messages(destination, travel_style),
+            cache_key=cache_key
+        )
+        return format_budget_markdown(budget_data, parse_trip_days(trip_days), currency or "USD")
 
-        # Format JSON output as human-readable Markdown table
-        markdown_output = f"# 💰 Daily Budget Estimate for {budget_data.get('destination', 'Destination')} ({budget_data.get('travel_style', 'Style')})\n\n"
+    except json.JSONDecodeError as e:
+        return f"**[Error]** Could not parse JSON response from the model. Raw output:\n\n```json\n{e.doc}\n```"
+    except APIError as e:
+        return f"**[API Error]** Budget estimation failed: {e}. Check API key and rate limits."
+    except Exception as e:
+        return f"**[Error]** An unexpected error occurred: {e}"
 
-        markdown_output += f"| Category | Daily Cost (USD) |\n"
-        markdown_output += f"| :--- | :---: |\n"
-        for category, cost in daily_budget.items():
-            markdown_output += f"| {category.replace('_', ' ').title()} | ${cost:,.2f} |\n"
+async def generate_budget_async(destination, travel_style, trip_days=1, currency="USD"):
+    """
+    Async version of generate_budget.
+    """
+    if async_client is None:
+        return f"Error: Groq client not initialized."
 
-        markdown_output += f"| **TOTAL ESTIMATED DAILY COST** | **${total_daily_cost:,.2f}** |\n\n"
-        markdown_output += f"**Analyst Notes:** {budget_data.get('notes', 'No specific notes provided.')}\n"
+    if not destination or not travel_style:
+        return f"Error: Please provide a destination and a travel style."
 
-        return markdown_output
+    # Days and currency are applied locally, so they stay out of the key: changing them
+    # re-renders the cached estimate without another Groq call
+    cache_key = llm_cache_key(GROQ_CHAT_MODEL, BUDGET_SYSTEM_PROMPT, destination, travel_style)
 
-    except json.JSONDecodeError:
-        return f"**[Error]** Could not parse JSON response from the model. Raw output:\n\n```json\n{raw_json_string}\n```"
+    try:
+        budget_data = await complete_structured_async(
+            "budget",
+            build_budget_messages(destination, travel_style),
+            cache_key=cache_key
+        )
+        return format_budget_markdown(budget_data, parse_trip_days(trip_days), currency or "USD")
+
+    except json.JSONDecodeError as e:
+        return f"**[Error]** Could not parse JSON response from the model. Raw output:\n\n```json\n{e.doc}\n```"
     except APIError as e:
         return f"**[API Error]** Budget estimation failed: {e}. Check API key and rate limits."
     except Exception as e:
@@ -574,67 +4858,368 @@ def generate_budget(destination, travel_style):
 # 8. Travel Trivia Quiz Functions (NEW)
 # ----------------------------------------------------------------------
 
-def generate_trivia_question(destination=None):
-    """
-    Generates a single travel trivia question using Groq API.
-    """
-    if client is None:
-        return None, "Error: Groq client not initialized."
-
+def build_trivia_messages(destination=None):
+    """Trivia JSON prompt, optionally focused on a destination."""
     prompt = TRIVIA_SYSTEM_PROMPT
     if destination:
         prompt += f"\n\nFocus the question on {destination} or related travel topics."
 
-    messages = [
+    return [
         {"role": "system", "content": prompt},
         {"role": "user", "content": "Generate one travel trivia question."}
     ]
 
+def generate_trivia_question(destination=None):
+    """
+    Generates a single travel trivia question using Groq API.
+    """
+    if client is None:
+        return None, "Error: Groq client not initialized."
+
     try:
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=GROQ_CHAT_MODEL,
-        )
-        raw_json_string = chat_completion.choices[0].message.content.strip()
+        with llm_priority(PRIORITY_BACKGROUND):
+            question_data = complete_structured("trivia", build_trivia_messages(destination))
+        TRIVIA_BANK.add(destination, [question_data])
+        return question_data, None
+
+    except json.JSONDecodeError as e:
+        return None, f"Could not parse question. Raw response: {e.doc}"
+    except APIError as e:
+        return None, f"API Error: {e}"
+    except Exception as e:
+        return None, f"Error: {e}"
 
-        # Clean up JSON response
-        if raw_json_string.startswith("```json"):
-            raw_json_string = raw_json_string.strip("```json").strip("```").strip()
+async def generate_trivia_question_async(destination=None):
+    """
+    Async version of generate_trivia_question.
+    """
+    if async_client is None:
+        return None, "Error: Groq client not initialized."
 
-        question_data = json.loads(raw_json_string)
+    try:
+        with llm_priority(PRIORITY_BACKGROUND):
+            question_data = await complete_structured_async("trivia", build_trivia_messages(destination))
+        await asyncio.to_thread(TRIVIA_BANK.add, destination, [question_data])
         return question_data, None
 
-    except json.JSONDecodeError:
-        return None, f"Could not parse question. Raw response: {raw_json_string}"
+    except json.JSONDecodeError as e:
+        return None, f"Could not parse question. Raw response: {e.doc}"
     except APIError as e:
         return None, f"API Error: {e}"
     except Exception as e:
         return None, f"Error: {e}"
 
-def start_trivia_quiz(destination):
+# --- Trivia Question Bank ---
+# Every generated question is kept in SQLite (TRIVIA_BANK_DB_FILE), deduplicated by a
+# hash of its normalized text and indexed by destination. Quizzes are served from
+# the bank, skipping questions the same player saw within TRIVIA_SEEN_TTL, so most
+# quizzes need no Groq call and keep working while Groq is unavailable.
+TRIVIA_BANK_DB_FILE = os.environ.get("TRIVIA_BANK_DB_FILE", "travel_trivia_bank.sqlite3")  # "" keeps the bank in memory
+TRIVIA_SEEN_TTL = 90 * 24 * 60 * 60  # Seconds before a player may be shown a question again
+
+def trivia_question_key(question_data):
+    """Case- and whitespace-insensitive question text, used to spot repeats."""
+    return " ".join(question_data["question"].casefold().split())
+
+def trivia_question_id(question_data):
+    return hashlib.sha256(trivia_question_key(question_data).encode("utf-8")).hexdigest()
+
+def trivia_destination_key(destination):
+    """Bank index for a destination; "" is the general quiz."""
+    return " ".join((destination or "").casefold().split())
+
+def trivia_player_key(request):
+    """
+    Anonymous, stable id for the player behind a Gradio request: the login name when
+    auth is enabled, otherwise a hash of client address and browser.
+    """
+    if request is None:
+        return "anonymous"
+    username = getattr(request, "username", None)
+    if username:
+        return f"user:{username}"
+    host = getattr(getattr(request, "client", None), "host", None) or ""
+    agent = (getattr(request, "headers", None) or {}).get("user-agent", "")
+    return "anon:" + hashlib.sha256(f"{host}|{agent}".encode("utf-8")).hexdigest()[:32]
+
+class TriviaQuestionBank:
+    """Validated questions by destination, plus which player has seen which question."""
+
+    def __init__(self, path, seen_ttl):
+        self.seen_ttl = seen_ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30)
+        if path:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS trivia_questions (
+                id TEXT PRIMARY KEY, destination TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS trivia_questions_by_destination ON trivia_questions (destination);
+            CREATE TABLE IF NOT EXISTS trivia_seen (
+                player TEXT NOT NULL, question_id TEXT NOT NULL, seen_at REAL NOT NULL,
+                PRIMARY KEY (player, question_id)
+            ) WITHOUT ROWID;
+        """)
+        self.conn.execute("DELETE FROM trivia_seen WHERE seen_at < ?", (time.time() - seen_ttl,))
+        self.conn.commit()
+        self.counters = {"added": 0, "duplicates": 0, "served": 0}
+
+    def add(self, destination, questions):
+        """Stores new questions under `destination`; ones already in the bank are ignored."""
+        now = time.time()
+        rows = [
+            (trivia_question_id(question), trivia_destination_key(destination), json.dumps(question, ensure_ascii=False), now)
+            for question in questions
+        ]
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO trivia_questions (id, destination, data, created_at) VALUES (?, ?, ?, ?)", rows)
+            self.conn.commit()
+            added = self.conn.total_changes - before
+            self.counters["added"] += added
+            self.counters["duplicates"] += len(rows) - added
+
+    def unseen_filter(self, destination):
+        """WHERE clause and parameters (before player and cutoff) for a destination's unseen questions."""
+        key = trivia_destination_key(destination)
+        clause = (
+            "(? = '' OR destination = ?) AND NOT EXISTS ("
+            "SELECT 1 FROM trivia_seen WHERE player = ? AND question_id = trivia_questions.id AND seen_at >= ?)"
+        )
+        return clause, (key, key)
+
+    def sample(self, destination, player, count):
+        """Up to `count` random questions the player has not seen; general quizzes draw from every destination."""
+        clause, params = self.unseen_filter(destination)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT data FROM trivia_questions WHERE {clause} ORDER BY random() LIMIT ?",
+                params + (player, time.time() - self.seen_ttl, count)
+            ).fetchall()
+            self.counters["served"] += len(rows)
+        return [json.loads(data) for data, in rows]
+
+    def unseen_count(self, destination, player):
+        clause, params = self.unseen_filter(destination)
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT COUNT(*) FROM trivia_questions WHERE {clause}", params + (player, time.time() - self.seen_ttl)
+            ).fetchone()[0]
+
+    def unseen(self, player, questions):
+        """The questions the player has not been shown within the TTL."""
+        ids = [trivia_question_id(question) for question in questions]
+        with self.lock:
+            seen = {
+                question_id for question_id, in self.conn.execute(
+                    f"SELECT question_id FROM trivia_seen WHERE player = ? AND seen_at >= ? AND question_id IN ({','.join('?' * len(ids))})",
+                    (player, time.time() - self.seen_ttl, *ids)
+                )
+            } if ids else set()
+        return [question for question, question_id in zip(questions, ids) if question_id not in seen]
+
+    def mark_seen(self, player, question_data):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO trivia_seen (player, question_id, seen_at) VALUES (?, ?, ?)",
+                (player, trivia_question_id(question_data), time.time())
+            )
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            questions, destinations = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT destination) FROM trivia_questions").fetchone()
+            players = self.conn.execute("SELECT COUNT(DISTINCT player) FROM trivia_seen").fetchone()[0]
+            return {**self.counters, "questions": questions, "destinations": destinations, "players": players}
+
+TRIVIA_BANK = TriviaQuestionBank(TRIVIA_BANK_DB_FILE, TRIVIA_SEEN_TTL)
+
+# --- Trivia Question Pool ---
+# Questions are generated ahead of time so answering never waits on Groq. A quiz
+# starts from the bank's unseen questions; when a player is running low for a
+# destination, a background worker adds a fresh batch to the bank, and whatever a
+# new quiz could not get is generated in one background completion while the
+# player reads question 1.
+TRIVIA_QUIZ_LENGTH = 5                  # Questions per quiz
+TRIVIA_POOL_SIZE = int(os.environ.get("TRIVIA_POOL_SIZE", 10))  # Unseen questions to keep ready per destination
+TRIVIA_PREFETCH_WORKERS = int(os.environ.get("TRIVIA_PREFETCH_WORKERS", 4))
+TRIVIA_SET_TOKENS_PER_QUESTION = 200    # max_tokens budget per question in a multi-question completion
+# Pools filled at startup besides the general one (comma-separated destinations)
+TRIVIA_WARM_DESTINATIONS = [name.strip() for name in os.environ.get("TRIVIA_WARM_DESTINATIONS", "").split(",") if name.strip()]
+
+TRIVIA_PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=TRIVIA_PREFETCH_WORKERS, thread_name_prefix="trivia-prefetch")
+
+def build_trivia_set_messages(destination, count):
+    prompt = TRIVIA_SET_SYSTEM_PROMPT.format(count=count)
+    if destination:
+        prompt += f"\n\nFocus the questions on {destination} or related travel topics."
+
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": f"Generate {count} travel trivia questions."}
+    ]
+
+def generate_trivia_questions(destination, count):
+    """
+    Generates up to `count` distinct questions in a single JSON completion and adds
+    them to the bank. Returns (questions, error). Runs on the prefetch workers.
+    """
+    if client is None:
+        return [], "Error: Groq client not initialized."
+
+    try:
+        with llm_priority(PRIORITY_BACKGROUND):
+            question_set = complete_structured(
+                "trivia_set",
+                build_trivia_set_messages(destination, count),
+                max_tokens=TRIVIA_SET_TOKENS_PER_QUESTION * count
+            )
+        questions = list({trivia_question_key(question): question for question in question_set["questions"]}.values())[:count]
+        TRIVIA_BANK.add(destination, questions)
+        return questions, None
+
+    except json.JSONDecodeError as e:
+        return [], f"Could not parse questions. Raw response: {e.doc}"
+    except APIError as e:
+        return [], f"API Error: {e}"
+    except Exception as e:
+        return [], f"Error: {e}"
+
+class TriviaQuestionPool:
+    """
+    Serves quiz questions from the bank and keeps at least `target_size` unseen
+    questions per destination and player by refilling the bank in the background.
+    At most one refill per destination runs at a time.
+    """
+
+    def __init__(self, bank, target_size, executor):
+        self.bank = bank
+        self.target_size = target_size
+        self.executor = executor
+        self.lock = threading.Lock()
+        self.refills = {}  # destination key -> Future of the running refill
+        self.counters = {"served": 0, "missed": 0, "refills": 0, "refill_errors": 0}
+
+    def take(self, destination, player, count):
+        """Up to `count` questions the player has not seen, possibly none. Never waits for Groq."""
+        taken = self.bank.sample(destination, player, count)
+        with self.lock:
+            self.counters["served"] += len(taken)
+            self.counters["missed"] += count - len(taken)
+        if self.bank.unseen_count(destination, player) - len(taken) < self.target_size:
+            self.refill(destination)
+        return taken
+
+    def refill(self, destination):
+        """Starts a background batch for `destination` unless one is already running."""
+        key = trivia_destination_key(destination)
+        with self.lock:
+            if key not in self.refills:
+                # Submitted under the lock, so fill() cannot finish before it is registered
+                self.refills[key] = self.executor.submit(self.fill, key, destination)
+            return self.refills[key]
+
+    def fill(self, key, destination):
+        _, error = generate_trivia_questions(destination, self.target_size)
+        if error:
+            print(f"Trivia pool refill for '{destination or 'general'}' failed: {error}")
+        with self.lock:
+            self.refills.pop(key, None)
+            self.counters["refills"] += 1
+            if error:
+                self.counters["refill_errors"] += 1
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "refilling": len(self.refills)}
+
+TRIVIA_POOL = TriviaQuestionPool(TRIVIA_BANK, TRIVIA_POOL_SIZE, TRIVIA_PREFETCH_EXECUTOR)
+
+# Background fetches are process-local: a session served by another worker skips
+# them and draws its next question from the bank instead.
+TRIVIA_PREFETCHES = OrderedDict()  # session_id -> Future of (questions, error)
+TRIVIA_PREFETCHES_LOCK = threading.Lock()
+
+def prefetch_trivia_questions(session_id, destination, count):
+    """Starts generating `count` more questions for the session in the background."""
+    if count <= 0:
+        return
+    future = TRIVIA_PREFETCH_EXECUTOR.submit(generate_trivia_questions, destination, count)
+    with TRIVIA_PREFETCHES_LOCK:
+        TRIVIA_PREFETCHES[session_id] = future
+        while len(TRIVIA_PREFETCHES) > TRIVIA_SESSION_MAX_ENTRIES:
+            TRIVIA_PREFETCHES.popitem(last=False)
+
+def pop_trivia_prefetch(session_id):
+    with TRIVIA_PREFETCHES_LOCK:
+        return TRIVIA_PREFETCHES.pop(session_id, None)
+
+def store_trivia_prefetch(session, questions, error):
+    if error:
+        print(f"Trivia prefetch failed, generating questions on demand: {error}")
+    session.upcoming.extend(TRIVIA_BANK.unseen(session.player, questions))
+
+def wait_for_trivia_prefetch(session):
+    """Moves the session's background questions into its queue, waiting if they are still coming."""
+    future = pop_trivia_prefetch(session.session_id)
+    if future is None:
+        return
+    try:
+        questions, error = future.result(timeout=LLM_REQUEST_DEADLINE)
+    except Exception as e:
+        questions, error = [], f"Error: {e}"
+    store_trivia_prefetch(session, questions, error)
+
+async def wait_for_trivia_prefetch_async(session):
     """
-    Starts a new trivia quiz session.
+    Async version of wait_for_trivia_prefetch.
     """
-    session_id = str(time.time())  # Simple session ID
+    future = pop_trivia_prefetch(session.session_id)
+    if future is None:
+        return
+    try:
+        questions, error = await asyncio.wait_for(asyncio.wrap_future(future), LLM_REQUEST_DEADLINE)
+    except Exception as e:
+        questions, error = [], f"Error: {e}"
+    await asyncio.to_thread(store_trivia_prefetch, session, questions, error)
 
-    # Generate first question
-    question_data, error = generate_trivia_question(destination)
+def pop_upcoming_trivia_question(session):
+    """
+    Next question the session has not shown yet: queued ones first, then an unseen
+    one from the bank. None if neither has any.
+    """
+    while session.upcoming:
+        question_data = session.upcoming.pop(0)
+        if trivia_question_key(question_data) not in session.asked:
+            return question_data
+    return next(iter(TRIVIA_POOL.take(session.destination, session.player, 1)), None)
 
+def open_trivia_session(destination, player, questions, error):
+    """
+    Creates the quiz session from its first question(s) and starts generating the
+    rest in the background.
+    """
     if error:
         return None, None, None, None, f"Error starting quiz: {error}"
 
+    question_data = questions[0]
+    TRIVIA_BANK.mark_seen(player, question_data)
+
     # Initialize session
-    TRIVIA_SESSIONS[session_id] = {
-        'destination': destination,
-        'current_question': question_data,
-        'score': 0,
-        'questions_asked': 1,
-        'total_questions': 5,  # Fixed number of questions per quiz
-        'start_time': time.time()
-    }
+    session = TriviaSession(
+        destination,
+        player,
+        question_data,
+        total_questions=TRIVIA_QUIZ_LENGTH,  # Fixed number of questions per quiz
+        upcoming=questions[1:],  # Questions ready to show next
+        asked=[trivia_question_key(question_data)]
+    )
+    session_id = TRIVIA_SESSIONS.create(session)
+    prefetch_trivia_questions(session_id, destination, TRIVIA_QUIZ_LENGTH - len(questions))
 
     # Format question display
-    question_display = f"## 🧠 Question 1/{TRIVIA_SESSIONS[session_id]['total_questions']}\n\n"
+    question_display = f"## 🧠 Question 1/{session.total_questions}\n\n"
     question_display += f"**{question_data['question']}**\n\n"
 
     for option in question_data['options']:
@@ -642,15 +5227,36 @@ def start_trivia_quiz(destination):
 
     return session_id, question_display, gr.update(visible=True), gr.update(visible=False), ""
 
-def submit_trivia_answer(session_id, user_answer, current_display):
+def start_trivia_quiz(destination, request: gr.Request = None):
     """
-    Processes user's answer and provides feedback, then loads next question.
+    Starts a new trivia quiz session, from the question bank when it has enough
+    questions this player has not seen.
     """
-    if session_id not in TRIVIA_SESSIONS:
-        return None, None, None, "Quiz session expired. Please start a new quiz."
-
-    session = TRIVIA_SESSIONS[session_id]
-    current_question = session['current_question']
+    player = trivia_player_key(request)
+    questions, error = TRIVIA_POOL.take(destination, player, TRIVIA_QUIZ_LENGTH), None
+    if not questions:
+        # Nothing unseen in the bank: a single-question call is the quickest way to question 1
+        question_data, error = generate_trivia_question(destination)
+        questions = [question_data]
+    return open_trivia_session(destination, player, questions, error)
+
+async def start_trivia_quiz_async(destination, request: gr.Request = None):
+    """
+    Async version of start_trivia_quiz.
+    """
+    player = trivia_player_key(request)
+    # The bank and session store are SQLite-backed; keep their reads and commits off the event loop
+    questions, error = await asyncio.to_thread(TRIVIA_POOL.take, destination, player, TRIVIA_QUIZ_LENGTH), None
+    if not questions:
+        question_data, error = await generate_trivia_question_async(destination)
+        questions = [question_data]
+    return await asyncio.to_thread(open_trivia_session, destination, player, questions, error)
+
+def grade_trivia_answer(session, user_answer):
+    """
+    Scores the answer to the current question and returns the feedback Markdown.
+    """
+    current_question = session.current_question
 
     # Check answer
     user_answer_clean = user_answer.upper().strip()
@@ -659,74 +5265,125 @@ def submit_trivia_answer(session_id, user_answer, current_display):
     # Prepare feedback
     feedback = ""
     if user_answer_clean == correct_answer:
-        session['score'] += 1
+        session.score += 1
         feedback = f"✅ **Correct!** Well done!\n\n"
     else:
         feedback = f"❌ **Incorrect!** The right answer was **{correct_answer}**\n\n"
 
     feedback += f"**Explanation:** {current_question.get('explanation', 'No explanation provided.')}\n\n"
+    return feedback
 
-    # Check if quiz is complete
-    if session['questions_asked'] >= session['total_questions']:
-        # Quiz complete - show final results
-        final_score = session['score']
-        total_questions = session['total_questions']
-        percentage = (final_score / total_questions) * 100
-
-        final_display = f"# 🎉 Quiz Complete!\n\n"
-        final_display += f"**Final Score: {final_score}/{total_questions} ({percentage:.1f}%)**\n\n"
-
-        if percentage >= 80:
-            final_display += "🏆 **Excellent!** You're a travel expert!\n"
-        elif percentage >= 60:
-            final_display += "👍 **Good job!** You know your travel facts!\n"
-        else:
-            final_display += "📚 **Keep exploring!** The world is full of amazing facts to discover!\n"
+def finish_trivia_quiz(session):
+    """
+    Shows the final results and removes the session.
+    """
+    final_score = session.score
+    total_questions = session.total_questions
+    percentage = (final_score / total_questions) * 100
 
-        final_display += f"\n*Quiz about: {session['destination'] if session['destination'] else 'General Travel'}*"
+    final_display = f"# 🎉 Quiz Complete!\n\n"
+    final_display += f"**Final Score: {final_score}/{total_questions} ({percentage:.1f}%)**\n\n"
 
-        # Clean up session
-        del TRIVIA_SESSIONS[session_id]
+    if percentage >= 80:
+        final_display += "🏆 **Excellent!** You're a travel expert!\n"
+    elif percentage >= 60:
+        final_display += "👍 **Good job!** You know your travel facts!\n"
+    else:
+        final_display += "📚 **Keep exploring!** The world is full of amazing facts to discover!\n"
 
-        return None, final_display, gr.update(visible=False), gr.update(visible=True), ""
+    final_display += f"\n*Quiz about: {session.destination if session.destination else 'General Travel'}*"
 
-    else:
-        # Generate next question
-        next_question_data, error = generate_trivia_question(session['destination'])
+    # Clean up session
+    TRIVIA_SESSIONS.delete(session.session_id)
+    pop_trivia_prefetch(session.session_id)
 
-        if error:
-            return session_id, current_display + f"\n\nError loading next question: {error}", gr.update(visible=True), gr.update(visible=False), feedback
+    return None, final_display, gr.update(visible=False), gr.update(visible=True), ""
+
+def show_next_trivia_question(session, next_question_data, error, feedback, current_display):
+    """
+    Advances the session to the next question, saves it and formats the question
+    below the previous feedback.
+    """
+    if error:
+        TRIVIA_SESSIONS.save(session)
+        return session.session_id, current_display + f"\n\nError loading next question: {error}", gr.update(visible=True), gr.update(visible=False), feedback
 
-        session['current_question'] = next_question_data
-        session['questions_asked'] += 1
+    session.current_question = next_question_data
+    session.questions_asked += 1
+    session.asked.add(trivia_question_key(next_question_data))
+    TRIVIA_BANK.mark_seen(session.player, next_question_data)
+    TRIVIA_SESSIONS.save(session)
 
-        # Format next question
-        next_display = f"## 🧠 Question {session['questions_asked']}/{session['total_questions']}\n\n"
-        next_display += f"**{next_question_data['question']}**\n\n"
+    # Format next question
+    next_display = f"## 🧠 Question {session.questions_asked}/{session.total_questions}\n\n"
+    next_display += f"**{next_question_data['question']}**\n\n"
 
-        for option in next_question_data['options']:
-            next_display += f"- {option}\n"
+    for option in next_question_data['options']:
+        next_display += f"- {option}\n"
 
-        next_display += f"\n---\n{feedback}---\n"
+    next_display += f"\n---\n{feedback}---\n"
 
-        return session_id, next_display, gr.update(visible=True), gr.update(visible=False), ""
+    return session.session_id, next_display, gr.update(visible=True), gr.update(visible=False), ""
+
+def submit_trivia_answer(session_id, user_answer, current_display):
+    """
+    Processes user's answer and provides feedback, then loads next question.
+    """
+    session = TRIVIA_SESSIONS.get(session_id)
+    if session is None:
+        return None, "Quiz session expired. Please start a new quiz.", gr.update(visible=False), gr.update(visible=True), ""
+
+    feedback = grade_trivia_answer(session, user_answer)
+
+    # Check if quiz is complete
+    if session.questions_asked >= session.total_questions:
+        return finish_trivia_quiz(session)
+
+    # Next question: prefetched or from the bank, generated now only if neither has one
+    if not session.upcoming:
+        wait_for_trivia_prefetch(session)
+    next_question_data, error = pop_upcoming_trivia_question(session), None
+    if next_question_data is None:
+        next_question_data, error = generate_trivia_question(session.destination)
+    return show_next_trivia_question(session, next_question_data, error, feedback, current_display)
+
+async def submit_trivia_answer_async(session_id, user_answer, current_display):
+    """
+    Async version of submit_trivia_answer.
+    """
+    session = await TRIVIA_SESSIONS.get_async(session_id)
+    if session is None:
+        return None, "Quiz session expired. Please start a new quiz.", gr.update(visible=False), gr.update(visible=True), ""
+
+    feedback = grade_trivia_answer(session, user_answer)
+
+    # Session saves/deletes and bank reads are SQLite commits; run them on a worker thread
+    if session.questions_asked >= session.total_questions:
+        return await asyncio.to_thread(finish_trivia_quiz, session)
+
+    if not session.upcoming:
+        await wait_for_trivia_prefetch_async(session)
+    next_question_data, error = await asyncio.to_thread(pop_upcoming_trivia_question, session), None
+    if next_question_data is None:
+        next_question_data, error = await generate_trivia_question_async(session.destination)
+    return await asyncio.to_thread(show_next_trivia_question, session, next_question_data, error, feedback, current_display)
 
 # ----------------------------------------------------------------------
 # 9. Enhanced Public Feedback System with Star Ratings & Database
 # ----------------------------------------------------------------------
 
-def load_feedback():
-    """Reads and formats all stored feedback for display with statistics."""
-    database = load_feedback_database()
-    feedback_entries = database.get("feedback_entries", [])
-    metadata = database.get("metadata", {})
-
-    if not feedback_entries:
-        return "**No feedback yet! Be the first to share your experience.**", "⭐ Overall Rating: No ratings yet"
+def format_feedback_stats(stats):
+    """
+    Builds the statistics header from the running aggregates.
+    Cached until the next review arrives, so repeated renders cost nothing.
+    """
+    today = datetime.date.today()
+    cached = FEEDBACK_CACHE.get("stats_display")
+    if cached and cached[0] == (stats["count"], today):
+        return cached[1]
 
-    # Format statistics
-    total_feedback = metadata.get("total_feedback", 0)
-    average_rating = metadata.get("average_rating", 0)
+    total_feedback = stats["count"]
+    average_rating = round(stats["rating_sum"] / total_feedback, 2) if total_feedback > 0 else 0
 
     stats_display = f"⭐ **Overall Rating: {average_rating}/5** ({total_feedback} reviews)"
 
@@ -744,22 +5401,118 @@ def load_feedback():
 
     stats_display += f"\n{stars_visual}\n"
 
+    # Rating distribution from the histogram
+    for star in range(5, 0, -1):
+        star_count = stats["histogram"].get(str(star), 0)
+        share = star_count / total_feedback if total_feedback > 0 else 0
+        stats_display += f"\n{star}★ {'█' * round(share * 20)} {star_count}"
+
+    # Trends from the daily/weekly rollups (a handful of dict lookups, no scan)
+    last_7_days = [stats["daily"].get((today - datetime.timedelta(days=offset)).isoformat()) for offset in range(7)]
+    recent_count = sum(bucket["count"] for bucket in last_7_days if bucket)
+    recent_sum = sum(bucket["rating_sum"] for bucket in last_7_days if bucket)
+    if recent_count:
+        stats_display += f"\n\n📈 **Last 7 days:** {recent_count} reviews, average {recent_sum / recent_count:.2f}/5"
+
+    this_year, this_week, _ = today.isocalendar()
+    last_year, last_week, _ = (today - datetime.timedelta(weeks=1)).isocalendar()
+    this_bucket = stats["weekly"].get(f"{this_year}-W{this_week:02d}", {"count": 0})
+    last_bucket = stats["weekly"].get(f"{last_year}-W{last_week:02d}", {"count": 0})
+    if this_bucket["count"] or last_bucket["count"]:
+        stats_display += f"\n📅 **This week:** {this_bucket['count']} reviews (last week: {last_bucket['count']})"
+
+    stats_display += "\n"
+    FEEDBACK_CACHE["stats_display"] = ((stats["count"], today), stats_display)
+    return stats_display
+
+def feedback_positions(rating_filter):
+    """Index positions of the entries matching the filter, oldest first."""
+    if rating_filter in (None, "", "All"):
+        return range(len(FEEDBACK_CACHE["line_offsets"]))
+    return FEEDBACK_CACHE["by_rating"].get(str(rating_filter), [])
+
+def render_feedback_page(rating_filter, page_index):
+    """Renders one page of reviews (newest first within the page), served from the page cache."""
+    key = (rating_filter or "All", page_index)
+    with FEEDBACK_LOCK:
+        if key in FEEDBACK_PAGE_CACHE:
+            FEEDBACK_PAGE_CACHE.move_to_end(key)
+            return FEEDBACK_PAGE_CACHE[key]
+
+        positions = feedback_positions(rating_filter)
+        page_positions = positions[page_index * FEEDBACK_PAGE_SIZE:(page_index + 1) * FEEDBACK_PAGE_SIZE]
+
+        markdown_output = ""
+        for fb in reversed(read_feedback_entries(page_positions)):
+            stars = "★" * fb['rating'] + "☆" * (5 - fb['rating'])
+            markdown_output += (
+                f"**{stars}** ({fb['rating']}/5)\n\n"
+                f"**💬 Comment:** {fb['comment']}\n\n"
+                f"*(Submitted: {fb['timestamp']})*\n"
+                f"---\n"
+            )
+
+        FEEDBACK_PAGE_CACHE[key] = markdown_output
+        if len(FEEDBACK_PAGE_CACHE) > FEEDBACK_PAGE_CACHE_SIZE:
+            FEEDBACK_PAGE_CACHE.popitem(last=False)
+        return markdown_output
+
+def empty_feedback_page_slots():
+    """Clears and hides every "Load More" page slot."""
+    return [gr.update(value="", visible=False) for _ in range(FEEDBACK_PAGE_SLOTS)]
+
+def load_feedback(rating_filter="All"):
+    """
+    Formats the newest page of reviews for display with statistics.
+    Returns: (feedback_markdown, stats_display, next_cursor, load_more_button_update, *page_slot_updates)
+    """
+    if not read_feedback_log():
+        return ("**No feedback yet! Be the first to share your experience.**", "⭐ Overall Rating: No ratings yet",
+                None, gr.update(visible=False), *empty_feedback_page_slots())
+
+    stats_display = format_feedback_stats(FEEDBACK_CACHE["stats"])
+
     # Format feedback entries
     markdown_output = f"## 🌟 User Reviews & Ratings\n\n"
     markdown_output += f"{stats_display}\n\n"
     markdown_output += "---\n\n"
 
-    # Display newest feedback first
-    for fb in reversed(feedback_entries):
-        stars = "★" * fb['rating'] + "☆" * (5 - fb['rating'])
-        markdown_output += (
-            f"**{stars}** ({fb['rating']}/5)\n\n"
-            f"**💬 Comment:** {fb['comment']}\n\n"
-            f"*(Submitted: {fb['timestamp']})*\n"
-            f"---\n"
-        )
+    total_matches = len(feedback_positions(rating_filter))
+    if total_matches == 0:
+        markdown_output += f"**No {rating_filter}-star reviews yet.**\n"
+        return markdown_output, stats_display, None, gr.update(visible=False), *empty_feedback_page_slots()
+
+    # Display newest feedback first; top up a short newest page with the one before it
+    newest_page = (total_matches - 1) // FEEDBACK_PAGE_SIZE
+    markdown_output += render_feedback_page(rating_filter, newest_page)
+    next_cursor = newest_page - 1
+    if total_matches % FEEDBACK_PAGE_SIZE and next_cursor >= 0:
+        markdown_output += render_feedback_page(rating_filter, next_cursor)
+        next_cursor -= 1
+
+    next_cursor = (next_cursor, 0) if next_cursor >= 0 else None
+    return markdown_output, stats_display, next_cursor, gr.update(visible=next_cursor is not None), *empty_feedback_page_slots()
 
-    return markdown_output, stats_display
+def load_more_feedback(rating_filter, cursor):
+    """
+    Shows the next older page in the next free page slot, so only that page is sent to
+    the browser. The cursor is (page index anchored at the oldest review, slot index),
+    so it stays valid while new reviews arrive.
+    Returns: (next_cursor, load_more_button_update, *page_slot_updates)
+    """
+    slot_updates = [gr.update() for _ in range(FEEDBACK_PAGE_SLOTS)]
+    if cursor is None:
+        return None, gr.update(visible=False), *slot_updates
+
+    page_index, slot = cursor
+    read_feedback_log()
+    markdown_output = render_feedback_page(rating_filter, page_index)
+    next_cursor = (page_index - 1, slot + 1) if page_index > 0 else None
+    if next_cursor is not None and next_cursor[1] >= FEEDBACK_PAGE_SLOTS:
+        markdown_output += "\n*Older reviews are not listed here; pick a star rating to browse them.*\n"
+        next_cursor = None
+    slot_updates[slot] = gr.update(value=markdown_output, visible=True)
+    return next_cursor, gr.update(visible=next_cursor is not None), *slot_updates
 
 def star_rating_component():
     """Creates a star rating component using radio buttons."""
@@ -774,16 +5527,21 @@ def add_feedback(rating, comment):
     """
     Writes new feedback to the database and updates the UI.
     Returns: (message_box_update, rating_input_update, comment_input_update,
-              feedback_display_update, stats_display_update)
+              feedback_display_update, stats_display_update, review_filter_update,
+              feedback_cursor, load_more_button_update, *page_slot_updates)
     """
     if not comment.strip():
-        # message_box_update, rating_input_update, comment_input_update, feedback_display_update, stats_display_update
+        # message_box_update, rating_input_update, comment_input_update, feedback_display_update, stats_display_update, ...
         return (
             gr.update(value="⚠️ **Please leave a comment before submitting feedback.** ⚠️", visible=True),
             gr.update(value="5"),
             gr.update(value="", placeholder="What did you like or what can be improved?"),
             gr.no_change(), # feedback_display_component does not change on validation error
-            gr.no_change()  # stats_display_component does not change on validation error
+            gr.no_change(), # stats_display_component does not change on validation error
+            gr.no_change(), # review_filter
+            gr.no_change(), # feedback_cursor
+            gr.no_change(), # load_more_button
+            *(gr.update() for _ in range(FEEDBACK_PAGE_SLOTS))  # page slots
         )
 
     # Convert rating to integer
@@ -795,11 +5553,15 @@ def add_feedback(rating, comment):
             gr.update(value="5"),
             gr.update(value="", placeholder="What did you like or what can be improved?"),
             gr.no_change(),
-            gr.no_change()
+            gr.no_change(),
+            gr.no_change(),
+            gr.no_change(),
+            gr.no_change(),
+            *(gr.update() for _ in range(FEEDBACK_PAGE_SLOTS))
         )
 
     # Add to database
-    success, updated_database = add_feedback_to_database(rating_int, comment)
+    success, _ = add_feedback_to_database(rating_int, comment)
 
     if not success:
         return (
@@ -807,22 +5569,30 @@ def add_feedback(rating, comment):
             gr.update(value="5"),
             gr.update(value="", placeholder="What did you like or what can be improved?"),
             gr.no_change(),
-            gr.no_change()
+            gr.no_change(),
+            gr.no_change(),
+            gr.no_change(),
+            gr.no_change(),
+            *(gr.update() for _ in range(FEEDBACK_PAGE_SLOTS))
         )
 
     # Returns updated feedback list and a success message
     thank_you_message = "✅ **Thank you! Your feedback has been successfully submitted and is now public!** ✅"
 
-    # Load updated feedback for display components
-    updated_feedback_display_str, updated_stats_display_str = load_feedback()
+    # Load the newest page (all ratings) so the new review is visible straight away
+    updated_feedback_display_str, updated_stats_display_str, next_cursor, load_more_update, *slot_updates = load_feedback()
 
-    # Return updates for all five output components
+    # Return updates for all output components
     return (
         gr.update(value=thank_you_message, visible=True), # message_box
         gr.update(value="5"), # rating_input
         gr.update(value="", placeholder="What did you like or what can be improved?"), # comment_input
         gr.update(value=updated_feedback_display_str), # feedback_display_component
-        gr.update(value=updated_stats_display_str) # stats_display_component
+        gr.update(value=updated_stats_display_str), # stats_display_component
+        gr.update(value="All"), # review_filter
+        next_cursor, # feedback_cursor
+        load_more_update, # load_more_button
+        *slot_updates # page slots
     )
 
 
@@ -992,7 +5762,7 @@ else:
 
     # 1. Chatbot Tab
     chatbot_interface = gr.ChatInterface(
-        fn=groq_chat,
+        fn=select_handler(groq_chat, groq_chat_async),
         title="",
         description=f"Ask WanderBot anything about travel! (Model: {GROQ_CHAT_MODEL})",
         submit_btn="Ask WanderBot"
@@ -1000,13 +5770,13 @@ else:
 
     # 2. Translator Tab
     translator_interface = gr.Interface(
-        fn=translate_pipeline,
+        fn=select_handler(translate_pipeline, translate_pipeline_async),
         title="",
         live=False,
         submit_btn="Translate Audio",
         description=f"Convert speech to text, then translate it between two languages. Uses Groq Whisper ({GROQ_WHISPER_MODEL}) and Llama 3.1 ({GROQ_CHAT_MODEL}).",
         inputs=[
-            gr.Audio(type="filepath", format="wav", label="1. Speak or Upload Audio (Max 25MB)", sources=["microphone", "upload"]),
+            gr.Audio(type="filepath", format="wav", label="1. Speak or Upload Audio (long recordings are split automatically)", sources=["microphone", "upload"]),
             gr.Dropdown(label="2. Source Language", choices=LANGUAGES, value="English"),
             gr.Dropdown(label="3. Target Language", choices=LANGUAGES, value="Spanish"),
         ],
@@ -1017,9 +5787,26 @@ else:
         ]
     )
 
+    # 2b. Batch Translator Tab
+    batch_translator_interface = gr.Interface(
+        fn=select_handler(translate_announcement, translate_announcement_async),
+        title="",
+        live=False,
+        submit_btn="Translate to All Selected",
+        description=f"Render one announcement in many languages at once. Uses Llama 3.1 ({GROQ_CHAT_MODEL}); common phrases and repeat texts are answered from the translation memory.",
+        inputs=[
+            gr.Textbox(label="1. Text to Translate", lines=4, placeholder="e.g., The bus to the old town leaves at 9:00 from the hotel entrance."),
+            gr.Dropdown(label="2. Source Language", choices=LANGUAGES, value="English"),
+            gr.CheckboxGroup(label="3. Target Languages", choices=LANGUAGES, value=[lang for lang in LANGUAGES if lang != "English"]),
+        ],
+        outputs=[
+            gr.Markdown(label="4. Translations")
+        ]
+    )
+
     # 3. Culture Tab
     culture_interface = gr.Interface(
-        fn=fetch_culture_info,
+        fn=select_handler(fetch_culture_info, fetch_culture_info_async),
         title="",
         live=False,
         submit_btn="Generate Report",
@@ -1035,7 +5822,7 @@ else:
 
     # 4. Itinerary Planner Tab
     itinerary_interface = gr.Interface(
-        fn=generate_itinerary,
+        fn=select_handler(generate_itinerary, generate_itinerary_async),
         title="",
         live=False,
         submit_btn="Generate Itinerary",
@@ -1052,17 +5839,19 @@ else:
 
     # 5. Budget Estimator Tab (NEW)
     budget_interface = gr.Interface(
-        fn=generate_budget,
+        fn=select_handler(generate_budget, generate_budget_async),
         title="",
         live=False,
         submit_btn="Estimate Budget",
-        description=f"Generate a structured daily budget estimate based on destination and travel style.",
+        description=f"Generate a structured budget estimate based on destination and travel style, with daily and whole-trip costs in your currency (converted locally).",
         inputs=[
             gr.Textbox(label="1. Destination (City/Country)", lines=1, placeholder="e.g., London, UK"),
             gr.Dropdown(label="2. Travel Style", choices=["Budget", "Mid-Range", "Luxury"], value="Mid-Range"),
+            gr.Slider(label="3. Trip Length (Days)", minimum=1, maximum=60, step=1, value=7),
+            gr.Dropdown(label="4. Currency", choices=CURRENCY_CODES, value="USD", allow_custom_value=True),
         ],
         outputs=[
-            gr.Markdown(label="3. Estimated Daily Costs (USD)")
+            gr.Markdown(label="5. Estimated Costs")
         ]
     )
 
@@ -1072,25 +5861,48 @@ else:
         title="",
         live=False,
         submit_btn="Convert Amount",
-        description="Convert currency instantly using internal (simulated) exchange rates. No Groq API calls needed for this calculation.",
+        description=f"Convert currency instantly using local exchange-rate snapshots from '{RATE_SNAPSHOT_DIR}/' (simulated rates when none are present), optionally as of a past date. No Groq API calls needed for this calculation.",
         inputs=[
             gr.Number(label="1. Amount to Convert", value=100),
-            gr.Dropdown(label="2. From Currency (Source)", choices=CURRENCY_CODES, value="USD"),
-            gr.Dropdown(label="3. To Currency (Target)", choices=CURRENCY_CODES, value="EUR"),
+            gr.Dropdown(label="2. From Currency (Source)", choices=CURRENCY_CODES, value="USD", allow_custom_value=True),
+            gr.Dropdown(label="3. To Currency (Target)", choices=CURRENCY_CODES, value="EUR", allow_custom_value=True),
+            gr.Textbox(label="4. Rate Date (YYYY-MM-DD, blank for latest)", value="", lines=1),
+        ],
+        outputs=[
+            gr.Markdown(label="5. Conversion Result")
+        ]
+    )
+
+    # 6b. Bulk Currency Conversion Tab
+    ledger_converter_interface = gr.Interface(
+        fn=convert_ledger,
+        title="",
+        live=False,
+        submit_btn="Convert Ledger",
+        description="Convert a whole CSV ledger at once using the local exchange-rate snapshots, optionally as of a past date. Decimal-exact mode rounds each amount to the target currency's minor unit for accounting.",
+        inputs=[
+            gr.File(label="1. Upload CSV Ledger", file_types=[".csv"], type="filepath"),
+            gr.Textbox(label="2. Amount Column", value="amount", lines=1),
+            gr.Textbox(label="3. Currency Column (optional, overrides the source currency per row)", value="", lines=1),
+            gr.Dropdown(label="4. From Currency (Source)", choices=CURRENCY_CODES, value="USD", allow_custom_value=True),
+            gr.Dropdown(label="5. To Currency (Target)", choices=CURRENCY_CODES, value="EUR", allow_custom_value=True),
+            gr.Textbox(label="6. Rate Date (YYYY-MM-DD, blank for latest)", value="", lines=1),
+            gr.Checkbox(label="7. Decimal-exact mode (accounting)", value=False),
         ],
         outputs=[
-            gr.Markdown(label="4. Conversion Result")
+            gr.Markdown(label="8. Summary"),
+            gr.File(label="9. Converted CSV")
         ]
     )
 
     # 7. Route Planner Tab
     route_interface = gr.Interface(
-        fn=generate_route_and_map,
+        fn=select_handler(generate_route_and_map, generate_route_and_map_async),
         title="",
         live=False,
         
         submit_btn="Find Route",
-        description="Get estimated travel details (LLM) and a live map route (Google Maps link) between two places.",
+        description="Get estimated travel details (computed offline, LLM for unknown places) and a live map route (Google Maps link) between two places.",
         inputs=[
             gr.Textbox(label="1. Starting Point", lines=1, placeholder="e.g., Eiffel Tower, Paris"),
             gr.Textbox(label="2. Destination", lines=1, placeholder="e.g., Louvre Museum, Paris"),
@@ -1137,13 +5949,13 @@ else:
 
         # Event handlers
         start_btn.click(
-            fn=start_trivia_quiz,
+            fn=select_handler(start_trivia_quiz, start_trivia_quiz_async),
             inputs=[destination_input],
             outputs=[session_state, quiz_output, answer_section, start_btn, feedback_output]
         )
 
         submit_btn.click(
-            fn=submit_trivia_answer,
+            fn=select_handler(submit_trivia_answer, submit_trivia_answer_async),
             inputs=[session_state, answer_input, quiz_output],
             outputs=[session_state, quiz_output, answer_section, start_btn, feedback_output]
         ).then(
@@ -1180,21 +5992,45 @@ else:
 
             stats_display_component.render()
 
-            submit_button.click(
-                fn=add_feedback,
-                inputs=[rating_input, comment_input],
-                outputs=[message_box, rating_input, comment_input, feedback_display_component, stats_display_component],
-            )
-
         with gr.Tab("📊 See All Reviews"):
             gr.Markdown("## 🌟 Community Reviews")
             gr.Markdown("See what other travelers think about WanderBot!")
 
+            review_filter = gr.Radio(
+                choices=FEEDBACK_RATING_FILTERS,
+                value="All",
+                label="Filter by Rating"
+            )
             feedback_display_component.render()
+            # Older pages each get their own component, so "Load More" only sends the new page
+            feedback_page_slots = [gr.Markdown(visible=False) for _ in range(FEEDBACK_PAGE_SLOTS)]
+            load_more_button = gr.Button("⬇️ Load More Reviews", variant="secondary", visible=False)
+
+            # (page index, slot) of the next older page to load (None when everything is shown)
+            feedback_cursor = gr.State()
+
+        submit_button.click(
+            fn=add_feedback,
+            inputs=[rating_input, comment_input],
+            outputs=[message_box, rating_input, comment_input, feedback_display_component, stats_display_component,
+                     review_filter, feedback_cursor, load_more_button, *feedback_page_slots],
+        )
+
+        review_filter.change(
+            fn=load_feedback,
+            inputs=[review_filter],
+            outputs=[feedback_display_component, stats_display_component, feedback_cursor, load_more_button, *feedback_page_slots]
+        )
+
+        load_more_button.click(
+            fn=load_more_feedback,
+            inputs=[review_filter, feedback_cursor],
+            outputs=[feedback_cursor, load_more_button, *feedback_page_slots]
+        )
 
         feedback_blocks.load(
             lambda: load_feedback(),
-            outputs=[feedback_display_component, stats_display_component]
+            outputs=[feedback_display_component, stats_display_component, feedback_cursor, load_more_button, *feedback_page_slots]
         )
 
     # --- Main Tabbed Interface with Custom Styling ---
@@ -1206,10 +6042,12 @@ else:
             [
                 chatbot_interface,
                 translator_interface,
+                batch_translator_interface,
                 culture_interface,
                 itinerary_interface,
                 budget_interface,
                 currency_converter_interface,
+                ledger_converter_interface,
                 route_interface,
                 trivia_quiz_interface,
                 feedback_blocks
@@ -1217,10 +6055,12 @@ else:
             [
                 "🌍 Tourism Chatbot",
                 "🗣️ Audio Translator",
+                "📢 Batch Translator",
                 "🏛️ Culture & Tradition",
                 "✈️ Itinerary Planner",
                 "💰 Budget Estimator",
                 "💱 Currency Converter",
+                "📊 Ledger Converter",
                 "🗺️ Route Planner",
                 "🧠 Travel Trivia",
                 "⭐ Public Feedback"
@@ -1228,12 +6068,72 @@ else:
         )
 
 if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--build-road-graph":
+        # One-off import of an OSM XML extract, then a latency check on the result
+        print(f"Building road graph from {sys.argv[2]} into {ROAD_GRAPH_DIR}/ ...")
+        print(json.dumps(build_road_graph(sys.argv[2], ROAD_GRAPH_DIR), indent=2))
+        graph = RoadGraph(ROAD_GRAPH_DIR)
+        for mode in ROAD_GRAPH_MODES:
+            if graph.meta["edges"][mode]:
+                print(f"{mode} queries: {benchmark_road_graph(graph, mode)}")
+        sys.exit(0)
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark-async":
+        # Threaded vs async handler capacity against a simulated Groq latency
+        options = [cast(arg) for cast, arg in zip((int, float, int), sys.argv[2:5])]
+        print(json.dumps(benchmark_async_handlers(*options), indent=2))
+        sys.exit(0)
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark-chat-stream":
+        # Per-token vs batched chatbot streaming of one simulated reply
+        options = [cast(arg) for cast, arg in zip((int, float), sys.argv[2:4])]
+        print(json.dumps(benchmark_chat_streaming(*options), indent=2))
+        sys.exit(0)
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark-batch-translation":
+        # Serial loop vs batched vs fanned-out translation of one text into many languages
+        options = [cast(arg) for cast, arg in zip((int, float), sys.argv[2:4])]
+        print(json.dumps(benchmark_batch_translation(*options), indent=2))
+        sys.exit(0)
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark-currency":
+        # Vectorized vs Decimal-exact vs one-call-per-row bulk currency conversion
+        options = [int(arg) for arg in sys.argv[2:5]]
+        print(json.dumps(benchmark_currency_conversion(*options), indent=2))
+        sys.exit(0)
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "--stress-feedback-log":
+        # Concurrent appends from [processes] x [threads] x [appends]; exits non-zero if any review was lost
+        result = stress_test_feedback_log(*(int(arg) for arg in sys.argv[2:5]))
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result["ok"] else 1)
+
     print("Starting Zenix Travel Companion...")
-    print(f"Feedback database file: {FEEDBACK_DB_FILE}")
+    print(f"Feedback database file: {FEEDBACK_LOG_FILE}")
+    print(f"LLM response cache: memory LRU ({RESPONSE_CACHE_MAX_ENTRIES} entries)"
+          + (f" + SQLite ({RESPONSE_CACHE_DB_FILE})" if RESPONSE_CACHE_DB_FILE else ""))
+    print(f"Offline road graph: " + (f"{ROAD_GRAPH.meta['nodes']:,} nodes from {ROAD_GRAPH.meta['source']}" if ROAD_GRAPH else f"none (build one with --build-road-graph into {ROAD_GRAPH_DIR}/)"))
+    print(f"Offline place index: {len(PLACE_INDEX)} places ({GEOCODER_DATA_FILE})")
+    print(f"Trivia sessions: {'SQLite (' + TRIVIA_SESSION_DB_FILE + ')' if TRIVIA_SESSION_DB_FILE else 'in process'}, "
+          f"idle TTL {TRIVIA_SESSION_TTL}s, at most {TRIVIA_SESSION_MAX_ENTRIES}")
+    print(f"Trivia question bank: {TRIVIA_BANK.stats()['questions']} questions"
+          + (f" ({TRIVIA_BANK_DB_FILE})" if TRIVIA_BANK_DB_FILE else " (in memory)"))
+    print(f"Translation memory: {len(TRAVEL_PHRASEBOOK)} phrasebook phrases + memory LRU ({TRANSLATION_MEMORY_MAX_ENTRIES} entries)"
+          + (f" + SQLite ({TRANSLATION_MEMORY_DB_FILE})" if TRANSLATION_MEMORY_DB_FILE else ""))
 
     # Initialize database on startup
-    db = load_feedback_database()
-    print(f"Database loaded: {db['metadata']['total_feedback']} feedback entries")
+    print(f"Database loaded: {read_feedback_log()} feedback entries")
+
+    if USE_ASYNC_HANDLERS:
+        # Async handlers do not pin worker threads, so each event can serve many users at once
+        print(f"Async Groq handlers enabled (concurrency limit {ASYNC_CONCURRENCY_LIMIT} per event)")
+        interface_content.queue(default_concurrency_limit=ASYNC_CONCURRENCY_LIMIT)
+
+    if client is not None:
+        # Top up the bank for the general quiz and any configured destinations in the background
+        for destination in [""] + TRIVIA_WARM_DESTINATIONS:
+            if TRIVIA_BANK.unseen_count(destination, "anonymous") < TRIVIA_POOL_SIZE:
+                TRIVIA_POOL.refill(destination)
 
     interface_content.launch(debug=True)
     print("Gradio Interface launched! Access it via the public URL above.")
\ No newline at end of file